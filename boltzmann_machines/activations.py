@@ -0,0 +1,42 @@
+import numpy
+
+#inputs of the logistic function are clipped to this range, such that 'numpy.exp' does not overflow;
+#the logistic function of the clipped inputs is 0 or 1 up to double precision
+MAX_ACTIVATION_INPUT = 500.
+
+def sigmoid(x, out=None):
+    """Applies the logistic function 1 / (1 + exp(-x)) elementwise.
+
+    Keyword arguments:
+    x -- A 'numpy.array' (or a scalar) containing the inputs of the units.
+    out -- A float 'numpy.array' with the shape of 'x' in which the result is stored (default None, in which case a new array is created);
+           'out' can be 'x' itself.
+
+    Returns:
+    probabilities -- A 'numpy.array' containing the activation probabilities of the units ('out' if it is given).
+
+    """
+    out = numpy.asarray(numpy.clip(x, -MAX_ACTIVATION_INPUT, MAX_ACTIVATION_INPUT, out=out), dtype=float)
+    numpy.negative(out, out=out)
+    numpy.exp(out, out=out)
+    out += 1.
+    return numpy.reciprocal(out, out=out)
+
+def sample_bernoulli(probabilities, out=None, random_state=numpy.random):
+    """Samples binary unit values, such that each unit is 1 with the given probability and 0 otherwise.
+
+    Keyword arguments:
+    probabilities -- A 'numpy.array' containing the activation probabilities of the units.
+    out -- A float 'numpy.array' with the shape of 'probabilities' in which the sampled values are stored
+           (default None, in which case a new array is created); 'out' can be 'probabilities' itself.
+    random_state -- A 'numpy.random.RandomState' object used for generating random numbers (default 'numpy.random').
+
+    Returns:
+    units -- A float 'numpy.array' of zeros and ones ('out' if it is given).
+
+    """
+    probabilities = numpy.asarray(probabilities)
+    thresholds = random_state.rand(*probabilities.shape)
+    if out is None:
+        return (probabilities > thresholds).astype(float)
+    return numpy.greater(probabilities, thresholds, out=out)
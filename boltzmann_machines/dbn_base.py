@@ -1,5 +1,6 @@
 from abc import ABCMeta, abstractmethod
-import math
+import numpy
+from activations import sigmoid, sample_bernoulli
 
 class DBNBase(object):
     __metaclass__ = ABCMeta
@@ -16,6 +17,113 @@ class DBNBase(object):
         """
         pass
 
+    def train_minibatch(self, data, epochs=100, learning_rate=0.1, batch_size=100, k=1, algorithm='cd', fast_learning_rate=None, fast_weight_decay=0.95):
+        """Trains the belief network layer by layer using mini-batch Contrastive Divergence (CD-k).
+        For each batch, the unit activations of all training vectors are calculated as matrix products and
+        the parameters are updated with the average gradient of the batch, i.e. with one outer product per batch
+        instead of one update per training vector and weight.
+
+        With persistent Contrastive Divergence ('pcd'), the Gibbs chains are not restarted at the training vectors,
+        but continue from a preallocated pool of fantasy particles that is kept across mini-batches.
+        Fast-weights PCD ('fpcd') additionally samples the particles using a set of fast weights which are trained
+        with the same gradients, but decay quickly, such that the particles move away from the modes they have visited.
+
+        Keyword arguments:
+        data -- A 'numpy.array' containing data for training the RBM. Each row of the array should be a training vector of dimension 'number_visible_units'.
+        epochs -- The number of passes over the training data for each layer (default 100).
+        learning_rate -- The algorithm's learning rate (default 0.1).
+        batch_size -- The number of training vectors in each batch (default 100).
+        k -- The number of Gibbs steps used for creating the negative samples (default 1).
+        algorithm -- The training algorithm: 'cd', 'pcd' or 'fpcd' (default 'cd').
+        fast_learning_rate -- The learning rate of the fast weights used by 'fpcd' (default None, resulting in 'learning_rate').
+        fast_weight_decay -- The factor by which the fast weights used by 'fpcd' are multiplied after each batch (default 0.95).
+
+        """
+        if algorithm not in ('cd', 'pcd', 'fpcd'):
+            raise ValueError('Unknown training algorithm: ' + str(algorithm))
+        if fast_learning_rate == None:
+            fast_learning_rate = learning_rate
+
+        data = numpy.asarray(data, dtype=float)
+        number_training_vectors = data.shape[0]
+        for current_layer in xrange(self.layers):
+            weights = self.connection_weights[current_layer]
+            visible_biases = self.biases[current_layer]
+            hidden_biases = self.biases[current_layer+1]
+
+            #the fantasy particles are allocated once per layer and are updated in place after each batch
+            if algorithm != 'cd':
+                fantasy_particles = numpy.random.randint(0,2,(batch_size,weights.shape[0])).astype(float)
+            if algorithm == 'fpcd':
+                fast_weights = numpy.zeros(weights.shape)
+                fast_visible_biases = numpy.zeros(visible_biases.shape)
+                fast_hidden_biases = numpy.zeros(hidden_biases.shape)
+
+            for _ in xrange(epochs):
+                #the training vectors are visited in a random order in each epoch
+                vector_order = numpy.random.permutation(number_training_vectors)
+                for batch_start in xrange(0, number_training_vectors, batch_size):
+                    visible_units = data[vector_order[batch_start:batch_start+batch_size]]
+
+                    #the training vectors are propagated to the visible units of the current layer
+                    #by sampling the hidden units of the layers below it
+                    for layer in xrange(current_layer):
+                        hidden_probabilities = sigmoid(visible_units.dot(self.connection_weights[layer]) + self.biases[layer+1])
+                        visible_units = sample_bernoulli(hidden_probabilities, out=hidden_probabilities)
+
+                    data_hidden_probabilities = sigmoid(visible_units.dot(weights) + hidden_biases)
+                    if algorithm == 'cd':
+                        visible_samples = self._sample_chain(data_hidden_probabilities, weights, visible_biases, hidden_biases, k)
+                    else:
+                        particles = fantasy_particles[:visible_units.shape[0]]
+                        if algorithm == 'fpcd':
+                            chain_weights = weights + fast_weights
+                            chain_visible_biases = visible_biases + fast_visible_biases
+                            chain_hidden_biases = hidden_biases + fast_hidden_biases
+                        else:
+                            chain_weights, chain_visible_biases, chain_hidden_biases = weights, visible_biases, hidden_biases
+                        chain_hidden_probabilities = sigmoid(particles.dot(chain_weights) + chain_hidden_biases)
+                        visible_samples = self._sample_chain(chain_hidden_probabilities, chain_weights, chain_visible_biases, chain_hidden_biases, k)
+                        particles[:] = visible_samples
+                    sample_hidden_probabilities = sigmoid(visible_samples.dot(weights) + hidden_biases)
+
+                    weight_gradient = (visible_units.T.dot(data_hidden_probabilities) - visible_samples.T.dot(sample_hidden_probabilities)) / visible_units.shape[0]
+                    visible_bias_gradient = numpy.mean(visible_units, axis=0) - numpy.mean(visible_samples, axis=0)
+                    hidden_bias_gradient = numpy.mean(data_hidden_probabilities, axis=0) - numpy.mean(sample_hidden_probabilities, axis=0)
+
+                    #the parameters are updated in place, such that 'self.connection_weights' and 'self.biases' refer to the updated arrays
+                    weights += learning_rate * weight_gradient
+                    visible_biases += learning_rate * visible_bias_gradient
+                    hidden_biases += learning_rate * hidden_bias_gradient
+                    if algorithm == 'fpcd':
+                        fast_weights *= fast_weight_decay
+                        fast_weights += fast_learning_rate * weight_gradient
+                        fast_visible_biases *= fast_weight_decay
+                        fast_visible_biases += fast_learning_rate * visible_bias_gradient
+                        fast_hidden_biases *= fast_weight_decay
+                        fast_hidden_biases += fast_learning_rate * hidden_bias_gradient
+
+    def _sample_chain(self, hidden_probabilities, weights, visible_biases, hidden_biases, k):
+        """Runs k steps of block Gibbs sampling for a batch of vectors, starting from the hidden units.
+
+        Keyword arguments:
+        hidden_probabilities -- A 'numpy.array' of shape (number_of_vectors, number_hidden_units) containing the initial activation probabilities of the hidden units.
+        weights -- A 'numpy.array' containing the connection weights between the visible and the hidden units.
+        visible_biases -- A 'numpy.array' containing the biases of the visible units.
+        hidden_biases -- A 'numpy.array' containing the biases of the hidden units.
+        k -- The number of Gibbs steps.
+
+        Returns:
+        visible_units -- A 'numpy.array' of shape (number_of_vectors, number_visible_units) containing the sampled values.
+
+        """
+        for step in xrange(k):
+            if step > 0:
+                hidden_probabilities = sigmoid(visible_units.dot(weights) + hidden_biases)
+            hidden_units = sample_bernoulli(hidden_probabilities)
+            visible_units = self._sample_visible(sigmoid(hidden_units.dot(weights.T) + visible_biases))
+        return visible_units
+
     @abstractmethod
     def sample_network(self, vector=None):
         """Samples a vector from the network.
@@ -44,5 +152,15 @@ class DBNBase(object):
         """
         pass
 
-    def _logistic(self, x):
-        return 1. / (1. + math.exp(-x))
\ No newline at end of file
+    @abstractmethod
+    def _sample_visible(self, visible_probabilities):
+        """Samples the values of a batch of visible units given their activation probabilities.
+
+        Keyword arguments:
+        visible_probabilities -- A 'numpy.array' of shape (number_of_vectors, number_visible_units) containing activation probabilities.
+
+        Returns:
+        visible_units -- A 'numpy.array' of shape (number_of_vectors, number_visible_units) containing the sampled values.
+
+        """
+        pass
\ No newline at end of file
@@ -1,6 +1,6 @@
 from dbn_base import DBNBase
 import numpy
-import math
+from activations import sigmoid, sample_bernoulli
 
 class DBNContinuous(DBNBase):
     def __init__(self, number_visible_units, number_hidden_units, layers=1):
@@ -54,34 +54,21 @@ class DBNContinuous(DBNBase):
                     #if we are training the first layer, no hidden units will be assigned;
                     #if we are training an upper layer, then hidden neurons below it will be assigned values
                     for layer in xrange(current_layer):
-                        for neuron in xrange(self.number_hidden_units[layer]):
-                            prob = self._logistic(numpy.sum(self.connection_weights[layer][:,neuron] * self.neuron_values[layer]) + self.biases[layer+1][neuron])
-                            threshold = numpy.random.rand()
-                            if prob > threshold:
-                                self.neuron_values[layer+1][neuron] = 1.
-                            else:
-                                self.neuron_values[layer+1][neuron] = 0.
+                        sigmoid(self.neuron_values[layer].dot(self.connection_weights[layer]) + self.biases[layer+1], out=self.neuron_values[layer+1])
+                        sample_bernoulli(self.neuron_values[layer+1], out=self.neuron_values[layer+1])
 
                     #we sample from the current layer of the network
                     layer_sample = self._sample_layer(current_layer, 1)
 
                     #we update the connection weights between the visible and hidden units of the current layer
-                    for i in xrange(self.connection_weights[current_layer].shape[0]):
-                        #we update the bias values of the visible units in the current visible layer
-                        visible_bias_delta = learning_rate * (self.neuron_values[current_layer][i] - layer_sample[i])
-                        self.biases[current_layer][i] = self.biases[current_layer][i] + visible_bias_delta
+                    #and the bias values of the units, using the hidden expectations given the data and given the sample
+                    visible_units = self.neuron_values[current_layer]
+                    data_expectations = sigmoid(visible_units.dot(self.connection_weights[current_layer]) + self.biases[current_layer+1])
+                    sample_expectations = sigmoid(layer_sample.dot(self.connection_weights[current_layer]) + self.biases[current_layer+1])
 
-                        for j in xrange(self.connection_weights[current_layer].shape[1]):
-                            data_expectation = self._logistic(numpy.sum(self.connection_weights[current_layer][:,j] * self.neuron_values[current_layer]) + self.biases[current_layer+1][j])
-                            sample_expectation = self._logistic(numpy.sum(self.connection_weights[current_layer][:,j] * layer_sample) + self.biases[current_layer+1][j])
-
-                            #we update the connection weight between the i-th visible unit and the j-th hidden unit
-                            weight_change_delta = learning_rate * (data_expectation * self.neuron_values[current_layer][i] - sample_expectation * layer_sample[i])
-                            self.connection_weights[current_layer][i,j] = self.connection_weights[current_layer][i,j] + weight_change_delta
-
-                            #we update the bias values of the hidden units in the current visible layer
-                            hidden_bias_delta = learning_rate * (data_expectation - sample_expectation)
-                            self.biases[current_layer+1][j] = self.biases[current_layer+1][j] + hidden_bias_delta
+                    self.connection_weights[current_layer] += learning_rate * (numpy.outer(visible_units, data_expectations) - numpy.outer(layer_sample, sample_expectations))
+                    self.biases[current_layer] += learning_rate * (visible_units - layer_sample)
+                    self.biases[current_layer+1] += learning_rate * (data_expectations - sample_expectations)
 
     def sample_network(self, vector=None):
         """Samples a vector from the network.
@@ -93,27 +80,17 @@ class DBNContinuous(DBNBase):
         visible_units -- A 'numpy.array' containing the sampled values.
 
         """
-        if vector != None:
-            self.neuron_values[0] = numpy.array(vector)
+        if vector is not None:
+            self.neuron_values[0] = numpy.array(vector, dtype=float)
         else:
             self.neuron_values[0] = numpy.random.rand(self.number_visible_units)
 
         for layer in xrange(self.layers):
-            number_hidden_units = len(self.neuron_values[layer+1])
-            for neuron in xrange(number_hidden_units):
-                prob = self._logistic(numpy.sum(self.connection_weights[layer][:,neuron] * self.neuron_values[layer]) + self.biases[layer+1][neuron])
-                threshold = numpy.random.rand()
-
-                if prob > threshold:
-                    self.neuron_values[layer+1][neuron] = 1.
-                else:
-                    self.neuron_values[layer+1][neuron] = 0.
+            sigmoid(self.neuron_values[layer].dot(self.connection_weights[layer]) + self.biases[layer+1], out=self.neuron_values[layer+1])
+            sample_bernoulli(self.neuron_values[layer+1], out=self.neuron_values[layer+1])
 
         for layer in xrange(self.layers-1,-1,-1):
-            number_visible_units = len(self.neuron_values[layer])
-            for neuron in xrange(number_visible_units):
-                prob = self._logistic(numpy.sum(self.connection_weights[layer][neuron,:] * self.neuron_values[layer+1]) + self.biases[layer][neuron])
-                self.neuron_values[layer][neuron] = prob
+            sigmoid(self.connection_weights[layer].dot(self.neuron_values[layer+1]) + self.biases[layer], out=self.neuron_values[layer])
 
         return numpy.array(self.neuron_values[0])
 
@@ -135,21 +112,23 @@ class DBNContinuous(DBNBase):
         visible_biases = numpy.array(self.biases[layer])
         hidden_biases = numpy.array(self.biases[layer+1])
 
-        number_visible_units = len(visible_units)
-        number_hidden_units = len(hidden_units)
-
         for sample in xrange(k):
-            for neuron in xrange(number_hidden_units):
-                prob = self._logistic(numpy.sum(self.connection_weights[layer][:,neuron] * visible_units) + hidden_biases[neuron])
-                threshold = numpy.random.rand()
+            sigmoid(visible_units.dot(self.connection_weights[layer]) + hidden_biases, out=hidden_units)
+            sample_bernoulli(hidden_units, out=hidden_units)
+
+            sigmoid(self.connection_weights[layer].dot(hidden_units) + visible_biases, out=visible_units)
 
-                if prob > threshold:
-                    hidden_units[neuron] = 1.
-                else:
-                    hidden_units[neuron] = 0.
+        return visible_units
 
-            for neuron in xrange(number_visible_units):
-                prob = self._logistic(numpy.sum(self.connection_weights[layer][neuron,:] * hidden_units) + visible_biases[neuron])
-                visible_units[neuron] = prob
+    def _sample_visible(self, visible_probabilities):
+        """Samples the values of a batch of visible units given their activation probabilities;
+        the visible units take the values of their activation probabilities.
 
-        return visible_units
\ No newline at end of file
+        Keyword arguments:
+        visible_probabilities -- A 'numpy.array' of shape (number_of_vectors, number_visible_units) containing activation probabilities.
+
+        Returns:
+        visible_units -- A 'numpy.array' of shape (number_of_vectors, number_visible_units) containing the sampled values.
+
+        """
+        return visible_probabilities
@@ -1,6 +1,6 @@
 from trbm_base import TRBMBase
 import numpy
-import math
+from activations import sigmoid, sample_bernoulli
 
 class TRBM(TRBMBase):
     def __init__(self, number_visible_units, number_hidden_units, order=1):
@@ -8,11 +8,11 @@ class TRBM(TRBMBase):
         self.number_hidden_units = number_hidden_units
         self.order = order
 
-        self.visible_values = list()
-        self.hidden_values = list()
-        for _ in xrange(order+1):
-            self.visible_values.append(numpy.zeros((number_visible_units,1)))
-            self.hidden_values.append(numpy.zeros((number_hidden_units,1)))
+        #the visible and hidden vectors of the last order+1 time steps are stored in circular buffers,
+        #whose 'history_head'-th rows contain the vectors of the current time step
+        self.visible_values = numpy.zeros((order+1,number_visible_units))
+        self.hidden_values = numpy.zeros((order+1,number_hidden_units))
+        self.history_head = order
 
         #visible to hidden connections at time t
         self.connection_weights = numpy.random.rand(number_visible_units, number_hidden_units) * 0.05
@@ -43,83 +43,55 @@ class TRBM(TRBMBase):
         learning_rate -- The algorithm's learning rate (default).
 
         """
-        for t in xrange(self.order):
-            self.visible_values[t] = self._copy_array(data[t,:], self.visible_values[t].shape)
-            self.hidden_values[t] = self._sample_initial(t,1)
+        self._initialise_history(data[:self.order,:])
 
         number_training_vectors = data.shape[0]
         for t in xrange(self.order,number_training_vectors):
-            self.visible_values[self.order] = self._copy_array(data[t,:], self.visible_values[self.order].shape)
+            self.visible_values[self.history_head] = data[t,:]
+            current_visible_vector = self._visible_vector(0)
 
             #we sample the current hidden layer given the visible layer up to time t and the hidden layers up to time t-1
-            current_time_hidden_bias_values = self.connection_weights.T.dot(self.visible_values[self.order])
+            current_time_hidden_bias_values = self.connection_weights.T.dot(current_visible_vector)
             hidden_bias = self._bias_function_hidden()
-            for neuron in xrange(self.number_hidden_units):
-                prob = self._sigmoid(current_time_hidden_bias_values[neuron] + hidden_bias[neuron])
-                self.hidden_values[self.order][neuron] = prob
+            sigmoid(current_time_hidden_bias_values + hidden_bias, out=self._hidden_vector(0))
 
             #we sample from the network
             sample,_ = self._sample(1)
 
             #we update the connection weights between the visible and hidden units of the current time step
-            for i in xrange(self.number_visible_units):
-                #we update the bias values of the visible units
-                visible_bias_delta = learning_rate * (self.visible_values[self.order][i] - sample[i])
-                self.visible_bias[i] = self.visible_bias[i] + visible_bias_delta
-
-                for j in xrange(self.number_hidden_units):
-                    data_expectation = self._sigmoid(numpy.sum(self.connection_weights[:,j] * self.visible_values[self.order]) + self.hidden_bias[j])
-                    sample_expectation = self._sigmoid(numpy.sum(self.connection_weights[:,j] * sample) + self.hidden_bias[j])
-
-                    #we update the connection weight between the i-th visible unit and the j-th hidden unit
-                    weight_change_delta = learning_rate * (data_expectation * self.visible_values[self.order][i] - sample_expectation * sample[i])
-                    self.connection_weights[i,j] = self.connection_weights[i,j] + weight_change_delta
-
-                    #we update the bias values of the hidden units
-                    hidden_bias_delta = learning_rate * (data_expectation - sample_expectation)
-                    self.hidden_bias[j] = self.hidden_bias[j] + hidden_bias_delta
+            #and the bias values of the units, using the hidden expectations given the data and given the sample
+            data_expectations = sigmoid(self.connection_weights.T.dot(current_visible_vector) + self.hidden_bias)
+            sample_expectations = sigmoid(self.connection_weights.T.dot(sample) + self.hidden_bias)
+            self.connection_weights += learning_rate * (current_visible_vector.dot(data_expectations.T) - sample.dot(sample_expectations.T))
+            self.visible_bias += learning_rate * (current_visible_vector - sample)
+            self.hidden_bias += learning_rate * (data_expectations - sample_expectations)
 
             #we update the visible to hidden connection weights between the current time step and the previous time steps
             for n in xrange(self.order):
-                value_index = self.order - n - 1
-                sample,_ = self._sample(1,self.visible_values[value_index])
-                for i in xrange(self.number_visible_units):
-                    for j in xrange(self.number_hidden_units):
-                        data_expectation = self._sigmoid(numpy.sum(self.visible_to_hidden_bias[n][:,j] * self.visible_values[value_index]) + self.hidden_bias[j])
-                        sample_expectation = self._sigmoid(numpy.sum(self.visible_to_hidden_bias[n][:,j] * sample) + self.hidden_bias[j])
-
-                        #we update the connection weight between the i-th visible unit and the j-th hidden unit
-                        weight_change_delta = learning_rate * (data_expectation * self.visible_values[value_index][i] - sample_expectation * sample[i])
-                        self.visible_to_hidden_bias[n][i,j] = self.visible_to_hidden_bias[n][i,j] + weight_change_delta
+                past_visible_vector = self._visible_vector(n+1)
+                sample,_ = self._sample(1,past_visible_vector)
+                data_expectations = sigmoid(self.visible_to_hidden_bias[n].T.dot(past_visible_vector) + self.hidden_bias)
+                sample_expectations = sigmoid(self.visible_to_hidden_bias[n].T.dot(sample) + self.hidden_bias)
+                self.visible_to_hidden_bias[n] += learning_rate * (past_visible_vector.dot(data_expectations.T) - sample.dot(sample_expectations.T))
 
             #we update the visible to visible connection weights between the current time step and the previous time steps
             for n in xrange(self.order):
-                value_index = self.order - n - 1
-                sample,_ = self._sample(1,self.visible_values[value_index])
-                for i in xrange(self.number_visible_units):
-                    for j in xrange(self.number_visible_units):
-                        data_expectation = self._sigmoid(numpy.sum(self.visible_to_visible_bias[n][:,j] * self.visible_values[value_index]) + self.visible_bias[j])
-                        sample_expectation = self._sigmoid(numpy.sum(self.visible_to_visible_bias[n][:,j] * sample) + self.visible_bias[j])
-
-                        #we update the connection weight between the i-th and the j-th visible unit
-                        weight_change_delta = learning_rate * (data_expectation * self.visible_values[value_index][i] - sample_expectation * sample[i])
-                        self.visible_to_visible_bias[n][i,j] = self.visible_to_visible_bias[n][i,j] + weight_change_delta
+                past_visible_vector = self._visible_vector(n+1)
+                sample,_ = self._sample(1,past_visible_vector)
+                data_expectations = sigmoid(self.visible_to_visible_bias[n].T.dot(past_visible_vector) + self.visible_bias)
+                sample_expectations = sigmoid(self.visible_to_visible_bias[n].T.dot(sample) + self.visible_bias)
+                self.visible_to_visible_bias[n] += learning_rate * (past_visible_vector.dot(data_expectations.T) - sample.dot(sample_expectations.T))
 
             #we update the hidden to hidden connection weights between the current time step and the previous time steps
             for n in xrange(self.order):
-                value_index = self.order - n - 1
-                _,sample = self._sample(1,self.visible_values[value_index])
-                for i in xrange(self.number_hidden_units):
-                    for j in xrange(self.number_hidden_units):
-                        data_expectation = self._sigmoid(numpy.sum(self.hidden_to_hidden_bias[n][:,j] * self.hidden_values[value_index]) + self.hidden_bias[j])
-                        sample_expectation = self._sigmoid(numpy.sum(self.hidden_to_hidden_bias[n][:,j] * sample) + self.hidden_bias[j])
+                past_hidden_vector = self._hidden_vector(n+1)
+                _,sample = self._sample(1,self._visible_vector(n+1))
+                data_expectations = sigmoid(self.hidden_to_hidden_bias[n].T.dot(past_hidden_vector) + self.hidden_bias)
+                sample_expectations = sigmoid(self.hidden_to_hidden_bias[n].T.dot(sample) + self.hidden_bias)
+                self.hidden_to_hidden_bias[n] += learning_rate * (past_hidden_vector.dot(data_expectations.T) - sample.dot(sample_expectations.T))
 
-                        #we update the connection weight between the i-th and the j-th hidden unit
-                        weight_change_delta = learning_rate * (data_expectation * self.hidden_values[value_index][i] - sample_expectation * sample[i])
-                        self.hidden_to_hidden_bias[n][i,j] = self.hidden_to_hidden_bias[n][i,j] + weight_change_delta
-
-            #we move the visible vectors one time step back
-            self._shift_visible_vectors_back()
+            #we move on to the next time step
+            self._advance_history()
 
     def sample_network(self, current_vector, initial_data=None):
         """Samples a visible vector from the network.
@@ -132,35 +104,22 @@ class TRBM(TRBMBase):
         visible_units -- A 'numpy.array' containing the sampled values.
 
         """
-        if initial_data != None:
-            for t in xrange(self.order):
-                self.visible_values[t] = self._copy_array(initial_data[t,:], self.visible_values[t].shape)
-                self.hidden_values[t] = self._sample_initial(t,1)
-
-        self.visible_values[self.order] = self._copy_array(current_vector, self.visible_values[self.order].shape)
-        visible_units = numpy.array(self.visible_values[self.order])
-        hidden_units = numpy.array(self.hidden_values[self.order])
+        if initial_data is not None:
+            self._initialise_history(numpy.transpose(initial_data))
 
-        current_time_visible_bias_values = self.connection_weights.dot(self.hidden_values[self.order])
-        visible_bias = self._bias_function_visible()
+        self.visible_values[self.history_head] = current_vector
 
-        current_time_hidden_bias_values = self.connection_weights.T.dot(self.visible_values[self.order])
+        #the current hidden vector is stored in the history, such that it propagates a bias to the next time steps
+        current_time_hidden_bias_values = self.connection_weights.T.dot(self._visible_vector(0))
         hidden_bias = self._bias_function_hidden()
+        sigmoid(current_time_hidden_bias_values + hidden_bias, out=self._hidden_vector(0))
 
-        for neuron in xrange(self.number_hidden_units):
-            prob = self._sigmoid(current_time_hidden_bias_values[neuron] + hidden_bias[neuron])
-            hidden_units[neuron] = prob
-
-        for neuron in xrange(self.number_visible_units):
-            prob = self._sigmoid(current_time_visible_bias_values[neuron] + visible_bias[neuron])
-            threshold = numpy.random.rand()
-
-            if prob > threshold:
-                visible_units[neuron] = 1.
-            else:
-                visible_units[neuron] = 0.
+        current_time_visible_bias_values = self.connection_weights.dot(self._hidden_vector(0))
+        visible_bias = self._bias_function_visible()
+        visible_units = sigmoid(current_time_visible_bias_values + visible_bias)
+        sample_bernoulli(visible_units, out=visible_units)
 
-        self._shift_visible_vectors_back()
+        self._advance_history()
         return visible_units
 
     def _sample(self, k, training_vector=None):
@@ -169,7 +128,7 @@ class TRBM(TRBMBase):
 
         Keyword arguments:
         k -- The number of samples created by Contrastive Divergence before a sample is accepted.
-        training_vector -- A vector that should be used at the t-th time step. (default None, resulting in a vector already stored in self.visible_values[self.order]).
+        training_vector -- A vector that should be used at the t-th time step. (default None, resulting in a vector already stored in the current row of self.visible_values).
 
         Returns:
         visible_units -- A 'numpy.array' containing the sampled visible values.
@@ -177,61 +136,56 @@ class TRBM(TRBMBase):
 
         """
         visible_units = None
-        if training_vector == None:
-            visible_units = numpy.array(self.visible_values[self.order])
+        if training_vector is None:
+            visible_units = numpy.array(self._visible_vector(0))
         else:
             visible_units = numpy.array(training_vector)
-        hidden_units = numpy.array(self.hidden_values[self.order])
+        hidden_units = numpy.array(self._hidden_vector(0))
 
-        current_time_visible_bias_values = self.connection_weights.dot(self.hidden_values[self.order])
+        current_time_visible_bias_values = self.connection_weights.dot(self._hidden_vector(0))
         visible_bias = self._bias_function_visible()
 
-        current_time_hidden_bias_values = self.connection_weights.T.dot(self.visible_values[self.order])
+        current_time_hidden_bias_values = self.connection_weights.T.dot(self._visible_vector(0))
         hidden_bias = self._bias_function_hidden()
 
         for sample in xrange(k):
-            for neuron in xrange(self.number_hidden_units):
-                prob = self._sigmoid(current_time_hidden_bias_values[neuron] + hidden_bias[neuron])
-                hidden_units[neuron] = prob
-
-            for neuron in xrange(self.number_visible_units):
-                prob = self._sigmoid(current_time_visible_bias_values[neuron] + visible_bias[neuron])
-                threshold = numpy.random.rand()
-
-                if prob > threshold:
-                    visible_units[neuron] = 1.
-                else:
-                    visible_units[neuron] = 0.
+            sigmoid(current_time_hidden_bias_values + hidden_bias, out=hidden_units)
+            sigmoid(current_time_visible_bias_values + visible_bias, out=visible_units)
+            sample_bernoulli(visible_units, out=visible_units)
 
         return visible_units, hidden_units
 
-    def _sample_initial(self, t, k):
-        """Samples a hidden layer given only on the visible vector at the current time step.
+    def _sample_initial(self, lag, k):
+        """Samples a hidden layer given only on the visible vector at a previous time step.
         Uses Contrastive Divergence for sampling the values.
 
         Keyword arguments:
-        t -- Current time step.
+        lag -- The number of time steps between the visible vector and the current time step.
         k -- The number of samples created by Contrastive Divergence before a sample is accepted.
 
         Returns:
         hidden_units -- A 'numpy.array' containing the sampled hidden values.
 
         """
-        visible_units = numpy.array(self.visible_values[t])
-        hidden_units = numpy.array(self.hidden_values[t])
+        visible_units = numpy.array(self._visible_vector(lag))
+        hidden_units = numpy.array(self._hidden_vector(lag))
 
         for sample in xrange(k):
-            for neuron in xrange(self.number_hidden_units):
-                prob = self._sigmoid(numpy.sum(self.connection_weights[:,neuron] * visible_units) + self.hidden_bias[neuron])
-                hidden_units[neuron] = prob
+            sigmoid(self.connection_weights.T.dot(visible_units) + self.hidden_bias, out=hidden_units)
+            sigmoid(self.connection_weights.dot(hidden_units) + self.visible_bias, out=visible_units)
+            sample_bernoulli(visible_units, out=visible_units)
 
-            for neuron in xrange(self.number_visible_units):
-                prob = self._sigmoid(numpy.sum(self.connection_weights[neuron,:] * hidden_units) + self.visible_bias[neuron])
-                threshold = numpy.random.rand()
+        return hidden_units
 
-                if prob > threshold:
-                    visible_units[neuron] = 1.
-                else:
-                    visible_units[neuron] = 0.
+    def _sample_visible(self, visible_probabilities):
+        """Samples the values of a batch of visible units given their activation probabilities;
+        binary visible units are 1 with their activation probabilities and 0 otherwise.
 
-        return hidden_units
\ No newline at end of file
+        Keyword arguments:
+        visible_probabilities -- A 'numpy.array' of shape (number_of_vectors, number_visible_units) containing activation probabilities.
+
+        Returns:
+        visible_units -- A 'numpy.array' of shape (number_of_vectors, number_visible_units) containing the sampled values.
+
+        """
+        return sample_bernoulli(visible_probabilities, out=visible_probabilities)
\ No newline at end of file
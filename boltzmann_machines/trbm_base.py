@@ -1,6 +1,7 @@
 from abc import ABCMeta, abstractmethod
 import numpy
-import math
+from numpy.lib.stride_tricks import as_strided
+from activations import sigmoid, sample_bernoulli
 
 class TRBMBase(object):
     __metaclass__ = ABCMeta
@@ -17,6 +18,114 @@ class TRBMBase(object):
         """
         pass
 
+    def train_minibatch(self, data, epochs=100, learning_rate=0.1, batch_size=100, k=1, algorithm='cd', fast_learning_rate=None, fast_weight_decay=0.95):
+        """Trains the Boltzmann machine using mini-batch Contrastive Divergence (CD-k).
+        The time series is viewed as a sequence of overlapping windows of 'order'+1 consecutive vectors without copying the data.
+        For each batch of windows, the autoregressive biases of all time steps are calculated as matrix products and
+        the temporal weights are updated with outer products of the past vectors and the current gradients.
+
+        The hidden vectors of the previous time steps are approximated by the hidden probabilities given only
+        the visible vectors at these time steps, such that the windows are independent of each other and can be processed in any order.
+
+        With persistent Contrastive Divergence ('pcd'), the Gibbs chains are not restarted at the training vectors,
+        but continue from a preallocated pool of fantasy particles that is kept across mini-batches;
+        the i-th particle is sampled given the history of the i-th window of the current batch.
+        Fast-weights PCD ('fpcd') additionally samples the particles using fast connection weights and biases which are trained
+        with the same gradients, but decay quickly, such that the particles move away from the modes they have visited.
+
+        Keyword arguments:
+        data -- A 'numpy.array' containing data for training the RBM. Each row of the array should be a training vector of dimension 'number_visible_units'.
+        epochs -- The number of passes over the training data (default 100).
+        learning_rate -- The algorithm's learning rate (default 0.1).
+        batch_size -- The number of windows in each batch (default 100).
+        k -- The number of Gibbs steps used for creating the negative samples (default 1).
+        algorithm -- The training algorithm: 'cd', 'pcd' or 'fpcd' (default 'cd').
+        fast_learning_rate -- The learning rate of the fast weights used by 'fpcd' (default None, resulting in 'learning_rate').
+        fast_weight_decay -- The factor by which the fast weights used by 'fpcd' are multiplied after each batch (default 0.95).
+
+        """
+        if algorithm not in ('cd', 'pcd', 'fpcd'):
+            raise ValueError('Unknown training algorithm: ' + str(algorithm))
+        if fast_learning_rate == None:
+            fast_learning_rate = learning_rate
+
+        data = numpy.ascontiguousarray(data, dtype=float)
+        number_training_vectors = data.shape[0]
+        number_of_windows = max(number_training_vectors - self.order, 0)
+
+        #window w contains the vectors at time steps w,...,w+order, the last of which is the current vector
+        windows = as_strided(data, shape=(number_of_windows, self.order+1, self.number_visible_units),
+                             strides=(data.strides[0], data.strides[0], data.strides[1]), writeable=False)
+
+        #the fantasy particles are allocated once and are updated in place after each batch
+        if algorithm != 'cd':
+            fantasy_particles = numpy.random.randint(0,2,(batch_size,self.number_visible_units)).astype(float)
+        if algorithm == 'fpcd':
+            fast_weights = numpy.zeros(self.connection_weights.shape)
+            fast_visible_bias = numpy.zeros(self.visible_bias.shape)
+            fast_hidden_bias = numpy.zeros(self.hidden_bias.shape)
+
+        for _ in xrange(epochs):
+            #the windows are visited in a random order in each epoch
+            window_order = numpy.random.permutation(number_of_windows)
+            for batch_start in xrange(0, number_of_windows, batch_size):
+                batch = windows[window_order[batch_start:batch_start+batch_size]]
+                visible_units = batch[:,self.order]
+
+                #past_visible_units[n] and past_hidden_units[n] contain the vectors n+1 time steps before the current one
+                past_visible_units = [batch[:,self.order-n-1] for n in xrange(self.order)]
+                past_hidden_units = [sigmoid(past_visible_units[n].dot(self.connection_weights) + self.hidden_bias.T) for n in xrange(self.order)]
+
+                #we calculate the autoregressive biases of the current time steps
+                visible_bias = numpy.tile(self.visible_bias.T, (visible_units.shape[0],1))
+                hidden_bias = numpy.tile(self.hidden_bias.T, (visible_units.shape[0],1))
+                for n in xrange(self.order):
+                    visible_bias += past_visible_units[n].dot(self.visible_to_visible_bias[n])
+                    hidden_bias += past_visible_units[n].dot(self.visible_to_hidden_bias[n]) + past_hidden_units[n].dot(self.hidden_to_hidden_bias[n])
+
+                data_hidden_probabilities = sigmoid(visible_units.dot(self.connection_weights) + hidden_bias)
+                if algorithm == 'cd':
+                    visible_samples = self._sample_chain(data_hidden_probabilities, self.connection_weights, visible_bias, hidden_bias, k)
+                else:
+                    particles = fantasy_particles[:visible_units.shape[0]]
+                    if algorithm == 'fpcd':
+                        chain_weights = self.connection_weights + fast_weights
+                        chain_visible_bias = visible_bias + fast_visible_bias.T
+                        chain_hidden_bias = hidden_bias + fast_hidden_bias.T
+                    else:
+                        chain_weights, chain_visible_bias, chain_hidden_bias = self.connection_weights, visible_bias, hidden_bias
+                    chain_hidden_probabilities = sigmoid(particles.dot(chain_weights) + chain_hidden_bias)
+                    visible_samples = self._sample_chain(chain_hidden_probabilities, chain_weights, chain_visible_bias, chain_hidden_bias, k)
+                    particles[:] = visible_samples
+                sample_hidden_probabilities = sigmoid(visible_samples.dot(self.connection_weights) + hidden_bias)
+
+                visible_gradient = visible_units - visible_samples
+                hidden_gradient = data_hidden_probabilities - sample_hidden_probabilities
+                weight_gradient = (visible_units.T.dot(data_hidden_probabilities) - visible_samples.T.dot(sample_hidden_probabilities)) / visible_units.shape[0]
+                visible_bias_gradient = numpy.mean(visible_gradient, axis=0)[:,numpy.newaxis]
+                hidden_bias_gradient = numpy.mean(hidden_gradient, axis=0)[:,numpy.newaxis]
+
+                #the parameters are updated in place, such that the weight lists refer to the updated arrays
+                step_size = learning_rate / visible_units.shape[0]
+                self.connection_weights += learning_rate * weight_gradient
+                self.visible_bias += learning_rate * visible_bias_gradient
+                self.hidden_bias += learning_rate * hidden_bias_gradient
+                for n in xrange(self.order):
+                    self.visible_to_visible_bias[n] += step_size * past_visible_units[n].T.dot(visible_gradient)
+                    self.visible_to_hidden_bias[n] += step_size * past_visible_units[n].T.dot(hidden_gradient)
+                    self.hidden_to_hidden_bias[n] += step_size * past_hidden_units[n].T.dot(hidden_gradient)
+                if algorithm == 'fpcd':
+                    fast_weights *= fast_weight_decay
+                    fast_weights += fast_learning_rate * weight_gradient
+                    fast_visible_bias *= fast_weight_decay
+                    fast_visible_bias += fast_learning_rate * visible_bias_gradient
+                    fast_hidden_bias *= fast_weight_decay
+                    fast_hidden_bias += fast_learning_rate * hidden_bias_gradient
+
+        #the last vectors of the series are used as the history for sampling from the network
+        if number_of_windows > 0:
+            self._initialise_history(data[number_training_vectors-self.order:,:])
+
     @abstractmethod
     def sample_network(self, current_vector, initial_data=None):
         """Samples a visible vector from the network.
@@ -38,7 +147,7 @@ class TRBMBase(object):
 
         Keyword arguments:
         k -- The number of samples created by Contrastive Divergence before a sample is accepted.
-        training_vector -- A vector that should be used at the t-th time step. (default None, resulting in a vector already stored in self.visible_values[self.order]).
+        training_vector -- A vector that should be used at the t-th time step. (default None, resulting in a vector already stored in the current row of self.visible_values).
 
         Returns:
         visible_units -- A 'numpy.array' containing the sampled visible values.
@@ -48,12 +157,12 @@ class TRBMBase(object):
         pass
 
     @abstractmethod
-    def _sample_initial(self, t, k):
-        """Samples a hidden layer given only on the visible vector at the current time step.
+    def _sample_initial(self, lag, k):
+        """Samples a hidden layer given only on the visible vector at a previous time step.
         Uses Contrastive Divergence for sampling the values.
 
         Keyword arguments:
-        t -- Current time step.
+        lag -- The number of time steps between the visible vector and the current time step.
         k -- The number of samples created by Contrastive Divergence before a sample is accepted.
 
         Returns:
@@ -62,31 +171,75 @@ class TRBMBase(object):
         """
         pass
 
+    def _sample_chain(self, hidden_probabilities, weights, visible_bias, hidden_bias, k):
+        """Runs k steps of block Gibbs sampling for a batch of time steps, starting from the hidden units.
+
+        Keyword arguments:
+        hidden_probabilities -- A 'numpy.array' of shape (number_of_vectors, number_hidden_units) containing the initial activation probabilities of the hidden units.
+        weights -- A 'numpy.array' containing the connection weights between the visible and the hidden units.
+        visible_bias -- A 'numpy.array' of shape (number_of_vectors, number_visible_units) containing the biases of the visible units, including the autoregressive biases.
+        hidden_bias -- A 'numpy.array' of shape (number_of_vectors, number_hidden_units) containing the biases of the hidden units, including the autoregressive biases.
+        k -- The number of Gibbs steps.
+
+        Returns:
+        visible_units -- A 'numpy.array' of shape (number_of_vectors, number_visible_units) containing the sampled values.
+
+        """
+        for step in xrange(k):
+            if step > 0:
+                hidden_probabilities = sigmoid(visible_units.dot(weights) + hidden_bias)
+            hidden_units = sample_bernoulli(hidden_probabilities)
+            visible_units = self._sample_visible(sigmoid(hidden_units.dot(weights.T) + visible_bias))
+        return visible_units
+
+    @abstractmethod
+    def _sample_visible(self, visible_probabilities):
+        """Samples the values of a batch of visible units given their activation probabilities.
+
+        Keyword arguments:
+        visible_probabilities -- A 'numpy.array' of shape (number_of_vectors, number_visible_units) containing activation probabilities.
+
+        Returns:
+        visible_units -- A 'numpy.array' of shape (number_of_vectors, number_visible_units) containing the sampled values.
+
+        """
+        pass
+
     def _bias_function_visible(self):
         bias = numpy.zeros((self.number_visible_units,1))
         for i in xrange(self.order):
-            value_index = self.order - i - 1
-            bias = bias + self.visible_to_visible_bias[i].T.dot(self.visible_values[value_index])
+            bias = bias + self.visible_to_visible_bias[i].T.dot(self._visible_vector(i+1))
         bias = bias + self.visible_bias
         return bias
 
     def _bias_function_hidden(self):
         bias = numpy.zeros((self.number_hidden_units,1))
         for i in xrange(self.order):
-            value_index = self.order - i - 1
-            bias = bias + self.hidden_to_hidden_bias[i].T.dot(self.hidden_values[value_index]) + self.visible_to_hidden_bias[i].T.dot(self.visible_values[value_index])
+            bias = bias + self.hidden_to_hidden_bias[i].T.dot(self._hidden_vector(i+1)) + self.visible_to_hidden_bias[i].T.dot(self._visible_vector(i+1))
         bias = bias + self.hidden_bias
         return bias
 
-    def _sigmoid(self, x):
-        return 1. / (1. + math.exp(-x))
+    def _visible_vector(self, lag):
+        """Returns a view of the visible vector 'lag' time steps before the current one as a column vector."""
+        return self.visible_values[(self.history_head - lag) % (self.order + 1),:,numpy.newaxis]
+
+    def _hidden_vector(self, lag):
+        """Returns a view of the hidden vector 'lag' time steps before the current one as a column vector."""
+        return self.hidden_values[(self.history_head - lag) % (self.order + 1),:,numpy.newaxis]
+
+    def _advance_history(self):
+        """Moves on to the next time step by advancing the head of the circular buffers,
+        such that the row of the oldest time step is reused for the current one."""
+        self.history_head = (self.history_head + 1) % (self.order + 1)
 
-    def _copy_array(self, src, shape):
-        dst = numpy.zeros(shape)
-        for i in xrange(len(src)):
-            dst[i] = src[i]
-        return dst
+    def _initialise_history(self, vectors):
+        """Stores the visible vectors of the time steps before the current one and samples the corresponding hidden vectors.
 
-    def _shift_visible_vectors_back(self):
-        for n in xrange(self.order):
-            self.visible_values[n] = self._copy_array(self.visible_values[n+1],self.visible_values[n].shape)
\ No newline at end of file
+        Keyword arguments:
+        vectors -- A 'numpy.array' of shape (order, number_visible_units) containing the visible vectors, the oldest one first.
+
+        """
+        self.history_head = self.order
+        self.visible_values[:self.order] = vectors
+        for lag in xrange(self.order,0,-1):
+            self._hidden_vector(lag)[:] = self._sample_initial(lag,1)
\ No newline at end of file
@@ -1,10 +1,13 @@
 import json
+import numpy
+import itertools
 
 from libpgm.nodedata import NodeData
 from libpgm.graphskeleton import GraphSkeleton
 from libpgm.dyndiscbayesiannetwork import DynDiscBayesianNetwork
 
-from inference.sensor_dbn_inference import SensorDbnInference
+from inference.sensor_dbn_inference import SensorDbnInference, MultiStreamSensorDbnInference, FixedLagSmoother, StreamingViterbiDecoder
+from inference.particle_filter import ParticleFilter
 
 network_file = open('test_bayesian_networks/sensor_dbn.txt', 'r')
 network_file_data = eval(network_file.read())
@@ -19,6 +22,31 @@ network.E = network_skeleton.E
 network.initial_Vdata = network_file_data["initial_Vdata"]
 network.twotbn_Vdata = network_file_data["twotbn_Vdata"]
 
+def enumerate_state_sequences(model, measurements):
+    """Returns the joint probabilities of all state sequences and a sequence of measurements of a compiled sensor DBN
+    as a dictionary with tuples of state indices as keys, which is only feasible for short sequences."""
+    measurement_indices = [model.measurement_indices[x] for _,x in enumerate(measurements)]
+    probabilities = dict()
+    for states in itertools.product(range(model.number_of_states), repeat=len(measurements)):
+        probability = 0.
+        for initial_state in xrange(model.number_of_states):
+            path_probability = model.initial_belief[initial_state]
+            previous_state = initial_state
+            for t,state in enumerate(states):
+                path_probability = path_probability * model.transition_probabilities[previous_state,state] * model.measurement_probabilities[state,measurement_indices[t]]
+                previous_state = state
+            probability = probability + path_probability
+        probabilities[states] = probability
+    return probabilities
+
+def enumerate_smoothed_beliefs(model, measurements):
+    """Returns the distributions of the states given all measurements by summing the joint probabilities of the state sequences."""
+    beliefs = numpy.zeros((len(measurements), model.number_of_states))
+    for states,probability in enumerate_state_sequences(model, measurements).items():
+        for t,state in enumerate(states):
+            beliefs[t,state] += probability
+    return beliefs / numpy.sum(beliefs[0])
+
 inference_engine = SensorDbnInference(network)
 print 'Initial belief: ', inference_engine.get_current_belief()
 inference_engine.filter('1')
@@ -26,4 +54,101 @@ print 'Measurement = 1: ', inference_engine.get_current_belief()
 inference_engine.filter('0')
 print 'Measurement = 0: ', inference_engine.get_current_belief()
 inference_engine.filter('0')
-print 'Measurement = 0: ', inference_engine.get_current_belief()
\ No newline at end of file
+print 'Measurement = 0: ', inference_engine.get_current_belief()
+inference_engine.filter_sequence(['1', '0', '0', '0', '1'])
+print 'Measurements = 1, 0, 0, 0, 1: ', inference_engine.get_current_belief()
+
+belief_snapshot = inference_engine.get_belief()
+print 'Belief after measurement = 0 without changing the current belief: ', inference_engine.filter('0', belief_snapshot)
+inference_engine.filter('1')
+inference_engine.set_belief(belief_snapshot)
+print 'Restored belief: ', inference_engine.get_current_belief()
+print 'Log-likelihood of measurements 1, 0, 0, 0: ', inference_engine.compute_log_likelihood(['1', '0', '0', '0'])
+
+multi_stream_inference_engine = MultiStreamSensorDbnInference(network, 3)
+multi_stream_inference_engine.filter(['1', '0', '0'])
+multi_stream_inference_engine.filter(['0', '0', '1'])
+print 'Streams with measurements (1, 0), (0, 0) and (0, 1): ', multi_stream_inference_engine.get_beliefs()
+
+#the beliefs of the streams agree with separate single-stream filters, also if the streams are given as an index array
+multi_stream_inference_engine.reset(numpy.array([0, 2]))
+multi_stream_inference_engine.filter(['0', '1'], streams=numpy.array([0, 2]))
+for stream,measurements in enumerate([['0'], ['0', '0'], ['1']]):
+    single_stream_inference_engine = SensorDbnInference(network)
+    single_stream_inference_engine.filter_sequence(measurements)
+    assert numpy.allclose(multi_stream_inference_engine.get_belief(stream), single_stream_inference_engine.get_belief())
+
+smoothing_inference_engine = SensorDbnInference(network)
+print 'Smoothed beliefs for measurements 1, 0, 0, 0: ', smoothing_inference_engine.smooth(['1', '0', '0', '0'])
+
+fixed_lag_smoother = FixedLagSmoother(network, 2)
+for _,measurement in enumerate(['1', '0', '0', '0']):
+    fixed_lag_smoother.update(measurement)
+print 'Fixed-lag smoothed beliefs of the last two measurements: ', fixed_lag_smoother.flush()
+
+#the smoothed beliefs agree with the enumeration of all state sequences; the fixed-lag smoother returns the belief
+#from 'lag' measurements ago given the measurements so far, and the flushed beliefs are smoothed given all measurements
+smoothing_measurements = ['1', '0', '0', '0', '1', '0', '0']
+assert numpy.allclose(smoothing_inference_engine.smooth(smoothing_measurements), enumerate_smoothed_beliefs(smoothing_inference_engine.model, smoothing_measurements))
+for lag in xrange(4):
+    fixed_lag_smoother = FixedLagSmoother(network, lag)
+    for t,measurement in enumerate(smoothing_measurements):
+        smoothed_belief = fixed_lag_smoother.update(measurement)
+        if t < lag:
+            assert smoothed_belief is None
+        else:
+            assert numpy.allclose(smoothed_belief, smoothing_inference_engine.smooth(smoothing_measurements[:t+1])[t-lag])
+    flushed_beliefs = fixed_lag_smoother.flush()
+    assert len(flushed_beliefs) == lag
+    assert numpy.allclose(flushed_beliefs, smoothing_inference_engine.smooth(smoothing_measurements)[len(smoothing_measurements)-lag:])
+
+decoding_inference_engine = SensorDbnInference(network)
+print 'Most probable states for measurements 1, 0, 0, 0: ', decoding_inference_engine.decode(['1', '0', '0', '0'])
+
+streaming_decoder = StreamingViterbiDecoder(network)
+decided_states = []
+for _,measurement in enumerate(['1', '0', '0', '0']):
+    decided_states = decided_states + streaming_decoder.update(measurement)
+print 'Streaming decoder - decided states: ', decided_states, ', remaining states: ', streaming_decoder.flush()
+
+#the decoded states are a most probable state sequence of the enumeration and the streaming decoder decides the same states
+for _,decoding_measurements in enumerate([['1', '0', '0', '0'], ['1', '0', '0', '0', '0', '0', '0'], ['0', '0', '1', '0', '0', '0', '0', '0', '1']]):
+    sequence_probabilities = enumerate_state_sequences(decoding_inference_engine.model, decoding_measurements)
+    states, log_probability = decoding_inference_engine.decode(decoding_measurements)
+    state_indices = tuple([decoding_inference_engine.model.state_indices[x] for _,x in enumerate(states)])
+    assert numpy.isclose(sequence_probabilities[state_indices], max(sequence_probabilities.values()))
+    assert numpy.isclose(log_probability, numpy.log(max(sequence_probabilities.values())))
+
+    for max_traceback in [1, 1000]:
+        streaming_decoder = StreamingViterbiDecoder(network, max_traceback)
+        decided_states = []
+        for _,measurement in enumerate(decoding_measurements):
+            decided_states = decided_states + streaming_decoder.update(measurement)
+        decided_states = decided_states + streaming_decoder.flush()
+        if max_traceback == 1000:
+            assert decided_states == list(states)
+        else:
+            assert len(decided_states) == len(decoding_measurements)
+
+particle_filter = ParticleFilter(network, 10000)
+for _,measurement in enumerate(['1', '0', '0', '0']):
+    particle_filter.filter({'measurement': measurement})
+print 'Particle filter - measurements = 1, 0, 0, 0: ', particle_filter.get_belief('state')
+
+#a seeded particle filter is reproducible and its beliefs agree with the exact filter; with 20000 particles,
+#the largest error over twenty seeds was about 0.013, so a tolerance of 0.03 leaves a wide margin
+filtering_measurements = ['1', '0', '0', '0', '1', '0', '0']
+particle_beliefs = []
+for _,seed in enumerate([5, 5]):
+    particle_filter = ParticleFilter(network, 20000, seed=seed)
+    exact_inference_engine = SensorDbnInference(network)
+    beliefs = []
+    for _,measurement in enumerate(filtering_measurements):
+        particle_filter.filter({'measurement': measurement})
+        exact_inference_engine.filter(measurement)
+        belief = particle_filter.get_belief('state')
+        for value,probability in exact_inference_engine.get_current_belief().items():
+            assert abs(belief[value] - probability) < 0.03
+        beliefs.append(belief)
+    particle_beliefs.append(beliefs)
+assert particle_beliefs[0] == particle_beliefs[1]
@@ -15,4 +15,16 @@ network = DBN(10,[15])
 network.train(data, epochs=10, learning_rate=0.1)
 
 network = DBNContinuous(10,[15])
-network.train(data, epochs=10, learning_rate=0.1)
\ No newline at end of file
+network.train(data, epochs=10, learning_rate=0.1)
+
+network = DBN(10,[15])
+network.train_minibatch(data, epochs=10, learning_rate=0.1, batch_size=100, k=1)
+
+network = DBNContinuous(10,[15])
+network.train_minibatch(data, epochs=10, learning_rate=0.1, batch_size=100, k=1)
+
+network = DBN(10,[15])
+network.train_minibatch(data, epochs=10, learning_rate=0.05, batch_size=100, k=1, algorithm='pcd')
+
+network = DBNContinuous(10,[15])
+network.train_minibatch(data, epochs=10, learning_rate=0.05, batch_size=100, k=1, algorithm='fpcd')
\ No newline at end of file
@@ -62,8 +62,8 @@ observation_network.twotbn_Vdata = observation_network_file_data["twotbn_Vdata"]
 sensor_inference_engine = SensorDbnInference(sensor_network)
 obs_inference_engine = SensorDbnInference(observation_network)
 
-previous_observation = observation_network.initial_Vdata['state']['vals'][numpy.argmax(observation_network.initial_Vdata['state']['cprob'])]
-transition = observation_network.initial_Vdata['state']['vals'][numpy.argmax(observation_network.initial_Vdata['state']['cprob'])]
+previous_observation = obs_inference_engine.model.state_values[numpy.argmax(obs_inference_engine.get_belief())]
+transition = obs_inference_engine.model.state_values[numpy.argmax(obs_inference_engine.get_belief())]
 state = numpy.zeros(2)
 state[0] = numpy.random.randint(0,2)
 print sensor_inference_engine.get_current_belief()
@@ -72,12 +72,12 @@ for i in xrange(1,10):
     print 'Measurements -> ', state
     cluster = numpy.argmin(numpy.apply_along_axis(numpy.linalg.norm, 1, state - means))
     obs_inference_engine.filter(str(cluster))
-    transition = transition + observation_network.initial_Vdata['state']['vals'][numpy.argmax(observation_network.initial_Vdata['state']['cprob'])]
+    transition = transition + obs_inference_engine.model.state_values[numpy.argmax(obs_inference_engine.get_belief())]
     sensor_inference_engine.filter(transition)
 
     print 'Likely transition -> ', transition
     print sensor_inference_engine.get_current_belief()
     print
 
-    transition = '' + observation_network.initial_Vdata['state']['vals'][numpy.argmax(observation_network.initial_Vdata['state']['cprob'])]
+    transition = '' + obs_inference_engine.model.state_values[numpy.argmax(obs_inference_engine.get_belief())]
     state[0] = state[1]
\ No newline at end of file
@@ -1,19 +1,44 @@
 import numpy
+import time
+import multiprocessing
+from compiled_network import CompiledNetwork, compile_network
+from network_pruning import NetworkPruner
+from gibbs_sampling import GibbsSamplingEngine
+from exact_inference import ExactInferenceEngine
+from random_streams import create_random_states
+from convergence import beta_standard_error, is_estimate_final
+from log_space import log_probabilities, logsumexp, normalise_log_values
 
 class ApproximateInferenceEngine(object):
-    def __init__(self, network):
+    def __init__(self, network, prune_network=True):
         """Defines an engine for performing approximate inference in a discrete Bayesian network.
 
         Keyword arguments:
-        network -- A 'libpgm.discretebayesiannetwork.DiscreteBayesianNetwork' object representing a discrete Bayesian network.
+        network -- A 'libpgm.discretebayesiannetwork.DiscreteBayesianNetwork' object representing a discrete Bayesian network
+                   or a 'CompiledNetwork' object created from such a network.
+        prune_network -- If True, each query is answered in the minimal subnetwork that is relevant for the query (default True).
 
         """
         self.network = network
 
-        #a topological order will be needed in the process of generating variable assignments
-        self.network.toporder()
+        #the compiled network stores the variables in a topological order,
+        #which is needed in the process of generating variable assignments
+        if isinstance(network, CompiledNetwork):
+            self.model = network
+        else:
+            self.model = compile_network(network)
+
+        self.pruner = None
+        if prune_network:
+            self.pruner = NetworkPruner(self.model, self.__create_pruned_engine)
+
+        #the Markov blanket tables used for Gibbs sampling are only created when they are needed
+        self.gibbs_engine = None
+
+        #the fraction of samples that supported the evidence in the most recent rejection sampling query
+        self.acceptance_rate = None
 
-    def perform_rs_inference(self, query_variable, evidence_variables, number_of_samples):
+    def perform_rs_inference(self, query_variable, evidence_variables, number_of_samples, batch_size=10000, number_of_processes=1, seed=None):
         """Calculates the probability distribution P(query_variable|evidence_variables)
         using rejection sampling. Assumes that we have only one query variable.
 
@@ -21,35 +46,33 @@ class ApproximateInferenceEngine(object):
         query_variable -- The name of the query variable (as called in the network).
         evidence_variables -- A dictionary containing variable names as keys and observed values as values.
         number_of_samples -- The number of samples that should be used in the sampling process.
+        batch_size -- The number of samples that are generated at once (default 10000).
+        number_of_processes -- The number of worker processes among which the batches are distributed (default 1).
+        seed -- A seed for the random number generators of the batches (default None, in which case
+                the generators are seeded from the global 'numpy.random' generator).
 
         Returns:
         distribution -- A dictionary containing the values of the query variable as keys and the probabilities as values.
 
         """
-        evidence_supporting_sample_counter = 0.
-        distribution = dict()
-        number_of_variable_values = len(self.network.Vdata[query_variable]['vals'])
-        for i in xrange(number_of_variable_values):
-            distribution[self.network.Vdata[query_variable]['vals'][i]] = 0.
-
-        for i in xrange(number_of_samples):
-            sample_assignments = self.generate_rs_sample()
-            supports_evidence = True
-            for key in evidence_variables.keys():
-                if evidence_variables[key] != sample_assignments[key]:
-                    supports_evidence = False
-                    break
-
-            if supports_evidence:
-                evidence_supporting_sample_counter = evidence_supporting_sample_counter + 1.
-                distribution[sample_assignments[query_variable]] = distribution[sample_assignments[query_variable]] + 1.
-
+        if self.pruner != None:
+            engine, evidence_variables = self.pruner.get_engine([query_variable], evidence_variables)
+            distribution = engine.perform_rs_inference(query_variable, evidence_variables, number_of_samples, batch_size, number_of_processes, seed)
+            self.acceptance_rate = engine.acceptance_rate
+            return distribution
+
+        query_index = self.model.variable_indices[query_variable]
+        evidence = self.model.encode_evidence(evidence_variables)
+        value_counts = self.__sample_in_batches('rs', query_index, evidence, number_of_samples, batch_size, number_of_processes, seed)
+
+        #the counts only contain the samples that support the evidence
+        evidence_supporting_sample_counter = numpy.sum(value_counts)
+        self.acceptance_rate = evidence_supporting_sample_counter / max(number_of_samples, 1)
         if evidence_supporting_sample_counter > 1e-10:
-            for key in distribution.keys():
-                distribution[key] = distribution[key] / evidence_supporting_sample_counter
-        return distribution
+            value_counts = value_counts / evidence_supporting_sample_counter
+        return self.__create_distribution(query_index, value_counts)
 
-    def perform_lw_inference(self, query_variable, evidence_variables, number_of_samples):
+    def perform_lw_inference(self, query_variable, evidence_variables, number_of_samples, batch_size=10000, number_of_processes=1, seed=None, log_space=False):
         """Calculates the probability distribution P(query_variable|evidence_variables)
         using likelihood weighting. Assumes that we have only one query variable.
 
@@ -57,28 +80,85 @@ class ApproximateInferenceEngine(object):
         query_variable -- The name of the query variable (as called in the network).
         evidence_variables -- A dictionary containing variable names as keys and observed values as values.
         number_of_samples -- The number of samples that should be used in the sampling process.
+        batch_size -- The number of samples that are generated at once (default 10000).
+        number_of_processes -- The number of worker processes among which the batches are distributed (default 1).
+        seed -- A seed for the random number generators of the batches (default None, in which case
+                the generators are seeded from the global 'numpy.random' generator).
+        log_space -- If True, the sample weights are accumulated as sums of log-likelihoods and combined using log-sum-exp,
+                     such that the weights do not underflow for large evidence sets (default False).
 
         Returns:
         distribution -- A dictionary containing the values of the query variable as keys and the probabilities as values.
 
         """
-        distribution = dict()
-        number_of_variable_values = len(self.network.Vdata[query_variable]['vals'])
-        for i in xrange(number_of_variable_values):
-            distribution[self.network.Vdata[query_variable]['vals'][i]] = 0.
+        if self.pruner != None:
+            engine, evidence_variables = self.pruner.get_engine([query_variable], evidence_variables)
+            return engine.perform_lw_inference(query_variable, evidence_variables, number_of_samples, batch_size, number_of_processes, seed, log_space)
 
-        for i in xrange(number_of_samples):
-            sample_assignments, weight = self.generate_lw_sample(evidence_variables)
-            distribution[sample_assignments[query_variable]] = distribution[sample_assignments[query_variable]] + weight
+        query_index = self.model.variable_indices[query_variable]
+        evidence = self.model.encode_evidence(evidence_variables)
+        value_weights = self.__sample_in_batches('lw', query_index, evidence, number_of_samples, batch_size, number_of_processes, seed, log_space)
 
-        normaliser = 0.
-        for key in distribution.keys():
-            normaliser = normaliser + distribution[key]
+        if log_space:
+            if numpy.all(value_weights == -numpy.inf):
+                return self.__create_distribution(query_index, numpy.zeros(len(value_weights)))
+            return self.__create_distribution(query_index, normalise_log_values(value_weights))
 
+        normaliser = numpy.sum(value_weights)
         if normaliser > 1e-10:
-            for key in distribution.keys():
-                distribution[key] = distribution[key] / normaliser
-        return distribution
+            value_weights = value_weights / normaliser
+        return self.__create_distribution(query_index, value_weights)
+
+    def perform_adaptive_inference(self, query_variable, evidence_variables, number_of_samples, min_acceptance_rate=0.01,
+                                   max_exact_factor_size=100000, batch_size=10000, seed=None):
+        """Calculates the probability distribution P(query_variable|evidence_variables) using rejection sampling,
+        monitoring the acceptance rate after each batch. If the rate falls below 'min_acceptance_rate', the samples are discarded
+        and the query is answered by variable elimination if the largest factor it creates in the pruned network has at most
+        'max_exact_factor_size' entries and by likelihood weighting with 'number_of_samples' samples otherwise.
+
+        Keyword arguments:
+        query_variable -- The name of the query variable (as called in the network).
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+        number_of_samples -- The number of samples that should be used in the sampling process.
+        min_acceptance_rate -- The lowest acceptable fraction of samples that support the evidence (default 0.01).
+        max_exact_factor_size -- The largest factor size for which exact inference is used instead of likelihood weighting (default 100000).
+        batch_size -- The number of samples that are generated at once (default 10000).
+        seed -- A seed for the random number generators of the batches (default None).
+
+        Returns:
+        distribution -- A dictionary containing the values of the query variable as keys and the probabilities as values.
+        engine_name -- The method that produced the distribution: 'rs', 'lw' or 'exact'.
+
+        """
+        if self.pruner != None:
+            engine, evidence_variables = self.pruner.get_engine([query_variable], evidence_variables)
+            result = engine.perform_adaptive_inference(query_variable, evidence_variables, number_of_samples,
+                                                       min_acceptance_rate, max_exact_factor_size, batch_size, seed)
+            self.acceptance_rate = engine.acceptance_rate
+            return result
+
+        query_index = self.model.variable_indices[query_variable]
+        evidence = self.model.encode_evidence(evidence_variables)
+        batch_sizes = [min(batch_size, number_of_samples - x) for x in xrange(0, number_of_samples, batch_size)]
+        random_states = create_random_states(seed, len(batch_sizes))
+
+        value_counts = numpy.zeros(self.model.cardinalities[query_index])
+        generated_sample_counter = 0
+        for i,current_batch_size in enumerate(batch_sizes):
+            value_counts = value_counts + self._count_batch('rs', query_index, evidence, current_batch_size, random_states[i])
+            generated_sample_counter = generated_sample_counter + current_batch_size
+            self.acceptance_rate = numpy.sum(value_counts) / generated_sample_counter
+
+            if self.acceptance_rate < min_acceptance_rate:
+                exact_inference_engine = ExactInferenceEngine(self.model, False)
+                if exact_inference_engine.predict_largest_factor_size(query_variable, evidence_variables) <= max_exact_factor_size:
+                    return exact_inference_engine.perform_ve_inference(query_variable, evidence_variables), 'exact'
+                return self.perform_lw_inference(query_variable, evidence_variables, number_of_samples, batch_size, 1, seed), 'lw'
+
+        evidence_supporting_sample_counter = numpy.sum(value_counts)
+        if evidence_supporting_sample_counter > 1e-10:
+            value_counts = value_counts / evidence_supporting_sample_counter
+        return self.__create_distribution(query_index, value_counts), 'rs'
 
     def perform_gibbs_inference(self, query_variable, evidence_variables, number_of_samples):
         """Calculates the probability distribution P(query_variable|evidence_variables)
@@ -93,126 +173,120 @@ class ApproximateInferenceEngine(object):
         distribution -- A dictionary containing the values of the query variable as keys and the probabilities as values.
 
         """
-        distribution = dict()
-        number_of_variable_values = len(self.network.Vdata[query_variable]['vals'])
-        for i in xrange(number_of_variable_values):
-            distribution[self.network.Vdata[query_variable]['vals'][i]] = 0.
+        if self.pruner != None:
+            engine, evidence_variables = self.pruner.get_engine([query_variable], evidence_variables)
+            return engine.perform_gibbs_inference(query_variable, evidence_variables, number_of_samples)
 
-        variable_assignments = dict()
+        return self.__get_gibbs_engine().perform_inference(query_variable, evidence_variables, number_of_samples)
 
-        #we initialise the variables randomly before generating samples
-        for _,variable in enumerate(self.network.V):
-            if variable in evidence_variables.keys():
-                variable_assignments[variable] = evidence_variables[variable]
-            else:
-                value_index = numpy.random.randint(0,len(self.network.Vdata[variable]['vals']))
-                variable_assignments[variable] = self.network.Vdata[variable]['vals'][value_index]
+    def stream_rs_inference(self, query_variable, evidence_variables, batch_size=1000, target_standard_error=None, max_samples=None, time_limit=None, seed=None):
+        """Estimates the probability distribution P(query_variable|evidence_variables) using rejection sampling,
+        yielding an updated estimate after each batch of samples. The iteration stops once all standard errors
+        are at most 'target_standard_error' and at least 100 samples have been accepted,
+        'max_samples' samples have been generated or 'time_limit' seconds have passed;
+        if none of them is given, the caller is responsible for stopping the iteration.
 
-        for i in xrange(number_of_samples):
-            variable_assignments = self.generate_gibbs_sample(variable_assignments, evidence_variables)
-            distribution[variable_assignments[query_variable]] = distribution[variable_assignments[query_variable]] + 1.
+        Keyword arguments:
+        query_variable -- The name of the query variable (as called in the network).
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+        batch_size -- The number of samples generated between two estimates (default 1000).
+        target_standard_error -- The required standard error of each estimated probability (default None).
+        max_samples -- The maximum number of generated samples (default None).
+        time_limit -- The maximum number of seconds spent on sampling (default None).
+        seed -- A seed for the random number generator (default None).
 
-        normaliser = 0.
-        for key in distribution.keys():
-            normaliser = normaliser + distribution[key]
+        Returns:
+        A generator of tuples (distribution, standard_errors, number_of_samples), where 'distribution' and 'standard_errors'
+        are dictionaries containing the values of the query variable as keys and 'number_of_samples' is the number of generated samples.
 
-        if normaliser > 1e-10:
-            for key in distribution.keys():
-                distribution[key] = distribution[key] / normaliser
-        return distribution
+        """
+        if self.pruner != None:
+            engine, evidence_variables = self.pruner.get_engine([query_variable], evidence_variables)
+            for estimate in engine.stream_rs_inference(query_variable, evidence_variables, batch_size, target_standard_error, max_samples, time_limit, seed):
+                yield estimate
+            return
+
+        for estimate in self.__stream_batches('rs', query_variable, evidence_variables, batch_size, target_standard_error, max_samples, time_limit, seed):
+            yield estimate
+
+    def stream_lw_inference(self, query_variable, evidence_variables, batch_size=1000, target_standard_error=None, max_samples=None, time_limit=None, seed=None, log_space=False):
+        """Estimates the probability distribution P(query_variable|evidence_variables) using likelihood weighting,
+        yielding an updated estimate after each batch of samples. The iteration stops once all standard errors
+        are at most 'target_standard_error' and the effective number of weighted samples is at least 100,
+        'max_samples' samples have been generated or 'time_limit' seconds have passed;
+        if none of them is given, the caller is responsible for stopping the iteration.
 
-    def generate_rs_sample(self):
-        """Generates a random assignment for the variables in the network.
-        The assignment respects the conditional probabilities in the network.
+        Keyword arguments:
+        query_variable -- The name of the query variable (as called in the network).
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+        batch_size -- The number of samples generated between two estimates (default 1000).
+        target_standard_error -- The required standard error of each estimated probability (default None).
+        max_samples -- The maximum number of generated samples (default None).
+        time_limit -- The maximum number of seconds spent on sampling (default None).
+        seed -- A seed for the random number generator (default None).
+        log_space -- If True, the sample weights are calculated as log-likelihoods and are rescaled by the largest
+                     weight seen so far before they are accumulated, such that they do not underflow (default False).
 
         Returns:
-        assigned_values -- A dictionary containing variable names and their assigned values.
+        A generator of tuples (distribution, standard_errors, number_of_samples), where 'distribution' and 'standard_errors'
+        are dictionaries containing the values of the query variable as keys and 'number_of_samples' is the number of generated samples.
 
         """
-        number_of_variables = len(self.network.V)
-        assigned_values = dict()
-        for i in xrange(number_of_variables):
-            assigned_values[self.network.V[i]] = ''
-
-        for i in xrange(number_of_variables):
-            current_variable = self.network.V[i]
-            parent_values = self.get_parent_values(current_variable, assigned_values)
-
-            cumulative_distribution = [0.]
-            if parent_values == None:
-                number_of_values = len(self.network.Vdata[current_variable]['cprob'])
-                for i in xrange(number_of_values):
-                    cumulative_distribution.append(cumulative_distribution[i] + self.network.Vdata[current_variable]['cprob'][i])
-            else:
-                number_of_values = len(self.network.Vdata[current_variable]['cprob'][parent_values])
-                for i in xrange(number_of_values):
-                    cumulative_distribution.append(cumulative_distribution[i] + self.network.Vdata[current_variable]['cprob'][parent_values][i])
+        if self.pruner != None:
+            engine, evidence_variables = self.pruner.get_engine([query_variable], evidence_variables)
+            for estimate in engine.stream_lw_inference(query_variable, evidence_variables, batch_size, target_standard_error, max_samples, time_limit, seed, log_space):
+                yield estimate
+            return
+
+        for estimate in self.__stream_batches('lw', query_variable, evidence_variables, batch_size, target_standard_error, max_samples, time_limit, seed, log_space):
+            yield estimate
 
-            value_index = 1
-            number_of_values = len(cumulative_distribution)
-            random_number = numpy.random.rand()
-            while value_index < number_of_values and random_number > cumulative_distribution[value_index]:
-                value_index = value_index + 1
+    def stream_gibbs_inference(self, query_variable, evidence_variables, sweeps_per_estimate=1000, number_of_chains=1, burn_in=500,
+                               target_standard_error=None, max_samples=None, time_limit=None, seed=None):
+        """Estimates the probability distribution P(query_variable|evidence_variables) using Gibbs sampling,
+        yielding an updated estimate after every 'sweeps_per_estimate' sweeps. See 'GibbsSamplingEngine.stream_inference'.
 
-            #we decrease the index by 1 because of the additional value in the cumulative distribution array
-            value_index = value_index - 1
-            assigned_values[current_variable] = self.network.Vdata[current_variable]['vals'][value_index]
+        Returns:
+        A generator of tuples (distribution, standard_errors, number_of_samples).
+
+        """
+        if self.pruner != None:
+            engine, evidence_variables = self.pruner.get_engine([query_variable], evidence_variables)
+            for estimate in engine.stream_gibbs_inference(query_variable, evidence_variables, sweeps_per_estimate,
+                                                          number_of_chains, burn_in, target_standard_error, max_samples, time_limit, seed):
+                yield estimate
+            return
 
-        return assigned_values
+        for estimate in self.__get_gibbs_engine().stream_inference(query_variable, evidence_variables, sweeps_per_estimate,
+                                                                   number_of_chains, burn_in, target_standard_error, max_samples, time_limit, seed):
+            yield estimate
 
-    def generate_lw_sample(self, evidence_variables):
+    def generate_rs_sample(self):
         """Generates a random assignment for the variables in the network.
         The assignment respects the conditional probabilities in the network.
 
-        Keyword arguments:
-        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
-
         Returns:
         assigned_values -- A dictionary containing variable names and their assigned values.
 
         """
-        number_of_variables = len(self.network.V)
-        assigned_values = dict()
-        for i in xrange(number_of_variables):
-            if self.network.V[i] in evidence_variables.keys():
-                assigned_values[self.network.V[i]] = evidence_variables[self.network.V[i]]
-            else:
-                assigned_values[self.network.V[i]] = ''
+        sample_assignments,_ = self._sample_assignments()
+        return self.model.decode_assignments(sample_assignments)
 
-        weight = 1.
-        for i in xrange(number_of_variables):
-            current_variable = self.network.V[i]
-            parent_values = self.get_parent_values(current_variable, assigned_values)
-
-            #we update the weight if we are sampling an evidence variable
-            if self.network.V[i] in evidence_variables.keys():
-                value_index = self.network.Vdata[current_variable]['vals'].index(evidence_variables[self.network.V[i]])
-                if parent_values == None:
-                    weight = weight * self.network.Vdata[current_variable]['cprob'][value_index]
-                else:
-                    weight = weight * self.network.Vdata[current_variable]['cprob'][parent_values][value_index]
-            else:
-                cumulative_distribution = [0.]
-                if parent_values == None:
-                    number_of_values = len(self.network.Vdata[current_variable]['cprob'])
-                    for i in xrange(number_of_values):
-                        cumulative_distribution.append(cumulative_distribution[i] + self.network.Vdata[current_variable]['cprob'][i])
-                else:
-                    number_of_values = len(self.network.Vdata[current_variable]['cprob'][parent_values])
-                    for i in xrange(number_of_values):
-                        cumulative_distribution.append(cumulative_distribution[i] + self.network.Vdata[current_variable]['cprob'][parent_values][i])
+    def generate_lw_sample(self, evidence_variables, log_space=False):
+        """Generates a random assignment for the variables in the network.
+        The assignment respects the conditional probabilities in the network.
 
-                value_index = 1
-                number_of_values = len(cumulative_distribution)
-                random_number = numpy.random.rand()
-                while value_index < number_of_values and random_number > cumulative_distribution[value_index]:
-                    value_index = value_index + 1
+        Keyword arguments:
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+        log_space -- If True, the logarithm of the weight is returned (default False).
 
-                #we decrease the index by 1 because of the additional value in the cumulative distribution array
-                value_index = value_index - 1
-                assigned_values[current_variable] = self.network.Vdata[current_variable]['vals'][value_index]
+        Returns:
+        assigned_values -- A dictionary containing variable names and their assigned values.
+        weight -- The likelihood of the evidence given the sampled values (or its logarithm).
 
-        return assigned_values, weight
+        """
+        sample_assignments, weight = self._sample_assignments(self.model.encode_evidence(evidence_variables), log_space)
+        return self.model.decode_assignments(sample_assignments), weight
 
     def generate_gibbs_sample(self, variable_assignments, evidence_variables):
         """Generates a random assignment for the non-evidence variables in the network,
@@ -226,59 +300,34 @@ class ApproximateInferenceEngine(object):
         variable_assignments -- A dictionary containing variable names as keys and variable assignments as values.
 
         """
-        variables_to_sample = list(set(self.network.V) - set(evidence_variables.keys()))
-
-        for _,variable in enumerate(variables_to_sample):
-            #we calculate the product of the probabilities of the children
-            #given their parents if the variable has any children
-            value_probabilities = dict()
-            for _,value in enumerate(self.network.Vdata[variable]['vals']):
-                value_probabilities[value] = 1.
-
-            if self.network.Vdata[variable]['children'] != None:
-                for _,value in enumerate(self.network.Vdata[variable]['vals']):
-                    alternative_assignments = dict(variable_assignments)
-                    alternative_assignments[variable] = value
-                    children_probability_product = 1.
-
-                    for _,child in enumerate(self.network.Vdata[variable]['children']):
-                        value_index = self.network.Vdata[child]['vals'].index(variable_assignments[child])
-                        parent_values = self.get_parent_values(child, alternative_assignments)
-                        children_probability_product = children_probability_product * self.network.Vdata[child]['cprob'][parent_values][value_index]
-                    value_probabilities[value] = children_probability_product
-
-            parent_values = self.get_parent_values(variable, variable_assignments)
-            normaliser = 0.
-
-            #we multiply the children probability by the probability of the
-            #current variable given its parents (or by its prior if it has no parents)
-            if parent_values == None:
-                for i,value in enumerate(self.network.Vdata[variable]['vals']):
-                    value_probabilities[value] = value_probabilities[value] * self.network.Vdata[variable]['cprob'][i]
-                    normaliser = normaliser + value_probabilities[value]
-            else:
-                for i,value in enumerate(self.network.Vdata[variable]['vals']):
-                    value_probabilities[value] = value_probabilities[value] * self.network.Vdata[variable]['cprob'][parent_values][i]
-                    normaliser = normaliser + value_probabilities[value]
+        state = numpy.zeros((self.model.number_of_variables, 1), dtype=int)
+        for i,variable in enumerate(self.model.variables):
+            state[i] = self.model.value_indices[i][variable_assignments[variable]]
 
-            for _,key in enumerate(value_probabilities.keys()):
-                value_probabilities[key] = value_probabilities[key] / normaliser
+        variables_to_sample = [self.model.variable_indices[x] for x in self.model.variables if x not in evidence_variables]
+        self.__get_gibbs_engine()._sweep(state, variables_to_sample)
+        return self.model.decode_assignments(state[:,0])
 
-            cumulative_distribution = [0.]
-            for i,value in enumerate(self.network.Vdata[variable]['vals']):
-                cumulative_distribution.append(cumulative_distribution[i] + value_probabilities[value])
+    def generate_sample_batch(self, number_of_samples, evidence_variables=None, log_space=False):
+        """Generates a batch of random assignments for the variables in the network.
+        The assignments respect the conditional probabilities in the network; if evidence is given,
+        the evidence variables are fixed to their observed values and each sample is weighted by the likelihood of the evidence.
 
-            value_index = 1
-            number_of_values = len(cumulative_distribution)
-            random_number = numpy.random.rand()
-            while value_index < number_of_values and random_number > cumulative_distribution[value_index]:
-                value_index = value_index + 1
+        Keyword arguments:
+        number_of_samples -- The number of assignments that should be generated.
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values (default None).
+        log_space -- If True, the logarithms of the weights are returned (default False).
 
-            #we decrease the index by 1 because of the additional value in the cumulative distribution array
-            value_index = value_index - 1
-            variable_assignments[variable] = self.network.Vdata[variable]['vals'][value_index]
+        Returns:
+        assignments -- An integer 'numpy.array' of shape (number_of_variables, number_of_samples) containing value indices;
+                       the rows follow the order of the variables in 'self.model.variables'.
+        weights -- A 'numpy.array' containing the weight (or log-weight) of each of the samples.
 
-        return variable_assignments
+        """
+        evidence = None
+        if evidence_variables != None:
+            evidence = self.model.encode_evidence(evidence_variables)
+        return self._sample_batch(number_of_samples, evidence, numpy.random, log_space)
 
     def get_parent_values(self, variable, assigned_values):
         """Returns the assigned values to the parent variables of a given variable.
@@ -292,14 +341,282 @@ class ApproximateInferenceEngine(object):
         The string is in a format compatible with the network representation.
 
         """
-        if self.network.Vdata[variable]['parents'] == None:
+        variable_index = self.model.variable_indices[variable]
+        if len(self.model.parents[variable_index]) == 0:
             return None
         else:
-            number_of_parents = len(self.network.Vdata[variable]['parents'])
             parent_values = []
-            for i in xrange(number_of_parents):
-                current_parent = self.network.Vdata[variable]['parents'][i]
-                parent_values.append(assigned_values[current_parent])
+            for _,parent in enumerate(self.model.parents[variable_index]):
+                parent_values.append(assigned_values[self.model.variables[parent]])
             parent_values_string = "[" + ", ".join("'" + x + "'" for x in parent_values) + "]"
 
-        return parent_values_string
\ No newline at end of file
+        return parent_values_string
+
+    def _sample_assignments(self, evidence=None, log_space=False):
+        """Generates a random assignment for the variables in the network by sampling them in topological order.
+        Evidence variables are not sampled, but their likelihood given the sampled values of their parents is accumulated.
+
+        Keyword arguments:
+        evidence -- A dictionary containing variable indices as keys and observed value indices as values
+                    (default None, in which case all variables are sampled).
+        log_space -- If True, the log-likelihoods of the evidence variables are summed instead (default False).
+
+        Returns:
+        assignments -- An integer 'numpy.array' containing the value indices assigned to the variables.
+        weight -- The likelihood of the evidence given the sampled values (or its logarithm).
+
+        """
+        if evidence == None:
+            evidence = dict()
+
+        assignments = numpy.zeros(self.model.number_of_variables, dtype=int)
+        weight = 0. if log_space else 1.
+        for i in xrange(self.model.number_of_variables):
+            row_index = self.model.get_row_index(i, assignments)
+
+            #we update the weight if we are sampling an evidence variable
+            if i in evidence:
+                assignments[i] = evidence[i]
+                if log_space:
+                    weight = weight + self.model.get_log_probability(i, assignments)
+                else:
+                    weight = weight * self.model.cpt_rows[i][row_index, evidence[i]]
+            else:
+                cumulative_distribution = self.model.cumulative_cpt_rows[i][row_index]
+                value_index = numpy.searchsorted(cumulative_distribution, numpy.random.rand(), side='right')
+                assignments[i] = min(value_index, self.model.cardinalities[i]-1)
+
+        return assignments, weight
+
+    def _count_batch(self, sampling_method, query_index, evidence, number_of_samples, random_state=numpy.random, log_space=False):
+        """Generates a batch of samples and accumulates the (weighted) counts of the values of the query variable.
+
+        Keyword arguments:
+        sampling_method -- 'rs' for rejection sampling or 'lw' for likelihood weighting.
+        query_index -- Index of the query variable.
+        evidence -- A dictionary containing variable indices as keys and observed value indices as values.
+        number_of_samples -- The number of samples in the batch.
+        random_state -- A 'numpy.random.RandomState' object used for generating random numbers (default 'numpy.random').
+        log_space -- If True, likelihood weighting returns the logarithms of the sums of the weights (default False).
+
+        Returns:
+        value_weights -- A 'numpy.array' containing the number of samples that support the evidence for each value of the query variable
+                         in the case of rejection sampling and the sum of the sample weights for each value in the case of likelihood weighting.
+
+        """
+        number_of_values = self.model.cardinalities[query_index]
+        if sampling_method == 'rs':
+            sample_assignments,_ = self._sample_batch(number_of_samples, None, random_state)
+            supports_evidence = numpy.ones(number_of_samples, dtype=bool)
+            for variable,value in evidence.iteritems():
+                supports_evidence = supports_evidence & (sample_assignments[variable] == value)
+            return numpy.bincount(sample_assignments[query_index][supports_evidence], minlength=number_of_values).astype(float)
+
+        sample_assignments, weights = self._sample_batch(number_of_samples, evidence, random_state, log_space)
+        if not log_space:
+            return numpy.bincount(sample_assignments[query_index], weights=weights, minlength=number_of_values)
+
+        #the weights are divided by the largest weight of the batch before they are summed, which is undone after taking the logarithm
+        largest_log_weight = numpy.max(weights)
+        if largest_log_weight == -numpy.inf:
+            return -numpy.ones(number_of_values) * numpy.inf
+        scaled_weights = numpy.exp(weights - largest_log_weight)
+        return log_probabilities(numpy.bincount(sample_assignments[query_index], weights=scaled_weights, minlength=number_of_values)) + largest_log_weight
+
+    def _sample_batch(self, number_of_samples, evidence=None, random_state=numpy.random, log_space=False):
+        """Generates a batch of random assignments by sampling all values of one variable at once,
+        going through the variables in topological order. For each sample, the CPT row of a variable
+        is gathered using the values of its parents and a value is drawn by inverting the row's cumulative distribution.
+
+        Keyword arguments:
+        number_of_samples -- The number of assignments that should be generated.
+        evidence -- A dictionary containing variable indices as keys and observed value indices as values
+                    (default None, in which case all variables are sampled).
+        random_state -- A 'numpy.random.RandomState' object used for generating random numbers (default 'numpy.random').
+        log_space -- If True, the log-likelihoods of the evidence are returned as weights (default False).
+
+        Returns:
+        assignments -- An integer 'numpy.array' of shape (number_of_variables, number_of_samples) containing value indices.
+        weights -- A 'numpy.array' containing the likelihood of the evidence (or its logarithm) for each of the samples.
+
+        """
+        if evidence == None:
+            evidence = dict()
+
+        if log_space:
+            log_cpt_rows = self.model.get_log_cpt_rows()
+
+        assignments = numpy.zeros((self.model.number_of_variables, number_of_samples), dtype=int)
+        weights = numpy.zeros(number_of_samples) if log_space else numpy.ones(number_of_samples)
+        for i in xrange(self.model.number_of_variables):
+            row_indices = numpy.dot(self.model.parent_strides[i], assignments[self.model.parents[i]])
+
+            #we update the weights if we are sampling an evidence variable
+            if i in evidence:
+                assignments[i] = evidence[i]
+                if log_space:
+                    weights = weights + log_cpt_rows[i][row_indices, evidence[i]]
+                else:
+                    weights = weights * self.model.cpt_rows[i][row_indices, evidence[i]]
+            else:
+                number_of_values = self.model.cardinalities[i]
+                random_numbers = random_state.rand(number_of_samples) + row_indices
+                value_indices = numpy.searchsorted(self.model.offset_cumulative_cpts[i], random_numbers, side='right') - row_indices * number_of_values
+                assignments[i] = numpy.minimum(value_indices, number_of_values-1)
+
+        return assignments, weights
+
+    def __sample_in_batches(self, sampling_method, query_index, evidence, number_of_samples, batch_size, number_of_processes, seed, log_space=False):
+        """Splits the samples into batches, each of which has its own random number generator, and merges the counts of the batches.
+        The batches and their generators only depend on 'number_of_samples', 'batch_size' and 'seed' and the counts are merged
+        in the order of the batches, so the result is the same for any number of processes.
+
+        Keyword arguments:
+        sampling_method -- 'rs' for rejection sampling or 'lw' for likelihood weighting.
+        query_index -- Index of the query variable.
+        evidence -- A dictionary containing variable indices as keys and observed value indices as values.
+        number_of_samples -- The total number of samples.
+        batch_size -- The number of samples in each batch.
+        number_of_processes -- The number of worker processes; if 1, the batches are sampled in the current process.
+        seed -- A seed for the random number generators of the batches or None.
+        log_space -- If True, the batches return log-weights, which are combined using log-sum-exp (default False).
+
+        Returns:
+        value_weights -- A 'numpy.array' containing the sum of the counts returned by '_count_batch' for the batches
+                         (or the logarithm of the sum in log space).
+
+        """
+        batch_sizes = [min(batch_size, number_of_samples - x) for x in xrange(0, number_of_samples, batch_size)]
+        random_states = create_random_states(seed, len(batch_sizes))
+        tasks = [(sampling_method, query_index, evidence, batch_sizes[i], random_states[i], log_space) for i in xrange(len(batch_sizes))]
+
+        if number_of_processes > 1 and len(tasks) > 1:
+            pool = multiprocessing.Pool(min(number_of_processes, len(tasks)), initializer=_initialise_worker, initargs=(self,))
+            try:
+                batch_counts = pool.map(_count_batch_in_worker, tasks)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            batch_counts = [self._count_batch(*x) for x in tasks]
+
+        if log_space:
+            if len(batch_counts) == 0:
+                return -numpy.ones(self.model.cardinalities[query_index]) * numpy.inf
+            return logsumexp(numpy.array(batch_counts), axis=0)
+
+        value_weights = numpy.zeros(self.model.cardinalities[query_index])
+        for _,counts in enumerate(batch_counts):
+            value_weights = value_weights + counts
+        return value_weights
+
+    def __stream_batches(self, sampling_method, query_variable, evidence_variables, batch_size, target_standard_error, max_samples, time_limit, seed, log_space=False):
+        """Generates batches of samples and yields an estimate of the query distribution and its standard errors after each batch.
+        For rejection sampling, the standard errors are those of the accepted sample proportions. For likelihood weighting,
+        the variance of each self-normalised estimate p is approximated by sum(w^2 * (indicator - p)^2) / sum(w)^2.
+        Both are plug-in values that are zero if all samples have the same query value, so they are bounded from below by
+        the standard deviations of a Beta posterior given the effective number of samples sum(w)^2 / sum(w^2),
+        which is the number of accepted samples for rejection sampling; the target standard error is not accepted
+        before this number reaches 100. The estimates, the standard errors and the effective number of samples
+        are invariant to scaling the weights, so in log space, the accumulated weights are stored relative to the largest weight seen so far.
+
+        Keyword arguments:
+        sampling_method -- 'rs' for rejection sampling or 'lw' for likelihood weighting.
+        The other arguments are described in 'stream_rs_inference' and 'stream_lw_inference'.
+
+        Returns:
+        A generator of tuples (distribution, standard_errors, number_of_samples).
+
+        """
+        start_time = time.time()
+        random_state = create_random_states(seed, 1)[0]
+        query_index = self.model.variable_indices[query_variable]
+        evidence = self.model.encode_evidence(evidence_variables)
+        number_of_values = self.model.cardinalities[query_index]
+
+        #for each value of the query variable, we accumulate the sum of the weights and
+        #the sum of the squared weights of the samples; rejection sampling uses weights of one and zero
+        value_weights = numpy.zeros(number_of_values)
+        value_squared_weights = numpy.zeros(number_of_values)
+        largest_log_weight = -numpy.inf
+        number_of_samples = 0
+        while True:
+            current_batch_size = batch_size
+            if max_samples != None:
+                current_batch_size = min(batch_size, max_samples - number_of_samples)
+
+            if sampling_method == 'rs':
+                sample_assignments,_ = self._sample_batch(current_batch_size, None, random_state)
+                weights = numpy.ones(current_batch_size)
+                for variable,value in evidence.iteritems():
+                    weights = weights * (sample_assignments[variable] == value)
+            elif log_space:
+                sample_assignments, log_weights = self._sample_batch(current_batch_size, evidence, random_state, True)
+                batch_largest_log_weight = numpy.max(log_weights)
+                if batch_largest_log_weight > largest_log_weight:
+                    scale = numpy.exp(largest_log_weight - batch_largest_log_weight)
+                    value_weights = value_weights * scale
+                    value_squared_weights = value_squared_weights * scale**2
+                    largest_log_weight = batch_largest_log_weight
+
+                weights = numpy.zeros(current_batch_size)
+                if largest_log_weight > -numpy.inf:
+                    weights = numpy.exp(log_weights - largest_log_weight)
+            else:
+                sample_assignments, weights = self._sample_batch(current_batch_size, evidence, random_state)
+
+            value_weights = value_weights + numpy.bincount(sample_assignments[query_index], weights=weights, minlength=number_of_values)
+            value_squared_weights = value_squared_weights + numpy.bincount(sample_assignments[query_index], weights=weights**2, minlength=number_of_values)
+            number_of_samples = number_of_samples + current_batch_size
+
+            normaliser = numpy.sum(value_weights)
+            if normaliser > 1e-10:
+                probabilities = value_weights / normaliser
+                squared_deviations = value_squared_weights * (1. - probabilities)**2 + (numpy.sum(value_squared_weights) - value_squared_weights) * probabilities**2
+                effective_number_of_samples = normaliser**2 / numpy.sum(value_squared_weights)
+                standard_errors = numpy.maximum(numpy.sqrt(squared_deviations) / normaliser, beta_standard_error(probabilities, effective_number_of_samples))
+            else:
+                probabilities = numpy.zeros(number_of_values)
+                standard_errors = numpy.ones(number_of_values) * numpy.inf
+                effective_number_of_samples = 0.
+
+            yield self.__create_distribution(query_index, probabilities), self.__create_distribution(query_index, standard_errors), number_of_samples
+            if is_estimate_final(standard_errors, number_of_samples, start_time, target_standard_error, max_samples, time_limit, effective_number_of_samples):
+                return
+
+    def __create_pruned_engine(self, model):
+        """Creates the engine that answers the queries in a pruned subnetwork; the engines are cached by 'self.pruner'."""
+        return ApproximateInferenceEngine(model, False)
+
+    def __get_gibbs_engine(self):
+        """Returns a Gibbs sampling engine that works on the same compiled network; the engine is created at the first call."""
+        if self.gibbs_engine == None:
+            self.gibbs_engine = GibbsSamplingEngine(self.model, False)
+        return self.gibbs_engine
+
+    def __create_distribution(self, variable_index, probabilities):
+        """Creates a dictionary of values and probabilities of a variable.
+
+        Keyword arguments:
+        variable_index -- Index of a variable in the network.
+        probabilities -- A 'numpy.array' of probabilities aligned with the variable's values.
+
+        Returns:
+        distribution -- A dictionary containing the values of the variable as keys and the probabilities as values.
+
+        """
+        distribution = dict()
+        for i,value in enumerate(self.model.values[variable_index]):
+            distribution[value] = probabilities[i]
+        return distribution
+
+
+#the engine used by the worker processes is set once per process, such that it is not sent with every task
+_worker_engine = None
+
+def _initialise_worker(engine):
+    global _worker_engine
+    _worker_engine = engine
+
+def _count_batch_in_worker(arguments):
+    return _worker_engine._count_batch(*arguments)
@@ -0,0 +1,367 @@
+import numpy
+import itertools
+from factor import TableFactor
+from log_space import log_probabilities
+
+class CompiledNetwork(object):
+    def __init__(self, variables, values, parents, cpts):
+        """Defines a compact representation of a discrete Bayesian network in which
+        variables and values are integer-coded and each CPT is stored in a contiguous 'numpy.array'.
+
+        Keyword arguments:
+        variables -- A list of variable names in topological order.
+        values -- A list of lists, such that 'values[i]' contains the values of the i-th variable.
+        parents -- A list of integer 'numpy.array' objects, such that 'parents[i]' contains
+                   the indices of the parents of the i-th variable.
+        cpts -- A list of 'numpy.array' objects, such that 'cpts[i]' is the CPT of the i-th variable;
+                the table has one axis per parent (in the order given by 'parents[i]')
+                followed by an axis for the values of the variable.
+
+        """
+        self.variables = list(variables)
+        self.values = [list(x) for x in values]
+        self.parents = [numpy.array(x, dtype=int) for x in parents]
+        self.cpts = [numpy.ascontiguousarray(x, dtype=float) for x in cpts]
+
+        self.number_of_variables = len(self.variables)
+        self.variable_indices = dict((variable,i) for i,variable in enumerate(self.variables))
+        self.value_indices = [dict((value,i) for i,value in enumerate(x)) for x in self.values]
+        self.cardinalities = numpy.array([len(x) for x in self.values], dtype=int)
+
+        children = [[] for _ in xrange(self.number_of_variables)]
+        for i in xrange(self.number_of_variables):
+            for _,parent in enumerate(self.parents[i]):
+                children[parent].append(i)
+        self.children = [numpy.array(x, dtype=int) for x in children]
+
+        #each CPT is also viewed as a 2D array whose rows correspond to parent assignments;
+        #the row of a parent assignment is the dot product of the assignment and 'parent_strides'
+        self.cpt_rows = []
+        self.cumulative_cpt_rows = []
+        self.offset_cumulative_cpts = []
+        self.parent_strides = []
+        for i in xrange(self.number_of_variables):
+            rows = self.cpts[i].reshape(-1, self.cardinalities[i])
+            self.cpt_rows.append(rows)
+            self.cumulative_cpt_rows.append(numpy.cumsum(rows, axis=1))
+
+            #the r-th cumulative row is shifted by r and the rows are concatenated into a single sorted array,
+            #such that samples from different rows can be drawn with a single call to 'numpy.searchsorted'
+            row_offsets = numpy.arange(rows.shape[0])[:,numpy.newaxis]
+            self.offset_cumulative_cpts.append((self.cumulative_cpt_rows[i] + row_offsets).ravel())
+
+            parent_cardinalities = self.cardinalities[self.parents[i]]
+            strides = numpy.ones(len(parent_cardinalities), dtype=int)
+            for j in xrange(len(parent_cardinalities)-2, -1, -1):
+                strides[j] = strides[j+1] * parent_cardinalities[j+1]
+            self.parent_strides.append(strides)
+
+        #the logarithms of the CPT rows are only created when they are first needed
+        self.log_cpt_rows = None
+
+    def get_row_index(self, variable_index, assignments):
+        """Returns the index of the CPT row of a variable that corresponds to the values assigned to its parents.
+
+        Keyword arguments:
+        variable_index -- Index of a variable in the network.
+        assignments -- An integer 'numpy.array' containing value indices for all variables in the network.
+
+        Returns:
+        row_index -- Index of a row in 'self.cpt_rows[variable_index]'.
+
+        """
+        return int(numpy.dot(assignments[self.parents[variable_index]], self.parent_strides[variable_index]))
+
+    def get_probability(self, variable_index, assignments):
+        """Returns the CPT entry of a variable that corresponds to the given assignment.
+
+        Keyword arguments:
+        variable_index -- Index of a variable in the network.
+        assignments -- An integer 'numpy.array' containing value indices for all variables in the network.
+
+        Returns:
+        probability -- The probability of the variable's assigned value given the values of its parents.
+
+        """
+        row_index = self.get_row_index(variable_index, assignments)
+        return self.cpt_rows[variable_index][row_index, assignments[variable_index]]
+
+    def get_log_probability(self, variable_index, assignments):
+        """Returns the logarithm of the CPT entry of a variable that corresponds to the given assignment
+        (minus infinity for zero probabilities).
+
+        Keyword arguments:
+        variable_index -- Index of a variable in the network.
+        assignments -- An integer 'numpy.array' containing value indices for all variables in the network.
+
+        Returns:
+        log_probability -- The log-probability of the variable's assigned value given the values of its parents.
+
+        """
+        row_index = self.get_row_index(variable_index, assignments)
+        return self.get_log_cpt_rows()[variable_index][row_index, assignments[variable_index]]
+
+    def get_log_cpt_rows(self):
+        """Returns a list containing the logarithms of the 2D CPT views in 'self.cpt_rows'; the list is created at the first call."""
+        if self.log_cpt_rows == None:
+            self.log_cpt_rows = [log_probabilities(x) for x in self.cpt_rows]
+        return self.log_cpt_rows
+
+    def get_factor(self, variable_index):
+        """Returns a factor representing the CPT of a variable. The table of the factor
+        is shared with the compiled network and should not be modified in place.
+
+        Keyword arguments:
+        variable_index -- Index of a variable in the network.
+
+        Returns:
+        factor -- A 'TableFactor' whose last axis corresponds to the variable
+                  and whose other axes correspond to the variable's parents.
+
+        """
+        family = list(self.parents[variable_index]) + [variable_index]
+        factor_variables = [self.variables[x] for x in family]
+        factor_values = [self.values[x] for x in family]
+        factor_value_indices = [self.value_indices[x] for x in family]
+        return TableFactor(factor_variables, factor_values, self.cpts[variable_index], factor_value_indices)
+
+    def encode_evidence(self, evidence_variables):
+        """Converts an evidence dictionary into a dictionary of variable and value indices.
+
+        Keyword arguments:
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+
+        Returns:
+        evidence -- A dictionary containing variable indices as keys and value indices as values.
+
+        """
+        evidence = dict()
+        for variable,value in evidence_variables.iteritems():
+            variable_index = self.variable_indices[variable]
+            evidence[variable_index] = self.value_indices[variable_index][value]
+        return evidence
+
+    def decode_assignments(self, assignments):
+        """Converts an array of value indices into a dictionary of variable names and values.
+
+        Keyword arguments:
+        assignments -- An integer 'numpy.array' containing value indices for all variables in the network.
+
+        Returns:
+        assigned_values -- A dictionary containing variable names and their assigned values.
+
+        """
+        assigned_values = dict()
+        for i,variable in enumerate(self.variables):
+            assigned_values[variable] = self.values[i][assignments[i]]
+        return assigned_values
+
+
+def compile_cpt(cprob, values, parent_values):
+    """Converts a CPT given in the libpgm format into a 'numpy.array'.
+
+    Keyword arguments:
+    cprob -- A list of probabilities if the variable has no parents; otherwise, a dictionary whose keys are
+             string representations of parent assignments and whose values are lists of probabilities.
+    values -- A list of values of the variable.
+    parent_values -- A list of lists, such that 'parent_values[i]' contains the values of the i-th parent.
+
+    Returns:
+    cpt -- A 'numpy.array' with one axis per parent followed by an axis for the values of the variable.
+
+    """
+    if len(parent_values) == 0:
+        return numpy.array(cprob, dtype=float)
+
+    cpt = numpy.zeros([len(x) for x in parent_values] + [len(values)])
+    for parent_value_indices in itertools.product(*[xrange(len(x)) for x in parent_values]):
+        assignment = [parent_values[i][index] for i,index in enumerate(parent_value_indices)]
+        parent_values_string = "[" + ", ".join("'" + x + "'" for x in assignment) + "]"
+        cpt[parent_value_indices] = cprob[parent_values_string]
+    return cpt
+
+def compile_network(network):
+    """Compiles a discrete Bayesian network into a 'CompiledNetwork'.
+
+    Keyword arguments:
+    network -- A 'libpgm.discretebayesiannetwork.DiscreteBayesianNetwork' object representing a discrete Bayesian network.
+
+    Returns:
+    model -- A 'CompiledNetwork' object.
+
+    """
+    network.toporder()
+    variables = list(network.V)
+    variable_indices = dict((variable,i) for i,variable in enumerate(variables))
+
+    values = []
+    parents = []
+    cpts = []
+    for _,variable in enumerate(variables):
+        variable_parents = network.Vdata[variable]['parents']
+        if variable_parents == None:
+            variable_parents = []
+
+        values.append(network.Vdata[variable]['vals'])
+        parents.append([variable_indices[x] for x in variable_parents])
+        parent_values = [network.Vdata[x]['vals'] for x in variable_parents]
+        cpts.append(compile_cpt(network.Vdata[variable]['cprob'], network.Vdata[variable]['vals'], parent_values))
+
+    return CompiledNetwork(variables, values, parents, cpts)
+
+class CompiledSensorDbn(object):
+    def __init__(self, state_values, measurement_values, initial_belief, transition_probabilities, measurement_probabilities):
+        """Defines a compact representation of a 2-TBN with a single state variable and a single measurement variable,
+        in which the transition and measurement CPTs are stored as matrices.
+
+        Keyword arguments:
+        state_values -- A list of values of the state variable.
+        measurement_values -- A list of values of the measurement variable.
+        initial_belief -- A 'numpy.array' containing the prior probabilities of the states.
+        transition_probabilities -- A 'numpy.array' of shape (number_of_states, number_of_states),
+                                    such that the entry (i,j) is the probability of moving from the i-th to the j-th state.
+        measurement_probabilities -- A 'numpy.array' of shape (number_of_states, number_of_measurements),
+                                     such that the entry (i,k) is the probability of the k-th measurement in the i-th state.
+
+        """
+        self.state_values = list(state_values)
+        self.measurement_values = list(measurement_values)
+        self.initial_belief = numpy.array(initial_belief, dtype=float)
+        self.transition_probabilities = numpy.ascontiguousarray(transition_probabilities, dtype=float)
+        self.measurement_probabilities = numpy.ascontiguousarray(measurement_probabilities, dtype=float)
+
+        self.number_of_states = len(self.state_values)
+        self.state_indices = dict((value,i) for i,value in enumerate(self.state_values))
+        self.measurement_indices = dict((value,i) for i,value in enumerate(self.measurement_values))
+
+        #the prediction step multiplies the belief with the transposed transition matrix,
+        #while the update step takes the column of the measurement matrix that corresponds to the measurement
+        self.prediction_matrix = numpy.ascontiguousarray(self.transition_probabilities.T)
+        self.measurement_likelihoods = numpy.ascontiguousarray(self.measurement_probabilities.T)
+
+        #the logarithms are used for decoding; impossible transitions and measurements have a log-probability of minus infinity
+        with numpy.errstate(divide='ignore'):
+            self.log_transition_probabilities = numpy.log(self.transition_probabilities)
+            self.log_measurement_likelihoods = numpy.log(self.measurement_likelihoods)
+
+    def encode_measurements(self, measurements):
+        """Converts a sequence of measurements into an integer 'numpy.array' of measurement indices.
+
+        Keyword arguments:
+        measurements -- A sequence of measurement values; values that are not strings are converted using 'str'.
+
+        Returns:
+        measurement_indices -- An integer 'numpy.array' containing the index of each measurement.
+
+        """
+        #only the distinct measurements are converted to strings and looked up;
+        #integer measurements are kept as integers until then, since converting the whole array to strings is slow
+        measurements = numpy.asarray(measurements)
+        if measurements.dtype.kind not in 'iu':
+            measurements = measurements.astype(str)
+        unique_measurements, inverse_indices = numpy.unique(measurements, return_inverse=True)
+        unique_measurement_indices = numpy.array([self.measurement_indices[str(x)] for x in unique_measurements], dtype=int)
+        return unique_measurement_indices[inverse_indices]
+
+def compile_sensor_dbn(network):
+    """Compiles a sensor DBN, i.e. a 2-TBN with a 'state' variable and a 'measurement' variable whose parent is the state,
+    into a 'CompiledSensorDbn'.
+
+    Keyword arguments:
+    network -- A 'libpgm.dyndiscbayesiannetwork.DynDiscBayesianNetwork' object representing a dynamic Bayesian network.
+
+    Returns:
+    model -- A 'CompiledSensorDbn' object.
+
+    """
+    state_values = network.initial_Vdata['state']['vals']
+    measurement_values = network.initial_Vdata['measurement']['vals']
+    transition_probabilities = compile_cpt(network.twotbn_Vdata['state']['cprob'], state_values, [state_values])
+    measurement_probabilities = compile_cpt(network.twotbn_Vdata['measurement']['cprob'], measurement_values, [state_values])
+    return CompiledSensorDbn(state_values, measurement_values, network.initial_Vdata['state']['cprob'],
+                             transition_probabilities, measurement_probabilities)
+
+class CompiledDbn(object):
+    def __init__(self, initial_model, transition_model):
+        """Defines a compact representation of a discrete 2-TBN consisting of two compiled networks.
+
+        Keyword arguments:
+        initial_model -- A 'CompiledNetwork' object describing the variables at the first time step.
+        transition_model -- A 'CompiledNetwork' object over twice as many variables, whose first half are the variables
+                            of the previous time step and whose second half are the variables of the current time step
+                            (in the same order as in 'initial_model'); the CPTs of the previous variables are not used.
+
+        """
+        self.initial_model = initial_model
+        self.transition_model = transition_model
+
+        self.variables = initial_model.variables
+        self.values = initial_model.values
+        self.number_of_variables = initial_model.number_of_variables
+        self.variable_indices = initial_model.variable_indices
+        self.value_indices = initial_model.value_indices
+        self.cardinalities = initial_model.cardinalities
+
+    def encode_evidence(self, evidence_variables):
+        """Converts an evidence dictionary into a dictionary of variable and value indices of a single time step.
+
+        Keyword arguments:
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+
+        Returns:
+        evidence -- A dictionary containing variable indices as keys and value indices as values.
+
+        """
+        return self.initial_model.encode_evidence(evidence_variables)
+
+def compile_dbn(network):
+    """Compiles a discrete 2-TBN, whose parents named 'past_<variable>' refer to the previous time step, into a 'CompiledDbn'.
+
+    Keyword arguments:
+    network -- A 'libpgm.dyndiscbayesiannetwork.DynDiscBayesianNetwork' object representing a dynamic Bayesian network.
+
+    Returns:
+    model -- A 'CompiledDbn' object.
+
+    """
+    network.toporder()
+    variables = list(network.V)
+    values = [network.initial_Vdata[x]['vals'] for x in variables]
+    initial_parents, initial_cpts = compile_time_slice(network.initial_Vdata, variables, values, variables)
+    initial_model = CompiledNetwork(variables, values, initial_parents, initial_cpts)
+
+    #the variables of the previous time step are placed in front of the variables of the current time step;
+    #they have no parents and uniform CPTs, since their values are always copied from the particles or samples of the previous step
+    transition_variables = ['past_' + x for x in variables] + variables
+    transition_parents, transition_cpts = compile_time_slice(network.twotbn_Vdata, variables, values + values, transition_variables)
+    uniform_cpts = [numpy.ones(len(x)) / len(x) for x in values]
+    transition_model = CompiledNetwork(transition_variables, values + values, [[] for _ in variables] + transition_parents,
+                                       uniform_cpts + transition_cpts)
+    return CompiledDbn(initial_model, transition_model)
+
+def compile_time_slice(vdata, variables, values, parent_candidates):
+    """Compiles the CPTs of one time step of a 2-TBN.
+
+    Keyword arguments:
+    vdata -- The libpgm data of the time step (e.g. 'network.twotbn_Vdata').
+    variables -- A list of variable names in topological order.
+    values -- A list of lists, such that 'values[i]' contains the values of the variable 'parent_candidates[i]'.
+    parent_candidates -- A list of names of the variables that can be parents.
+
+    Returns:
+    parents -- A list of lists, such that 'parents[i]' contains the indices in 'parent_candidates' of the parents of the i-th variable.
+    cpts -- A list of 'numpy.array' objects, such that 'cpts[i]' is the CPT of the i-th variable.
+
+    """
+    candidate_indices = dict((variable,i) for i,variable in enumerate(parent_candidates))
+    parents = []
+    cpts = []
+    for _,variable in enumerate(variables):
+        variable_parents = vdata[variable]['parents']
+        if variable_parents == None:
+            variable_parents = []
+
+        parents.append([candidate_indices[x] for x in variable_parents])
+        parent_values = [values[candidate_indices[x]] for x in variable_parents]
+        cpts.append(compile_cpt(vdata[variable]['cprob'], vdata[variable]['vals'], parent_values))
+    return parents, cpts
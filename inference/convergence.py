@@ -0,0 +1,162 @@
+import numpy
+import time
+
+def potential_scale_reduction(samples):
+    """Calculates the split potential scale reduction factor (R-hat) of a scalar quantity sampled by multiple Markov chains.
+    Each chain is split into two halves, such that non-stationary chains are detected as well;
+    values close to 1 indicate that the chains have mixed.
+
+    Keyword arguments:
+    samples -- A 'numpy.array' of shape (number_of_chains, number_of_samples).
+
+    Returns:
+    r_hat -- The potential scale reduction factor.
+
+    """
+    samples = numpy.asarray(samples, dtype=float)
+    half_length = samples.shape[1] // 2
+    if half_length < 2:
+        return numpy.inf
+
+    split_samples = numpy.vstack((samples[:,:half_length], samples[:,-half_length:]))
+    chain_means = numpy.mean(split_samples, axis=1)
+    within_chain_variance = numpy.mean(numpy.var(split_samples, axis=1, ddof=1))
+    between_chain_variance = half_length * numpy.var(chain_means, ddof=1)
+
+    if within_chain_variance <= 0.:
+        if between_chain_variance <= 0.:
+            return 1.
+        return numpy.inf
+
+    pooled_variance = (half_length - 1.) / half_length * within_chain_variance + between_chain_variance / half_length
+    return numpy.sqrt(pooled_variance / within_chain_variance)
+
+def effective_sample_size(samples):
+    """Estimates the effective number of independent samples of a scalar quantity sampled by one or more Markov chains.
+    The autocorrelations are combined across the chains and summed in pairs until the first negative pair (Geyer's initial positive sequence).
+
+    Keyword arguments:
+    samples -- A 'numpy.array' of shape (number_of_chains, number_of_samples).
+
+    Returns:
+    effective_sample_size -- The estimated effective sample size.
+
+    """
+    samples = numpy.asarray(samples, dtype=float)
+    number_of_chains, number_of_samples = samples.shape
+    total_samples = number_of_chains * number_of_samples
+    if number_of_samples < 4:
+        return float(total_samples)
+
+    #we calculate the autocovariances of each chain using the fast Fourier transform
+    centred_samples = samples - numpy.mean(samples, axis=1)[:,numpy.newaxis]
+    transformed_samples = numpy.fft.rfft(centred_samples, n=2*number_of_samples, axis=1)
+    autocovariances = numpy.fft.irfft(transformed_samples * numpy.conjugate(transformed_samples), axis=1)[:,:number_of_samples] / number_of_samples
+
+    within_chain_variance = numpy.mean(autocovariances[:,0]) * number_of_samples / (number_of_samples - 1.)
+    pooled_variance = within_chain_variance * (number_of_samples - 1.) / number_of_samples
+    if number_of_chains > 1:
+        pooled_variance = pooled_variance + numpy.var(numpy.mean(samples, axis=1), ddof=1)
+    if pooled_variance <= 0.:
+        return float(total_samples)
+
+    autocorrelations = 1. - (within_chain_variance - numpy.mean(autocovariances, axis=0)) / pooled_variance
+    autocorrelations[0] = 1.
+
+    autocorrelation_time = -1.
+    for t in xrange(0, number_of_samples-1, 2):
+        pair_sum = autocorrelations[t] + autocorrelations[t+1]
+        if pair_sum < 0.:
+            break
+        autocorrelation_time = autocorrelation_time + 2. * pair_sum
+
+    autocorrelation_time = max(autocorrelation_time, 1. / numpy.log10(total_samples))
+    return total_samples / autocorrelation_time
+
+def batch_means_standard_error(samples):
+    """Estimates the standard error of the mean of a scalar quantity sampled by one or more Markov chains using batch means.
+    Each chain is divided into batches of about the square root of its length; since the means of long batches are
+    approximately independent, the standard error is estimated from the variance of the batch means.
+
+    Keyword arguments:
+    samples -- A 'numpy.array' of shape (number_of_chains, number_of_samples).
+
+    Returns:
+    standard_error -- The estimated standard error (infinity if there are fewer than two batches).
+
+    """
+    samples = numpy.asarray(samples, dtype=float)
+    number_of_chains, number_of_samples = samples.shape
+    batch_size = get_batch_size(number_of_samples)
+    number_of_batches = count_batches(number_of_chains, number_of_samples)
+    if number_of_batches < 2:
+        return numpy.inf
+
+    batches_per_chain = number_of_batches // number_of_chains
+    batch_means = numpy.mean(samples[:,:batches_per_chain*batch_size].reshape(number_of_batches, batch_size), axis=1)
+    return numpy.std(batch_means, ddof=1) / numpy.sqrt(number_of_batches)
+
+def get_batch_size(number_of_samples):
+    """Returns the length of the batches used for a chain of the given length in 'batch_means_standard_error'."""
+    return max(int(numpy.sqrt(number_of_samples)), 1)
+
+def count_batches(number_of_chains, number_of_samples):
+    """Returns the number of batches used in 'batch_means_standard_error'.
+
+    Keyword arguments:
+    number_of_chains -- The number of chains.
+    number_of_samples -- The number of samples of each chain.
+
+    Returns:
+    number_of_batches -- The total number of batches of all chains.
+
+    """
+    return number_of_chains * (number_of_samples // get_batch_size(number_of_samples))
+
+def beta_standard_error(probabilities, number_of_samples):
+    """Calculates the standard deviations of estimated probabilities under a uniform prior, i.e. the standard deviations
+    of the Beta(n*p+1, n*(1-p)+1) posteriors. Unlike the plug-in value sqrt(p*(1-p)/n), they are positive even if
+    all samples have the same value, so they bound the standard errors of estimates from few samples from below.
+
+    Keyword arguments:
+    probabilities -- A 'numpy.array' containing the estimated probabilities.
+    number_of_samples -- The (effective) number of samples from which the probabilities were estimated.
+
+    Returns:
+    standard_errors -- A 'numpy.array' containing the standard deviations.
+
+    """
+    smoothed_probabilities = (numpy.asarray(probabilities, dtype=float) * number_of_samples + 1.) / (number_of_samples + 2.)
+    return numpy.sqrt(smoothed_probabilities * (1. - smoothed_probabilities) / (number_of_samples + 3.))
+
+def is_estimate_final(standard_errors, number_of_samples, start_time, target_standard_error=None, max_samples=None, time_limit=None,
+                      effective_number_of_samples=None, min_effective_number_of_samples=100):
+    """Checks whether an anytime estimate should be returned, i.e. whether it is precise enough
+    or whether the sample or time budget has been used up. Since the standard errors are estimated from the same samples
+    as the probabilities, they are unreliable for few samples, so an estimate is only considered precise enough
+    once it is based on at least 'min_effective_number_of_samples' effective samples.
+
+    Keyword arguments:
+    standard_errors -- A 'numpy.array' containing the standard errors of the estimated probabilities.
+    number_of_samples -- The number of samples used for the estimate.
+    start_time -- The time at which sampling started (as returned by 'time.time').
+    target_standard_error -- The estimate is final once all standard errors are at most this value (default None).
+    max_samples -- The estimate is final once this number of samples has been used (default None).
+    time_limit -- The estimate is final once this number of seconds has passed since 'start_time' (default None).
+    effective_number_of_samples -- The effective number of samples of the estimate, e.g. the number of accepted samples
+                                   (default None, in which case 'number_of_samples' is used).
+    min_effective_number_of_samples -- The effective number of samples needed for reaching 'target_standard_error' (default 100).
+
+    Returns:
+    is_final -- True if sampling should stop.
+
+    """
+    if effective_number_of_samples == None:
+        effective_number_of_samples = number_of_samples
+    if target_standard_error != None and numpy.max(standard_errors) <= target_standard_error and effective_number_of_samples >= min_effective_number_of_samples:
+        return True
+    if max_samples != None and number_of_samples >= max_samples:
+        return True
+    if time_limit != None and time.time() - start_time >= time_limit:
+        return True
+    return False
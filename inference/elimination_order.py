@@ -0,0 +1,133 @@
+def create_moral_graph(model):
+    """Creates the moral graph of a network by connecting each variable
+    to its parents and connecting the parents of each variable with each other.
+
+    Keyword arguments:
+    model -- A 'CompiledNetwork' object.
+
+    Returns:
+    moral_graph -- A list of sets, such that 'moral_graph[i]' contains the indices of the neighbours of the i-th variable.
+
+    """
+    moral_graph = [set() for _ in xrange(model.number_of_variables)]
+    for i in xrange(model.number_of_variables):
+        family = [i] + list(model.parents[i])
+        for _,x in enumerate(family):
+            for _,y in enumerate(family):
+                if x != y:
+                    moral_graph[x].add(y)
+    return moral_graph
+
+def min_degree_cost(graph, variable, cardinalities):
+    """Returns the number of neighbours of a variable in the graph."""
+    return len(graph[variable])
+
+def min_fill_cost(graph, variable, cardinalities):
+    """Returns the number of edges that are added to the graph if a variable is eliminated."""
+    neighbours = list(graph[variable])
+    fill_edges = 0
+    for i in xrange(len(neighbours)):
+        for j in xrange(i+1, len(neighbours)):
+            if neighbours[j] not in graph[neighbours[i]]:
+                fill_edges = fill_edges + 1
+    return fill_edges
+
+def weighted_min_fill_cost(graph, variable, cardinalities):
+    """Returns the sum of the weights of the edges that are added to the graph if a variable is eliminated,
+    where the weight of an edge is the product of the cardinalities of the variables it connects."""
+    neighbours = list(graph[variable])
+    fill_weight = 0
+    for i in xrange(len(neighbours)):
+        for j in xrange(i+1, len(neighbours)):
+            if neighbours[j] not in graph[neighbours[i]]:
+                fill_weight = fill_weight + cardinalities[neighbours[i]] * cardinalities[neighbours[j]]
+    return fill_weight
+
+heuristics = {'min_degree': min_degree_cost,
+              'min_fill': min_fill_cost,
+              'weighted_min_fill': weighted_min_fill_cost}
+
+def find_elimination_order(graph, variables, cardinalities, heuristic='min_fill'):
+    """Greedily finds an order in which the given variables should be eliminated from the graph.
+    In each step, the variable with the lowest heuristic cost is eliminated and its neighbours are connected with each other.
+
+    Keyword arguments:
+    graph -- A list of sets, such that 'graph[i]' contains the indices of the neighbours of the i-th variable.
+    variables -- A list of indices of the variables that should be eliminated.
+    cardinalities -- A 'numpy.array' containing the number of values of each variable.
+    heuristic -- The name of a heuristic in 'heuristics' or a function with the same arguments
+                 as the functions in 'heuristics' (default 'min_fill').
+
+    Returns:
+    elimination_order -- A list of variable indices.
+
+    """
+    if heuristic in heuristics:
+        heuristic = heuristics[heuristic]
+
+    graph = [set(x) for x in graph]
+    costs = dict()
+    for _,variable in enumerate(variables):
+        costs[variable] = heuristic(graph, variable, cardinalities)
+
+    elimination_order = []
+    while len(costs) > 0:
+        variable = min(costs, key=lambda x: (costs[x], x))
+        clique = eliminate_variable(graph, variable)
+        del costs[variable]
+        elimination_order.append(variable)
+
+        #the elimination only changes the costs of the variable's neighbours and their neighbours
+        affected_variables = set()
+        for _,neighbour in enumerate(clique):
+            affected_variables.update(graph[neighbour])
+        affected_variables.update(clique)
+        for _,affected_variable in enumerate(affected_variables):
+            if affected_variable in costs:
+                costs[affected_variable] = heuristic(graph, affected_variable, cardinalities)
+    return elimination_order
+
+def eliminate_variable(graph, variable):
+    """Removes a variable from the graph and connects its neighbours with each other.
+
+    Keyword arguments:
+    graph -- A list of sets, such that 'graph[i]' contains the indices of the neighbours of the i-th variable.
+    variable -- Index of the variable that should be eliminated.
+
+    Returns:
+    clique -- A set containing the variable and its neighbours before the elimination.
+
+    """
+    clique = set(graph[variable])
+    for _,neighbour in enumerate(graph[variable]):
+        graph[neighbour].update(graph[variable])
+        graph[neighbour].discard(neighbour)
+        graph[neighbour].discard(variable)
+    graph[variable] = set()
+    clique.add(variable)
+    return clique
+
+def find_largest_factor_size(graph, elimination_order, cardinalities):
+    """Calculates the number of entries of the largest intermediate factor
+    created when the variables are eliminated in the given order.
+
+    Keyword arguments:
+    graph -- A list of sets, such that 'graph[i]' contains the indices of the neighbours of the i-th variable.
+    elimination_order -- A list of variable indices.
+    cardinalities -- A 'numpy.array' containing the number of values of each variable.
+
+    Returns:
+    largest_factor_size -- The number of entries in the largest factor.
+
+    """
+    graph = [set(x) for x in graph]
+    largest_factor_size = 0
+    for _,variable in enumerate(elimination_order):
+        clique = eliminate_variable(graph, variable)
+
+        #we use Python integers since the sizes of the factors may overflow fixed-width integers
+        factor_size = 1
+        for _,x in enumerate(clique):
+            factor_size = factor_size * int(cardinalities[x])
+        largest_factor_size = max(largest_factor_size, factor_size)
+    return largest_factor_size
@@ -1,130 +1,364 @@
 import numpy
-import ast
-from factor import Factor
+import itertools
+from compiled_network import CompiledNetwork, compile_network
+from elimination_order import create_moral_graph, find_elimination_order, find_largest_factor_size
+from network_pruning import NetworkPruner
+from junction_tree import JunctionTreeEngine
+from log_space import logsumexp, normalise_log_values
 
 class ExactInferenceEngine(object):
-    def __init__(self, network):
+    def __init__(self, network, prune_network=True):
         """Defines an engine for performing exact inference in a discrete Bayesian network.
 
         Keyword arguments:
-        network -- A 'libpgm.discretebayesiannetwork.DiscreteBayesianNetwork' object representing a discrete Bayesian network.
+        network -- A 'libpgm.discretebayesiannetwork.DiscreteBayesianNetwork' object representing a discrete Bayesian network
+                   or a 'CompiledNetwork' object created from such a network.
+        prune_network -- If True, each query is answered in the minimal subnetwork that is relevant for the query (default True).
 
         """
         self.network = network
-        self.network.toporder()
+        if isinstance(network, CompiledNetwork):
+            self.model = network
+        else:
+            self.model = compile_network(network)
+        self.moral_graph = create_moral_graph(self.model)
+
+        self.pruner = None
+        if prune_network:
+            self.pruner = NetworkPruner(self.model, self.__create_pruned_engine)
 
-    def perform_inference(self, query_variable, evidence_variables):
+        #the junction tree used for calculating multiple marginals is only created when it is first needed
+        self.junction_tree = None
+
+    def perform_inference(self, query_variable, evidence_variables, log_space=False):
         """Calculates the probability distribution P(query_variable|evidence_variables) using enumeration.
         Assumes that we have only one query variable.
 
         Keyword arguments:
         query_variable -- The name of the query variable (as called in the network).
         evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+        log_space -- If True, the products of CPT entries are calculated as sums of log-probabilities and
+                     the summations use log-sum-exp, which avoids underflow for large networks and evidence sets (default False).
 
         Returns:
         distribution -- A dictionary containing the values of the query variable as keys and the probabilities as values.
 
         """
+        #an observed query variable takes its observed value with certainty
+        if query_variable in evidence_variables:
+            joint_distribution = self.__add_observed_query_variables([query_variable], evidence_variables, {(): 1.})
+            return dict((values[0],probability) for values,probability in joint_distribution.iteritems())
+
+        if self.pruner != None:
+            engine, evidence_variables = self.pruner.get_engine([query_variable], evidence_variables)
+            return engine.perform_inference(query_variable, evidence_variables, log_space)
+
         distribution = dict()
-        known_variables = list(evidence_variables.keys())
-        known_variables.append(query_variable)
+        query_index = self.model.variable_indices[query_variable]
+        evidence = self.model.encode_evidence(evidence_variables)
         hidden_variables = []
-        for _,var in enumerate(self.network.V):
-            if var not in known_variables:
-                hidden_variables.append(var)
+        for i in xrange(self.model.number_of_variables):
+            if i != query_index and i not in evidence:
+                hidden_variables.append(i)
         normaliser = 0.0
 
-        #given the variable ordering represented by 'self.network' and 'hidden_variables',
+        #given the variable ordering represented by 'self.model' and 'hidden_variables',
         #we look for the CPTs that need each of the variables;
         #this will allow us to make use of situations where we can extract terms in front of a summation
-        variables, dependency_levels = self.__find_dependency_levels(known_variables, hidden_variables)
+        variables, dependency_levels = self.__find_dependency_levels(hidden_variables)
 
         #we start with an initial assignment of variables: the assignment of evidence variables is fixed,
         #while the other ones (including the query variable) will have to be enumerated
-        variable_assignments = dict()
-        for _,variable in enumerate(self.network.V):
-            if variable in evidence_variables.keys():
-                variable_assignments[variable] = evidence_variables[variable]
-            else:
-                variable_assignments[variable] = ''
+        variable_assignments = numpy.zeros(self.model.number_of_variables, dtype=int)
+        for variable,value in evidence.iteritems():
+            variable_assignments[variable] = value
 
         #we take the variables whose CPTs are independent of the hidden variables
         #because they can be taken in front of the summation
         sum_independent_variables = variables[numpy.where(dependency_levels==-1)[0]]
 
         #we calculate the probability of each value of the query variable
-        for _,value in enumerate(self.network.Vdata[query_variable]['vals']):
-            variable_assignments[query_variable] = value
+        for value_index,value in enumerate(self.model.values[query_index]):
+            variable_assignments[query_index] = value_index
 
             #we calculate a product in front of the summation if we have independent variables
-            term_product = 1.0
+            term_product = 0.0 if log_space else 1.0
             if len(sum_independent_variables) > 0:
-                term_product = self.__calculate_term_product(sum_independent_variables, variable_assignments)
+                term_product = self.__calculate_term_product(sum_independent_variables, variable_assignments, log_space)
 
-            distribution[value] = term_product * self.__sum_and_enumerate(hidden_variables, variable_assignments, variables, dependency_levels, 0)
-            normaliser = normaliser + distribution[value]
+            summation = self.__sum_and_enumerate(hidden_variables, variable_assignments, variables, dependency_levels, 0, log_space)
+            if log_space:
+                distribution[value] = term_product + summation
+            else:
+                distribution[value] = term_product * summation
+                normaliser = normaliser + distribution[value]
+
+        if log_space:
+            values = self.model.values[query_index]
+            probabilities = normalise_log_values([distribution[x] for x in values])
+            return dict(zip(values, probabilities))
 
         for _,key in enumerate(distribution.keys()):
             distribution[key] = distribution[key] / normaliser
 
         return distribution
 
-    def perform_ve_inference(self, query_variable, evidence_variables):
+    def perform_ve_inference(self, query_variable, evidence_variables, elimination_order='min_fill', log_space=False):
         """Calculates the probability distribution P(query_variable|evidence_variables) using variable elimination.
         Assumes that we have only one query variable.
 
         Keyword arguments:
         query_variable -- The name of the query variable (as called in the network).
         evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+        elimination_order -- A list containing the names of the hidden variables in the order in which they should be eliminated,
+                             the name of a heuristic in 'elimination_order.heuristics', or a heuristic function (default 'min_fill').
+        log_space -- If True, the factors contain log-probabilities (default False); see 'perform_joint_inference'.
 
         Returns:
         distribution -- A dictionary containing the values of the query variable as keys and the probabilities as values.
 
         """
-        known_variables = list(evidence_variables.keys())
-        known_variables.append(query_variable)
-        hidden_variables = []
-        for _,var in enumerate(self.network.V):
-            if var not in known_variables:
-                hidden_variables.append(var)
+        joint_distribution = self.perform_joint_inference([query_variable], evidence_variables, elimination_order, log_space)
+
+        distribution = dict()
+        for values,probability in joint_distribution.iteritems():
+            distribution[values[0]] = probability
+        return distribution
 
-        variables, dependency_levels = self.__find_dependency_levels(known_variables, hidden_variables)
+    def perform_joint_inference(self, query_variables, evidence_variables, elimination_order='min_fill', log_space=False):
+        """Calculates the joint probability distribution P(query_variables|evidence_variables) using variable elimination.
+        Since the size of the resulting table grows exponentially with the number of query variables,
+        the method should only be used for small sets of query variables. Query variables that are also
+        evidence variables take their observed values with probability one.
 
-        #we don't want the query variable to be considered as known
-        #in the factor creation process
-        known_variables.remove(query_variable)
-        factors = self.__create_factors(evidence_variables, variables, dependency_levels)
+        Keyword arguments:
+        query_variables -- A list of names of query variables.
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+        elimination_order -- A list containing the names of the hidden variables in the order in which they should be eliminated,
+                             the name of a heuristic in 'elimination_order.heuristics', or a heuristic function (default 'min_fill').
+        log_space -- If True, the factors contain log-probabilities, such that products of factors are sums
+                     and variables are eliminated using log-sum-exp (default False).
 
-        current_factor = Factor()
-        for i in xrange(len(hidden_variables)-1, -1, -1):
-            current_factor = self.__multiply_factors(factors, current_factor, dependency_levels, i)
-            current_factor.sum_out(hidden_variables[i])
+        Returns:
+        distribution -- A dictionary containing tuples of values of the query variables (in the order given by 'query_variables')
+                        as keys and the probabilities as values.
 
-        current_factor = self.__multiply_factors(factors, current_factor, dependency_levels, -1)
-        alpha = sum(numpy.array(current_factor.probabilities))
+        """
+        #the observed query variables take their observed values with certainty,
+        #so only the distribution of the other query variables is calculated
+        unobserved_query_variables = [x for x in query_variables if x not in evidence_variables]
+        if len(unobserved_query_variables) < len(query_variables):
+            unobserved_distribution = {(): 1.}
+            if len(unobserved_query_variables) > 0:
+                unobserved_distribution = self.perform_joint_inference(unobserved_query_variables, evidence_variables, elimination_order, log_space)
+            return self.__add_observed_query_variables(query_variables, evidence_variables, unobserved_distribution)
+
+        if self.pruner != None:
+            engine, evidence_variables = self.pruner.get_engine(query_variables, evidence_variables)
+            elimination_order = self.__remove_pruned_variables(engine, elimination_order)
+            return engine.perform_joint_inference(query_variables, evidence_variables, elimination_order, log_space)
+
+        elimination_order = self.__find_elimination_order(query_variables, evidence_variables, elimination_order)
+        factors = self.__create_table_factors(evidence_variables)
+        if log_space:
+            factors = [x.to_log_space() for x in factors]
+
+        #in each step, we multiply the factors that contain the
+        #eliminated variable and sum the variable out of the product
+        for _,variable in enumerate(elimination_order):
+            factors = self.__eliminate_variable(factors, variable)
+
+        current_factor = factors[0]
+        for i in xrange(1, len(factors)):
+            current_factor = current_factor.multiply(factors[i])
+
+        query_table = current_factor.aligned_table(query_variables)
+        if log_space:
+            query_table = normalise_log_values(query_table)
+        alpha = numpy.sum(query_table)
 
         distribution = dict()
-        for i,value in enumerate(current_factor.values):
-            distribution[value[0]] = current_factor.probabilities[i] / alpha
+        query_values = [self.model.values[self.model.variable_indices[x]] for x in query_variables]
+        for value_indices in itertools.product(*[xrange(len(x)) for x in query_values]):
+            values = tuple([query_values[i][index] for i,index in enumerate(value_indices)])
+            distribution[values] = query_table[value_indices] / alpha
 
         return distribution
 
-    def __sum_and_enumerate(self, hidden_variables, variable_assignments, variables, dependency_levels, current_dependency_level):
+    def perform_marginal_inference(self, query_variables, evidence_variables):
+        """Calculates the distributions P(X|evidence_variables) of multiple query variables in one pass.
+        The marginals are calculated by calibrating a junction tree of the network, such that
+        the intermediate factors are shared by all query variables; the tree is created once and reused by later calls.
+
+        Keyword arguments:
+        query_variables -- A list of names of query variables (None, resulting in all non-evidence variables).
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+
+        Returns:
+        distributions -- A dictionary containing the names of the query variables as keys and dictionaries
+                         of values and probabilities (as returned by 'perform_ve_inference') as values.
+
+        """
+        if self.junction_tree == None:
+            self.junction_tree = JunctionTreeEngine(self.model)
+
+        if query_variables == None:
+            query_variables = [x for x in self.model.variables if x not in evidence_variables]
+        return self.junction_tree.get_marginals(evidence_variables, query_variables)
+
+    def find_elimination_order(self, query_variable, evidence_variables, elimination_order='min_fill'):
+        """Finds the order in which variable elimination eliminates the hidden variables.
+        The order is found in the moral graph of the network from which the evidence variables have been removed.
+
+        Keyword arguments:
+        query_variable -- The name of the query variable (as called in the network).
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+        elimination_order -- The name of a heuristic in 'elimination_order.heuristics' or a heuristic function (default 'min_fill');
+                             if a list of variable names is given, it is returned without changes.
+
+        Returns:
+        elimination_order -- A list containing the names of the hidden variables; if the network is pruned,
+                             only the hidden variables of the subnetwork that is relevant for the query are contained.
+
+        """
+        if self.pruner != None:
+            engine, evidence_variables = self.pruner.get_engine([query_variable], evidence_variables)
+            elimination_order = self.__remove_pruned_variables(engine, elimination_order)
+            return engine.find_elimination_order(query_variable, evidence_variables, elimination_order)
+
+        return self.__find_elimination_order([query_variable], evidence_variables, elimination_order)
+
+    def predict_largest_factor_size(self, query_variable, evidence_variables, elimination_order='min_fill'):
+        """Predicts the number of entries of the largest intermediate factor that variable elimination creates,
+        without performing inference. This can be used for rejecting queries that need too much memory.
+
+        Keyword arguments:
+        query_variable -- The name of the query variable (as called in the network).
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+        elimination_order -- A list of variable names, the name of a heuristic in 'elimination_order.heuristics',
+                             or a heuristic function (default 'min_fill').
+
+        Returns:
+        largest_factor_size -- The number of entries in the largest factor.
+
+        """
+        if self.pruner != None:
+            engine, evidence_variables = self.pruner.get_engine([query_variable], evidence_variables)
+            elimination_order = self.__remove_pruned_variables(engine, elimination_order)
+            return engine.predict_largest_factor_size(query_variable, evidence_variables, elimination_order)
+
+        elimination_order = self.__find_elimination_order([query_variable], evidence_variables, elimination_order)
+        graph = self.__remove_evidence_variables(evidence_variables)
+        variable_order = [self.model.variable_indices[x] for x in elimination_order]
+        return find_largest_factor_size(graph, variable_order, self.model.cardinalities)
+
+    def __create_pruned_engine(self, model):
+        """Creates the engine that answers the queries in a pruned subnetwork; the engines are cached by 'self.pruner'."""
+        return ExactInferenceEngine(model, False)
+
+    def __add_observed_query_variables(self, query_variables, evidence_variables, unobserved_distribution):
+        """Extends the joint distribution of the unobserved query variables to all query variables,
+        such that the probability of each combination of values that disagrees with the evidence is zero.
+
+        Keyword arguments:
+        query_variables -- A list of names of query variables, some of which are evidence variables.
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+        unobserved_distribution -- A dictionary containing tuples of values of the query variables that are not
+                                   evidence variables (in the order given by 'query_variables') as keys and the probabilities as values.
+
+        Returns:
+        distribution -- A dictionary containing tuples of values of the query variables as keys and the probabilities as values.
+
+        """
+        distribution = dict()
+        query_values = [self.model.values[self.model.variable_indices[x]] for x in query_variables]
+        for values in itertools.product(*query_values):
+            unobserved_values = []
+            probability = 1.
+            for i,variable in enumerate(query_variables):
+                if variable not in evidence_variables:
+                    unobserved_values.append(values[i])
+                elif values[i] != evidence_variables[variable]:
+                    probability = 0.
+            distribution[values] = probability * unobserved_distribution[tuple(unobserved_values)]
+        return distribution
+
+    def __remove_pruned_variables(self, engine, elimination_order):
+        """Removes the variables that are not contained in the pruned subnetwork of an engine from an elimination order,
+        such that an order found in the full network can be used; heuristics are returned without changes.
+
+        Keyword arguments:
+        engine -- An 'ExactInferenceEngine' object that answers a query in a pruned subnetwork.
+        elimination_order -- A list of variable names, the name of a heuristic in 'elimination_order.heuristics', or a heuristic function.
+
+        Returns:
+        elimination_order -- The elimination order restricted to the variables of the subnetwork.
+
+        """
+        if not isinstance(elimination_order, list):
+            return elimination_order
+        return [x for x in elimination_order if x in engine.model.variable_indices]
+
+    def __find_elimination_order(self, query_variables, evidence_variables, elimination_order):
+        """Finds the order in which variable elimination eliminates the variables that are neither query nor evidence variables.
+
+        Keyword arguments:
+        query_variables -- A list of names of query variables.
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+        elimination_order -- A list of variable names, the name of a heuristic in 'elimination_order.heuristics', or a heuristic function.
+
+        Returns:
+        elimination_order -- A list containing the names of the hidden variables.
+
+        """
+        if isinstance(elimination_order, list):
+            return elimination_order
+
+        hidden_variables = []
+        for i,var in enumerate(self.model.variables):
+            if var not in query_variables and var not in evidence_variables:
+                hidden_variables.append(i)
+
+        graph = self.__remove_evidence_variables(evidence_variables)
+        variable_order = find_elimination_order(graph, hidden_variables, self.model.cardinalities, elimination_order)
+        return [self.model.variables[x] for x in variable_order]
+
+    def __remove_evidence_variables(self, evidence_variables):
+        """Returns a copy of the moral graph without the evidence variables, which are removed from the factors before elimination.
+
+        Keyword arguments:
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+
+        Returns:
+        graph -- A list of sets, such that 'graph[i]' contains the indices of the neighbours of the i-th variable.
+
+        """
+        evidence = set([self.model.variable_indices[x] for x in evidence_variables])
+        graph = []
+        for i in xrange(self.model.number_of_variables):
+            if i in evidence:
+                graph.append(set())
+            else:
+                graph.append(self.moral_graph[i] - evidence)
+        return graph
+
+    def __sum_and_enumerate(self, hidden_variables, variable_assignments, variables, dependency_levels, current_dependency_level, log_space=False):
         """Recursively calculates the sum of those entries in the joint probability distribution
         which are necessary for finding the probability of the query variable.
 
         Keyword arguments:
-        hidden_variables -- A list containing the names of the hidden variables that have not been assigned yet.
-        variable_assignments -- A dictionary containing the current assignments to all variables.
+        hidden_variables -- A list containing the indices of the hidden variables that have not been assigned yet.
+        variable_assignments -- An integer 'numpy.array' containing the current value indices of all variables.
         variables -- Variables in the network with indices aligned to those of 'dependency_levels'.
         dependency_levels -- A 'numpy.array' containing zero-based indices indicating the level at which we can
                              extract terms in front of an inner summation.
         current_dependency_level -- An integer denoting the index of the current inner summation.
+        log_space -- If True, the logarithm of the sum is calculated (default False).
 
         Returns:
         probability -- In the base case, returns the probability of a term calculated
                        after all variables in the network have been assigned.
-                       Returns the sum of such terms in the recursive call.
+                       Returns the sum of such terms in the recursive call (or its logarithm in log space).
 
         """
 
@@ -134,7 +368,7 @@ class ExactInferenceEngine(object):
             # relevant_variables = variables[numpy.where(dependency_levels==current_dependency_level-1)[0]]
             # probability = self.calculate_term_product(relevant_variables, variable_assignments)
             # return probability
-            return 1.0
+            return 0.0 if log_space else 1.0
         #--------- Recursive case ---------
         #we take one of the hidden variables, assign a value to it, perform a recursive call, and sum the results
         else:
@@ -143,262 +377,124 @@ class ExactInferenceEngine(object):
             new_hidden_variables.remove(variable_to_assign)
 
             probability = 0.0
+            log_terms = []
             relevant_variables = variables[numpy.where(dependency_levels==current_dependency_level)[0]]
-            for _,value in enumerate(self.network.Vdata[variable_to_assign]['vals']):
-                variable_assignments[variable_to_assign] = value
+            for value_index in xrange(self.model.cardinalities[variable_to_assign]):
+                variable_assignments[variable_to_assign] = value_index
 
                 #we calculate a product of terms in case we have CPTs that are independent
                 #of the summation over the hidden variables that are not assigned yet
-                term_product = 1.0
+                term_product = 0.0 if log_space else 1.0
                 if len(relevant_variables) > 0:
-                    term_product = self.__calculate_term_product(relevant_variables, variable_assignments)
+                    term_product = self.__calculate_term_product(relevant_variables, variable_assignments, log_space)
 
-                term_product = term_product * self.__sum_and_enumerate(new_hidden_variables, variable_assignments, variables, dependency_levels, current_dependency_level + 1)
-                probability = probability + term_product
+                summation = self.__sum_and_enumerate(new_hidden_variables, variable_assignments, variables, dependency_levels, current_dependency_level + 1, log_space)
+                if log_space:
+                    log_terms.append(term_product + summation)
+                else:
+                    probability = probability + term_product * summation
 
+            if log_space:
+                return logsumexp(log_terms)
             return probability
 
-    def __find_dependency_levels(self, known_variables, hidden_variables):
+    def __find_dependency_levels(self, hidden_variables):
         """Looks for the level at which a term can be extracted in front of an inner summation.
         Doing this for each of the variables allows us to decompose the summation over the hidden variables appropriately.
 
         Keyword arguments:
-        known_variables -- A list containing evidence variables and the query variable.
-        hidden_variables -- A list of hidden variables.
+        hidden_variables -- A list of indices of hidden variables.
 
         Returns:
-        variables -- A 'numpy.array' of variables in the network.
+        variables -- A 'numpy.array' of variable indices.
         dependency_levels -- A 'numpy.array' containing zero-based indices that indicate the level at which we can
                              extract a certain term in front of an inner summation. The indices of this array and
                              the array 'variables' are aligned, such that 'dependency_level[i]' denotes the
                              dependency level of 'variable[i]'.
 
         """
-        variables = numpy.array(self.network.V)
-        dependency_levels = numpy.zeros(variables.shape, dtype=int)
-
-        #we look for dependencies between the CPTs of the known variables
-        #and the hidden variables and assign an appropriate level to them
-        for _,variable in enumerate(known_variables):
-            variable_index = numpy.where(variables==variable)[0][0]
-            dependency_levels[variable_index] = -1
-            for i in xrange(len(hidden_variables)):
-                hidden = hidden_variables[i]
-                variable_is_child = self.network.Vdata[hidden]['children'] != None and variable in self.network.Vdata[hidden]['children']
-                if variable_is_child:
-                    dependency_levels[variable_index] = i
-                    break
-
-        #we look for dependencies between the CPTs of the hidden variables
-        #and the other hidden variables and assign an appropriate level to them
+        variables = numpy.arange(self.model.number_of_variables)
+        hidden_variable_levels = -numpy.ones(self.model.number_of_variables, dtype=int)
         for i,variable in enumerate(hidden_variables):
-            variable_index = numpy.where(variables==variable)[0][0]
-            dependency_levels[variable_index] = i
-            for j in xrange(i+1,len(hidden_variables)):
-                hidden = hidden_variables[j]
-                variable_is_child = self.network.Vdata[hidden]['children'] != None and variable in self.network.Vdata[hidden]['children']
-                if variable_is_child:
-                    dependency_levels[variable_index] = j
-                    break
+            hidden_variable_levels[variable] = i
+
+        #the CPT of a variable can be extracted in front of the summation over
+        #the last hidden variable among the variable itself and its parents;
+        #CPTs that do not contain hidden variables are at level -1
+        dependency_levels = numpy.zeros(variables.shape, dtype=int)
+        for _,variable in enumerate(variables):
+            family_levels = hidden_variable_levels[self.model.parents[variable]]
+            dependency_levels[variable] = max([hidden_variable_levels[variable]] + list(family_levels))
 
         return variables, dependency_levels
 
-    def __calculate_term_product(self, relevant_variables, variable_assignments):
+    def __calculate_term_product(self, relevant_variables, variable_assignments, log_space=False):
         """Calculates the product of CPT entries that correspond to the
         assignments given by 'variable_assignments' and contain the variables in 'relevant_variables'.
 
         Keyword arguments:
-        relevant_variables -- A 'numpy.array' containing variable names.
-        variable_assignments -- A dictionary containing the current variable assignments.
+        relevant_variables -- A 'numpy.array' containing variable indices.
+        variable_assignments -- An integer 'numpy.array' containing the current value indices of all variables.
+        log_space -- If True, the sum of the log-probabilities is calculated instead (default False).
 
         Returns:
         probability -- The calculated product of terms.
 
         """
-        probability = 1.0
+        if log_space:
+            log_probability = 0.0
+            for _,variable in enumerate(relevant_variables):
+                log_probability = log_probability + self.model.get_log_probability(variable, variable_assignments)
+            return log_probability
 
+        probability = 1.0
         for _,variable in enumerate(relevant_variables):
-            value_index = self.network.Vdata[variable]['vals'].index(variable_assignments[variable])
-            parents = self.network.Vdata[variable]['parents']
-
-            if parents == None:
-                probability = probability * self.network.Vdata[variable]['cprob'][value_index]
-            else:
-                parent_values = list()
-                for _,parent in enumerate(parents):
-                    parent_values.append(variable_assignments[parent])
-                parent_values_string = "[" + ", ".join("'" + x + "'" for x in parent_values) + "]"
-                probability = probability * self.network.Vdata[variable]['cprob'][parent_values_string][value_index]
-
+            probability = probability * self.model.get_probability(variable, variable_assignments)
         return probability
 
-    def __create_factors(self, evidence_variables, variables, dependency_levels):
-        """
+    def __create_table_factors(self, evidence_variables):
+        """Creates a 'TableFactor' for the CPT of each variable in the network.
+        The factors are reduced by the observed values of the evidence variables.
 
         Keyword arguments:
         evidence_variables -- A dictionary containing evidence variables as keys and the observed values as values.
-        variables -- A list of variables in the network.
-        dependency_levels -- A 'numpy.array' returned by 'self.__find_dependency_levels'.
 
         Returns:
-        factors -- A list of 'Factor' objects ordered in reverse order of the values in 'dependency_levels'.
+        factors -- A list of 'TableFactor' objects.
 
         """
-
-        #we are going to create factors from the highest level of dependency
-        sorting_indices = numpy.argsort(dependency_levels)[::-1]
-        number_of_variables = len(variables)
-        known_variables = list(evidence_variables.keys())
         factors = []
-
-        for i in xrange(number_of_variables):
-            factor_variables = []
-            factor_values = []
-            factor_probabilities = []
-
-            variable = variables[sorting_indices[i]]
-            values = numpy.array(self.network.Vdata[variable]['vals'])
-            parents = self.network.Vdata[variable]['parents']
-            if parents == None:
-                #the factor has an empty scope if we have
-                #an evidence variable that doesn't have any parents
-                if variable in known_variables:
-                    evidence_value = evidence_variables[variable]
-                    value_index = numpy.where(values == evidence_value)[0]
-                    cpt = self.network.Vdata[variable]['cprob']
-
-                    factor_values.append(values[value_index])
-                    factor_probabilities.append(cpt[value_index])
-                else:
-                    cpt = self.network.Vdata[variable]['cprob']
-                    factor_variables.append(variable)
-
-                    for i,val in enumerate(values):
-                        factor_values.append([val])
-                        factor_probabilities.append(cpt[i])
-            else:
-                #if the variable is one of the evidence variables,
-                #the factor will only contain the probabilities
-                #that correspond to the observed value
-                if variable in known_variables:
-                    evidence_value = evidence_variables[variable]
-                    value_index = numpy.where(values == evidence_value)[0]
-                    cpt = self.network.Vdata[variable]['cprob']
-
-                    #we check if any of the variable's parents is an evidence variable
-                    known_parents = []
-                    for _,parent in enumerate(parents):
-                        if parent in known_variables:
-                            known_parents.append(parent)
-
-                    #if none of the parents are known, we just take the probabilities
-                    #that correspond to the variable's observed value
-                    if len(known_parents) == 0:
-                        factor_variables = list(parents)
-                        for _,cpt_values in enumerate(cpt.keys()):
-                            cpt_values_list = ast.literal_eval(cpt_values)
-                            factor_values.append(cpt_values_list)
-                            factor_probabilities.append(cpt[cpt_values][value_index])
-                    #if some of the parents are also evidence variables,
-                    #we take the probabilities that correspond to the observed values
-                    else:
-                        factor_variables = list(set(parents) - set(known_parents))
-                        parent_indices = [x for x,val in enumerate(parents) if val in known_parents]
-                        for _,cpt_values in enumerate(cpt.keys()):
-                            cpt_values_list = ast.literal_eval(cpt_values)
-
-                            evidence_values_ok = True
-                            for _,index in enumerate(parent_indices):
-                                if cpt_values_list[index] != evidence_variables[parents[index]]:
-                                    evidence_values_ok = False
-                                    break
-
-                            if evidence_values_ok:
-                                factor_values_list = []
-                                for _,var in enumerate(factor_variables):
-                                    variable_index = parents.index(var)
-                                    factor_values_list.append(cpt_values_list[variable_index])
-                                factor_values.append(factor_values_list)
-                                factor_probabilities.append(cpt[cpt_values][value_index])
-                else:
-                    cpt = self.network.Vdata[variable]['cprob']
-
-                    #we check if any of the variable's parents is an evidence variable
-                    known_parents = []
-                    for _,parent in enumerate(parents):
-                        if parent in known_variables:
-                            known_parents.append(parent)
-
-                    if len(known_parents) == 0:
-                        factor_variables = list(parents)
-                        factor_variables.insert(0, variable)
-                        for _,cpt_values in enumerate(cpt.keys()):
-                            cpt_values_list = ast.literal_eval(cpt_values)
-
-                            for i,val in enumerate(values):
-                                values_list = list(cpt_values_list)
-                                values_list.insert(0, val)
-                                factor_values.append(values_list)
-                                factor_probabilities.append(cpt[cpt_values][i])
-                    #if some of the parents are also evidence variables,
-                    #we take the probabilities that correspond to the observed values
-                    else:
-                        factor_variables = list(set(parents) - set(known_parents))
-                        factor_variables.insert(0, variable)
-                        parent_indices = [x for x,val in enumerate(parents) if val in known_parents]
-                        for _,cpt_values in enumerate(cpt.keys()):
-                            cpt_values_list = ast.literal_eval(cpt_values)
-
-                            evidence_values_ok = True
-                            for _,index in enumerate(parent_indices):
-                                if cpt_values_list[index] != evidence_variables[parents[index]]:
-                                    evidence_values_ok = False
-                                    break
-
-                            if evidence_values_ok:
-                                factor_values_list = []
-                                for _,var in enumerate(factor_variables):
-                                    variable_index = parents.index(var)
-                                    factor_values_list.append(cpt_values_list[variable_index])
-
-                                for i,val in enumerate(values):
-                                    values_list = list(factor_values)
-                                    values_list.insert(0, val)
-                                    factor_values.append(values_list)
-                                    factor_probabilities.append(cpt[cpt_values][i])
-
-            new_factor = Factor(factor_variables, factor_values, factor_probabilities)
+        for i in xrange(self.model.number_of_variables):
+            new_factor = self.model.get_factor(i)
+            for _,factor_variable in enumerate(list(new_factor.variables)):
+                if factor_variable in evidence_variables:
+                    new_factor.reduce(factor_variable, evidence_variables[factor_variable])
             factors.append(new_factor)
 
         return factors
 
-    def __multiply_factors(self, factors, current_factor, dependency_levels, current_dependency_level):
-        """Multiplies the factors that are at the distribution summation's current level.
+    def __eliminate_variable(self, factors, variable):
+        """Multiplies the factors that contain 'variable' and sums the variable out of their product.
 
         Keyword arguments:
-        factors -- A list of factors.
-        current_factor -- A factor storing partially computed values; if its list of variables is empty,
-                          we are just starting the computations in the network.
-        dependency_levels -- A 'numpy.array' returned by 'self.__find_dependency_levels'.
-        current_dependency_level -- The distribution summation's current level.
+        factors -- A list of 'TableFactor' objects.
+        variable -- Name of the variable that should be eliminated.
 
         Returns:
-        current_factor -- A factor storing partially computed updated values.
+        new_factors -- A list of 'TableFactor' objects that do not contain 'variable'.
 
         """
-        number_of_factors_to_multiply = len(numpy.where(dependency_levels==current_dependency_level)[0])
-        if number_of_factors_to_multiply == 1:
-            if len(current_factor.probabilities) == 0:
-                current_factor = factors[0]
-            else:
-                current_factor = current_factor.multiply(factors[0])
-            factors.pop(0)
-        else:
-            for i in xrange(number_of_factors_to_multiply):
-                if len(current_factor.probabilities) == 0:
-                    current_factor = factors[0]
+        new_factors = []
+        product = None
+        for _,factor in enumerate(factors):
+            if variable in factor.variables:
+                if product == None:
+                    product = factor
                 else:
-                    current_factor = current_factor.multiply(factors[0])
-                factors.pop(0)
+                    product = product.multiply(factor)
+            else:
+                new_factors.append(factor)
 
-        return current_factor
\ No newline at end of file
+        if product != None:
+            new_factors.append(product.sum_out(variable))
+        return new_factors
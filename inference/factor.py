@@ -1,4 +1,5 @@
 import numpy
+from log_space import log_probabilities, logsumexp
 
 class Factor(object):
     def __init__(self, variables=[], values=[], probabilities=[]):
@@ -126,4 +127,162 @@ class Factor(object):
         self.values = new_values
         self.probabilities = new_probabilities
 
-        return self
\ No newline at end of file
+        return self
+
+
+class TableFactor(object):
+    def __init__(self, variables, values, table, value_indices=None, log_space=False):
+        """Defines a new factor of the variables in 'variables' whose probabilities are stored in a 'numpy.array'
+        with one axis per variable. In log space, the table contains log-probabilities, products of factors are
+        calculated as sums and variables are summed out using log-sum-exp, so products of many small probabilities do not underflow.
+
+        Keyword arguments:
+        variables -- A list of variables in the factor; the i-th variable is associated with the i-th axis of 'table'.
+        values -- A list of lists, such that 'values[i]' contains the values of the i-th variable
+                  in the order in which they appear along the i-th axis of 'table'.
+        table -- A 'numpy.array' of probabilities with one axis per variable in 'variables'.
+        value_indices -- A list of dictionaries mapping the values of each variable to indices along
+                         the variable's axis (default None, in which case the dictionaries are created from 'values').
+        log_space -- If True, 'table' contains log-probabilities (default False).
+
+        """
+        self.variables = list(variables)
+        self.values = list(values)
+        self.table = numpy.asarray(table, dtype=float)
+        self.log_space = log_space
+
+        if value_indices == None:
+            value_indices = []
+            for _,variable_values in enumerate(self.values):
+                value_indices.append(dict((value,i) for i,value in enumerate(variable_values)))
+        self.value_indices = list(value_indices)
+
+    def multiply(self, other):
+        """Multiplies 'self' with 'other'. The tables of the factors are aligned
+        along the axes of their common variables and multiplied using broadcasting.
+
+        Keyword arguments:
+        other -- A 'TableFactor' object in the same space as 'self'.
+
+        Returns:
+        new_factor -- A 'TableFactor' object representing the product of the factors 'self' and 'other'.
+
+        """
+        #the variables of the new factor are the variables of 'self' followed by
+        #the variables of 'other' that do not appear in 'self'
+        new_variables = list(self.variables)
+        new_values = list(self.values)
+        new_value_indices = list(self.value_indices)
+        for i,variable in enumerate(other.variables):
+            if variable not in self.variables:
+                new_variables.append(variable)
+                new_values.append(other.values[i])
+                new_value_indices.append(other.value_indices[i])
+
+        if self.log_space:
+            new_table = self.aligned_table(new_variables) + other.aligned_table(new_variables)
+        else:
+            new_table = self.aligned_table(new_variables) * other.aligned_table(new_variables)
+        new_factor = TableFactor(new_variables, new_values, new_table, new_value_indices, self.log_space)
+        return new_factor
+
+    def sum_out(self, variable):
+        """Sums out 'variable' from the factor.
+
+        Keyword arguments:
+        variable -- Name of a variable in the factor.
+
+        Returns:
+        self
+
+        """
+        variable_index = self.variables.index(variable)
+        if self.log_space:
+            self.table = logsumexp(self.table, axis=variable_index)
+        else:
+            self.table = self.table.sum(axis=variable_index)
+        self.__remove_axis(variable_index)
+        return self
+
+    def marginal(self, variables):
+        """Sums out all variables of the factor that are not in 'variables'.
+        Unlike 'sum_out', the factor itself is not modified.
+
+        Keyword arguments:
+        variables -- A list of names of variables in the factor that should be kept.
+
+        Returns:
+        new_factor -- A 'TableFactor' object over the kept variables.
+
+        """
+        kept_axes = []
+        summed_axes = []
+        for i,variable in enumerate(self.variables):
+            if variable in variables:
+                kept_axes.append(i)
+            else:
+                summed_axes.append(i)
+
+        if self.log_space:
+            new_table = logsumexp(self.table, axis=tuple(summed_axes))
+        else:
+            new_table = numpy.sum(self.table, axis=tuple(summed_axes))
+        new_factor = TableFactor([self.variables[i] for i in kept_axes],
+                                 [self.values[i] for i in kept_axes],
+                                 new_table,
+                                 [self.value_indices[i] for i in kept_axes],
+                                 self.log_space)
+        return new_factor
+
+    def to_log_space(self):
+        """Returns a copy of the factor whose table contains the logarithms of the probabilities (or the factor itself if it is already in log space)."""
+        if self.log_space:
+            return self
+        return TableFactor(self.variables, self.values, log_probabilities(self.table), self.value_indices, True)
+
+    def reduce(self, variable, value):
+        """Restricts the factor to the entries in which 'variable' takes the value 'value'.
+        The variable's axis is removed from the factor.
+
+        Keyword arguments:
+        variable -- Name of a variable in the factor.
+        value -- The observed value of the variable.
+
+        Returns:
+        self
+
+        """
+        variable_index = self.variables.index(variable)
+        value_index = self.value_indices[variable_index][value]
+        self.table = numpy.take(self.table, value_index, axis=variable_index)
+        self.__remove_axis(variable_index)
+        return self
+
+    def aligned_table(self, variables):
+        """Returns a view of the factor's table whose axes follow the order of the variables in 'variables'.
+        Variables that are not in the factor are given axes of length one, such that
+        the view can be broadcast against tables of factors containing those variables.
+
+        Keyword arguments:
+        variables -- A list of variables that includes all variables of the factor.
+
+        Returns:
+        table -- A 'numpy.array' view of 'self.table' with 'len(variables)' axes.
+
+        """
+        axes = []
+        shape = []
+        for _,variable in enumerate(variables):
+            if variable in self.variables:
+                variable_index = self.variables.index(variable)
+                axes.append(variable_index)
+                shape.append(self.table.shape[variable_index])
+            else:
+                shape.append(1)
+
+        return self.table.transpose(axes).reshape(shape)
+
+    def __remove_axis(self, variable_index):
+        self.variables.pop(variable_index)
+        self.values.pop(variable_index)
+        self.value_indices.pop(variable_index)
@@ -0,0 +1,465 @@
+import numpy
+import time
+import bisect
+import multiprocessing
+from compiled_network import CompiledNetwork, compile_network
+from network_pruning import NetworkPruner
+from random_streams import create_random_states
+from convergence import potential_scale_reduction, effective_sample_size, batch_means_standard_error, count_batches, beta_standard_error, is_estimate_final
+
+class GibbsSamplingEngine(object):
+    def __init__(self, network, prune_network=True, max_table_size=65536):
+        """Defines an engine for performing approximate inference in a discrete Bayesian network using Gibbs sampling.
+        The Markov blanket of each variable is precomputed, such that resampling a variable
+        only touches the CPTs of the variable and its children. If it is small enough, the distribution of a variable
+        given each assignment of its Markov blanket is tabulated as well, such that the variable is resampled with a single lookup.
+
+        Keyword arguments:
+        network -- A 'libpgm.discretebayesiannetwork.DiscreteBayesianNetwork' object representing a discrete Bayesian network
+                   or a 'CompiledNetwork' object created from such a network.
+        prune_network -- If True, each query is answered in the minimal subnetwork that is relevant for the query (default True).
+        max_table_size -- The maximum number of entries in the tabulated distribution of a variable given its Markov blanket;
+                          variables with larger tables are resampled by multiplying the CPTs of their children (default 65536).
+
+        """
+        self.network = network
+        if isinstance(network, CompiledNetwork):
+            self.model = network
+        else:
+            self.model = compile_network(network)
+
+        self.pruner = None
+        if prune_network:
+            self.pruner = NetworkPruner(self.model, self.__create_pruned_engine)
+
+        self.max_table_size = max_table_size
+        self.blankets = self.__find_blankets()
+        self.blanket_tables = self.__create_blanket_tables()
+
+        #for a single chain, the overhead of numpy calls dominates the cost of resampling a variable,
+        #so the tables are also stored as lists that can be used with Python scalars
+        self.chain_blanket_tables = dict()
+        for variable,(blanket_variables, blanket_strides, offset_cumulative_table) in self.blanket_tables.iteritems():
+            self.chain_blanket_tables[variable] = (list(blanket_variables), list(blanket_strides), offset_cumulative_table.tolist())
+
+    def perform_inference(self, query_variable, evidence_variables, number_of_samples, number_of_chains=1):
+        """Calculates the probability distribution P(query_variable|evidence_variables)
+        using Gibbs sampling. Assumes that we have only one query variable.
+
+        Keyword arguments:
+        query_variable -- The name of the query variable (as called in the network).
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+        number_of_samples -- The number of samples that should be used in the sampling process.
+        number_of_chains -- The number of chains that are sampled simultaneously;
+                            each sweep over the variables produces one sample per chain (default 1).
+
+        Returns:
+        distribution -- A dictionary containing the values of the query variable as keys and the probabilities as values.
+
+        """
+        if self.pruner != None:
+            engine, evidence_variables = self.pruner.get_engine([query_variable], evidence_variables)
+            return engine.perform_inference(query_variable, evidence_variables, number_of_samples, number_of_chains)
+
+        query_index = self.model.variable_indices[query_variable]
+        evidence = self.model.encode_evidence(evidence_variables)
+        value_counts = numpy.zeros(self.model.cardinalities[query_index])
+
+        state = self._create_initial_state(evidence, number_of_chains)
+        variables_to_sample = [x for x in xrange(self.model.number_of_variables) if x not in evidence]
+        number_of_sweeps = int(numpy.ceil(float(number_of_samples) / number_of_chains))
+        if number_of_chains == 1 and all([x in self.chain_blanket_tables for x in variables_to_sample]):
+            assignments = [int(x) for x in state[:,0]]
+            for i in xrange(number_of_sweeps):
+                self._sweep_chain(assignments, variables_to_sample)
+                value_counts[assignments[query_index]] = value_counts[assignments[query_index]] + 1.
+        else:
+            for i in xrange(number_of_sweeps):
+                self._sweep(state, variables_to_sample)
+                value_counts = value_counts + numpy.bincount(state[query_index], minlength=len(value_counts))
+
+        normaliser = numpy.sum(value_counts)
+        if normaliser > 1e-10:
+            value_counts = value_counts / normaliser
+
+        distribution = dict()
+        for i,value in enumerate(self.model.values[query_index]):
+            distribution[value] = value_counts[i]
+        return distribution
+
+    def perform_multichain_inference(self, query_variable, evidence_variables, number_of_samples, number_of_chains=4,
+                                     burn_in=500, thinning=1, max_r_hat=1.01, min_effective_sample_size=1000,
+                                     check_interval=1000, number_of_processes=None, seed=None):
+        """Calculates the probability distribution P(query_variable|evidence_variables) using multiple independent Gibbs chains.
+        Each chain has its own random number generator and the chains are run in a pool of processes. The chains are advanced
+        in rounds of 'check_interval' retained samples; after each round, the potential scale reduction factor (R-hat) and
+        the effective sample size of the indicator of each query value are calculated and sampling stops early if
+        all R-hat values are at most 'max_r_hat' and all effective sample sizes are at least 'min_effective_sample_size'.
+        For a given seed, the result does not depend on the number of processes.
+
+        Keyword arguments:
+        query_variable -- The name of the query variable (as called in the network).
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+        number_of_samples -- The maximum number of retained samples (summed over all chains).
+        number_of_chains -- The number of independent chains (default 4).
+        burn_in -- The number of sweeps discarded at the beginning of each chain (default 500).
+        thinning -- Only every 'thinning'-th sweep is retained (default 1).
+        max_r_hat -- The largest R-hat value that is considered converged (default 1.01).
+        min_effective_sample_size -- The effective sample size needed for stopping early (default 1000).
+        check_interval -- The number of retained samples per chain between two convergence checks (default 1000).
+        number_of_processes -- The number of worker processes (default None, resulting in one process per chain,
+                               but at most one per CPU); if 1, the chains are run in the current process.
+        seed -- A seed for the random number generators of the chains (default None).
+
+        Returns:
+        distribution -- A dictionary containing the values of the query variable as keys and the probabilities as values.
+        diagnostics -- A dictionary with the keys 'r_hat' and 'effective_sample_size', whose values are dictionaries containing
+                       the values of the query variable as keys, 'number_of_samples', the number of retained samples,
+                       and 'converged', which is True if sampling stopped because the convergence criteria were met.
+
+        """
+        if number_of_samples < 1 or number_of_chains < 1 or check_interval < 1:
+            raise ValueError('The number of samples, the number of chains and the check interval must be positive')
+
+        if self.pruner != None:
+            engine, evidence_variables = self.pruner.get_engine([query_variable], evidence_variables)
+            return engine.perform_multichain_inference(query_variable, evidence_variables,
+                number_of_samples, number_of_chains, burn_in, thinning, max_r_hat, min_effective_sample_size, check_interval, number_of_processes, seed)
+
+        query_index = self.model.variable_indices[query_variable]
+        evidence = self.model.encode_evidence(evidence_variables)
+        variables_to_sample = [x for x in xrange(self.model.number_of_variables) if x not in evidence]
+        samples_per_chain = int(numpy.ceil(float(number_of_samples) / number_of_chains))
+
+        random_states = create_random_states(seed, number_of_chains)
+        chain_states = [self._create_initial_state(evidence, 1, x)[:,0] for x in random_states]
+        chain_samples = [numpy.zeros(0, dtype=int) for _ in xrange(number_of_chains)]
+
+        if number_of_processes == None:
+            number_of_processes = min(number_of_chains, multiprocessing.cpu_count())
+        pool = None
+        if number_of_processes > 1:
+            pool = multiprocessing.Pool(number_of_processes, initializer=_initialise_worker, initargs=(self,))
+
+        try:
+            converged = False
+            burn_in_sweeps = burn_in
+            while len(chain_samples[0]) < samples_per_chain and not converged:
+                round_samples = min(check_interval, samples_per_chain - len(chain_samples[0]))
+                tasks = [(chain_states[i], variables_to_sample, query_index, burn_in_sweeps, round_samples, thinning, random_states[i]) for i in xrange(number_of_chains)]
+                if pool != None:
+                    results = pool.map(_run_chain_in_worker, tasks)
+                else:
+                    results = [self._run_chain(*x) for x in tasks]
+                burn_in_sweeps = 0
+
+                #the random states are returned by the workers, such that the next round continues each chain's random stream
+                for i,(state, random_state, samples) in enumerate(results):
+                    chain_states[i] = state
+                    random_states[i] = random_state
+                    chain_samples[i] = numpy.concatenate((chain_samples[i], samples))
+
+                diagnostics = self.__diagnose_chains(query_index, numpy.array(chain_samples))
+                converged = max(diagnostics['r_hat'].values()) <= max_r_hat and min(diagnostics['effective_sample_size'].values()) >= min_effective_sample_size
+        finally:
+            if pool != None:
+                pool.close()
+                pool.join()
+
+        all_samples = numpy.concatenate(chain_samples)
+        probabilities = numpy.bincount(all_samples, minlength=self.model.cardinalities[query_index]) / float(len(all_samples))
+        distribution = dict()
+        for i,value in enumerate(self.model.values[query_index]):
+            distribution[value] = probabilities[i]
+
+        diagnostics['number_of_samples'] = len(all_samples)
+        diagnostics['converged'] = converged
+        return distribution, diagnostics
+
+    def stream_inference(self, query_variable, evidence_variables, sweeps_per_estimate=1000, number_of_chains=1, burn_in=500,
+                         target_standard_error=None, max_samples=None, time_limit=None, seed=None):
+        """Estimates the probability distribution P(query_variable|evidence_variables) using Gibbs sampling,
+        yielding an updated estimate after every 'sweeps_per_estimate' sweeps. The standard errors are estimated using batch means,
+        which take the autocorrelation of the chains into account. The iteration stops once all standard errors are at most
+        'target_standard_error' and the chains consist of at least 100 batches, 'max_samples' samples have been retained
+        or 'time_limit' seconds have passed;
+        if none of them is given, the caller is responsible for stopping the iteration.
+
+        Keyword arguments:
+        query_variable -- The name of the query variable (as called in the network).
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+        sweeps_per_estimate -- The number of sweeps of each chain between two estimates (default 1000).
+        number_of_chains -- The number of independent chains (default 1).
+        burn_in -- The number of sweeps discarded at the beginning of each chain (default 500).
+        target_standard_error -- The required standard error of each estimated probability (default None).
+        max_samples -- The maximum number of retained samples, summed over all chains (default None).
+        time_limit -- The maximum number of seconds spent on sampling, including the burn-in (default None).
+        seed -- A seed for the random number generators of the chains (default None).
+
+        Returns:
+        A generator of tuples (distribution, standard_errors, number_of_samples), where 'distribution' and 'standard_errors'
+        are dictionaries containing the values of the query variable as keys and 'number_of_samples' is the number of retained samples.
+
+        """
+        if self.pruner != None:
+            engine, evidence_variables = self.pruner.get_engine([query_variable], evidence_variables)
+            for estimate in engine.stream_inference(query_variable, evidence_variables, sweeps_per_estimate,
+                                                    number_of_chains, burn_in, target_standard_error, max_samples, time_limit, seed):
+                yield estimate
+            return
+
+        start_time = time.time()
+        query_index = self.model.variable_indices[query_variable]
+        evidence = self.model.encode_evidence(evidence_variables)
+        variables_to_sample = [x for x in xrange(self.model.number_of_variables) if x not in evidence]
+
+        random_states = create_random_states(seed, number_of_chains)
+        chain_states = [self._create_initial_state(evidence, 1, x)[:,0] for x in random_states]
+        chain_samples = [numpy.zeros(0, dtype=int) for _ in xrange(number_of_chains)]
+        burn_in_sweeps = burn_in
+        while True:
+            round_samples = sweeps_per_estimate
+            if max_samples != None:
+                round_samples = min(sweeps_per_estimate, int(numpy.ceil(float(max_samples) / number_of_chains)) - len(chain_samples[0]))
+
+            for i in xrange(number_of_chains):
+                chain_states[i], random_states[i], samples = self._run_chain(chain_states[i], variables_to_sample, query_index, burn_in_sweeps, round_samples, 1, random_states[i])
+                chain_samples[i] = numpy.concatenate((chain_samples[i], samples))
+            burn_in_sweeps = 0
+
+            samples = numpy.array(chain_samples)
+            number_of_samples = samples.size
+            probabilities = numpy.bincount(samples.ravel(), minlength=self.model.cardinalities[query_index]) / float(number_of_samples)
+            standard_errors = numpy.array([batch_means_standard_error(samples == i) for i in xrange(self.model.cardinalities[query_index])])
+
+            #a chain that has not left a state has batch means with zero variance, so the standard errors are bounded from below
+            #by those of independent samples, and conservatively, each batch is counted as only one effective sample
+            standard_errors = numpy.maximum(standard_errors, beta_standard_error(probabilities, number_of_samples))
+            number_of_batches = count_batches(number_of_chains, samples.shape[1])
+
+            distribution = dict()
+            value_standard_errors = dict()
+            for i,value in enumerate(self.model.values[query_index]):
+                distribution[value] = probabilities[i]
+                value_standard_errors[value] = standard_errors[i]
+
+            yield distribution, value_standard_errors, number_of_samples
+            if is_estimate_final(standard_errors, number_of_samples, start_time, target_standard_error, max_samples, time_limit, number_of_batches):
+                return
+
+    def _create_initial_state(self, evidence, number_of_chains, random_state=numpy.random):
+        """Creates random initial assignments for a number of chains, fixing the evidence variables to their observed values.
+
+        Keyword arguments:
+        evidence -- A dictionary containing variable indices as keys and observed value indices as values.
+        number_of_chains -- The number of chains.
+        random_state -- A 'numpy.random.RandomState' object used for generating random numbers (default 'numpy.random').
+
+        Returns:
+        state -- An integer 'numpy.array' of shape (number_of_variables, number_of_chains) containing value indices.
+
+        """
+        state = numpy.zeros((self.model.number_of_variables, number_of_chains), dtype=int)
+        for i in xrange(self.model.number_of_variables):
+            if i in evidence:
+                state[i] = evidence[i]
+            else:
+                state[i] = random_state.randint(0, self.model.cardinalities[i], number_of_chains)
+        return state
+
+    def _sweep(self, state, variables_to_sample, random_state=numpy.random):
+        """Samples each of the given variables given its Markov blanket in all chains.
+        The state is updated in place.
+
+        Keyword arguments:
+        state -- An integer 'numpy.array' of shape (number_of_variables, number_of_chains) containing value indices.
+        variables_to_sample -- A list of indices of the variables that should be sampled.
+        random_state -- A 'numpy.random.RandomState' object used for generating random numbers (default 'numpy.random').
+
+        """
+        number_of_chains = state.shape[1]
+        for _,variable in enumerate(variables_to_sample):
+            number_of_values = self.model.cardinalities[variable]
+            if variable in self.blanket_tables:
+                #as in 'CompiledNetwork.offset_cumulative_cpts', the r-th row of the cumulative table is shifted by r,
+                #such that the values of all chains are found with a single call to 'numpy.searchsorted'
+                blanket_variables, blanket_strides, offset_cumulative_table = self.blanket_tables[variable]
+                row_indices = numpy.dot(blanket_strides, state[blanket_variables])
+                random_numbers = random_state.rand(number_of_chains) + row_indices
+                value_indices = numpy.searchsorted(offset_cumulative_table, random_numbers, side='right') - row_indices * number_of_values
+                state[variable] = numpy.minimum(value_indices, number_of_values-1)
+                continue
+
+            parents, parent_strides, children = self.blankets[variable]
+
+            #we take the probabilities of the variable's values given its parents in each chain
+            row_indices = numpy.dot(parent_strides, state[parents])
+            value_probabilities = self.model.cpt_rows[variable][row_indices]
+
+            #we multiply them by the probabilities of the children given their parents; for each child,
+            #the entries belonging to the variable's values are 'value_offsets' apart from the row selected by the other parents
+            for _,(child, other_parents, other_strides, value_offsets) in enumerate(children):
+                row_indices = numpy.dot(other_strides, state[other_parents])
+                value_probabilities *= self.model.cpt_rows[child][row_indices[:,numpy.newaxis] + value_offsets, state[child][:,numpy.newaxis]]
+
+            cumulative_distributions = numpy.cumsum(value_probabilities, axis=1)
+            random_numbers = random_state.rand(number_of_chains) * cumulative_distributions[:,-1]
+            value_indices = numpy.sum(cumulative_distributions <= random_numbers[:,numpy.newaxis], axis=1)
+            state[variable] = numpy.minimum(value_indices, number_of_values-1)
+
+    def _run_chain(self, assignments, variables_to_sample, query_index, burn_in, number_of_samples, thinning, random_state):
+        """Advances a single chain and records the values of the query variable.
+
+        Keyword arguments:
+        assignments -- An integer 'numpy.array' containing the value indices assigned to the variables.
+        variables_to_sample -- A list of indices of the variables that should be sampled.
+        query_index -- Index of the query variable.
+        burn_in -- The number of sweeps performed before the first sample is retained.
+        number_of_samples -- The number of samples that should be retained.
+        thinning -- Only every 'thinning'-th sweep is retained.
+        random_state -- A 'numpy.random.RandomState' object used for generating random numbers.
+
+        Returns:
+        assignments -- An integer 'numpy.array' containing the value indices after the last sweep.
+        random_state -- The random number generator after the last sweep.
+        samples -- An integer 'numpy.array' containing the value indices of the query variable in the retained samples.
+
+        """
+        samples = numpy.zeros(number_of_samples, dtype=int)
+        number_of_sweeps = burn_in + number_of_samples * thinning
+        if all([x in self.chain_blanket_tables for x in variables_to_sample]):
+            chain_assignments = [int(x) for x in assignments]
+            for i in xrange(number_of_sweeps):
+                self._sweep_chain(chain_assignments, variables_to_sample, random_state)
+                if i >= burn_in and (i - burn_in + 1) % thinning == 0:
+                    samples[(i - burn_in) // thinning] = chain_assignments[query_index]
+            return numpy.array(chain_assignments, dtype=int), random_state, samples
+
+        state = numpy.array(assignments, dtype=int)[:,numpy.newaxis]
+        for i in xrange(number_of_sweeps):
+            self._sweep(state, variables_to_sample, random_state)
+            if i >= burn_in and (i - burn_in + 1) % thinning == 0:
+                samples[(i - burn_in) // thinning] = state[query_index,0]
+        return state[:,0], random_state, samples
+
+    def _sweep_chain(self, assignments, variables_to_sample, random_state=numpy.random):
+        """Samples each of the given variables given its Markov blanket in a single chain.
+        All variables in 'variables_to_sample' need to have a tabulated distribution in 'self.chain_blanket_tables'.
+        The assignments are updated in place.
+
+        Keyword arguments:
+        assignments -- A list containing the value indices assigned to the variables.
+        variables_to_sample -- A list of indices of the variables that should be sampled.
+        random_state -- A 'numpy.random.RandomState' object used for generating random numbers (default 'numpy.random').
+
+        """
+        for _,variable in enumerate(variables_to_sample):
+            blanket_variables, blanket_strides, offset_cumulative_table = self.chain_blanket_tables[variable]
+            row_index = 0
+            for j,blanket_variable in enumerate(blanket_variables):
+                row_index = row_index + blanket_strides[j] * assignments[blanket_variable]
+
+            number_of_values = self.model.cardinalities[variable]
+            value_index = bisect.bisect_right(offset_cumulative_table, random_state.random_sample() + row_index) - row_index * number_of_values
+            assignments[variable] = min(value_index, number_of_values-1)
+
+    def __diagnose_chains(self, query_index, chain_samples):
+        """Calculates R-hat and the effective sample size of the indicator of each value of the query variable.
+
+        Keyword arguments:
+        query_index -- Index of the query variable.
+        chain_samples -- An integer 'numpy.array' of shape (number_of_chains, number_of_samples) containing value indices.
+
+        Returns:
+        diagnostics -- A dictionary with the keys 'r_hat' and 'effective_sample_size',
+                       whose values are dictionaries containing the values of the query variable as keys.
+
+        """
+        diagnostics = {'r_hat': dict(), 'effective_sample_size': dict()}
+        for i,value in enumerate(self.model.values[query_index]):
+            indicators = chain_samples == i
+            diagnostics['r_hat'][value] = potential_scale_reduction(indicators)
+            diagnostics['effective_sample_size'][value] = effective_sample_size(indicators)
+        return diagnostics
+
+    def __create_pruned_engine(self, model):
+        """Creates the engine that answers the queries in a pruned subnetwork; the engines are cached by 'self.pruner'."""
+        return GibbsSamplingEngine(model, False, self.max_table_size)
+
+    def __find_blankets(self):
+        """Precomputes the indices and strides needed for calculating the distribution of each variable given its Markov blanket.
+
+        Returns:
+        blankets -- A list containing a tuple (parents, parent_strides, children) for each variable, where 'children'
+                    is a list of tuples (child, other_parents, other_strides, value_offsets); 'other_parents' and 'other_strides'
+                    describe the child's parents other than the variable and 'value_offsets' contains the offsets
+                    of the child's CPT rows that correspond to the values of the variable.
+
+        """
+        blankets = []
+        for i in xrange(self.model.number_of_variables):
+            children = []
+            for _,child in enumerate(self.model.children[i]):
+                child_parents = self.model.parents[child]
+                child_strides = self.model.parent_strides[child]
+                is_other_parent = child_parents != i
+                variable_stride = numpy.sum(child_strides[~is_other_parent])
+                value_offsets = variable_stride * numpy.arange(self.model.cardinalities[i])
+                children.append((child, child_parents[is_other_parent], child_strides[is_other_parent], value_offsets))
+            blankets.append((self.model.parents[i], self.model.parent_strides[i], children))
+        return blankets
+
+    def __create_blanket_tables(self):
+        """Tabulates the distribution of each variable given the assignments of its Markov blanket
+        for the variables whose tables have at most 'self.max_table_size' entries.
+
+        Returns:
+        blanket_tables -- A dictionary containing variable indices as keys and tuples (blanket_variables, blanket_strides,
+                          offset_cumulative_table) as values; the r-th row of the table, which corresponds to the blanket assignment
+                          whose dot product with 'blanket_strides' is r, contains the cumulative distribution of the variable shifted by r.
+
+        """
+        blanket_tables = dict()
+        for i in xrange(self.model.number_of_variables):
+            blanket_variables = set(self.model.parents[i])
+            for _,child in enumerate(self.model.children[i]):
+                blanket_variables.add(child)
+                blanket_variables.update(self.model.parents[child])
+            blanket_variables.discard(i)
+            blanket_variables = numpy.array(sorted(blanket_variables), dtype=int)
+
+            blanket_cardinalities = self.model.cardinalities[blanket_variables]
+            table_size = self.model.cardinalities[i]
+            for _,cardinality in enumerate(blanket_cardinalities):
+                table_size = table_size * int(cardinality)
+            if table_size > self.max_table_size:
+                continue
+
+            #the product of the CPTs of the variable and its children is proportional to the distribution of the variable given its blanket
+            factor = self.model.get_factor(i)
+            for _,child in enumerate(self.model.children[i]):
+                factor = factor.multiply(self.model.get_factor(child))
+            table = factor.aligned_table([self.model.variables[x] for x in blanket_variables] + [self.model.variables[i]])
+            rows = table.reshape(-1, self.model.cardinalities[i])
+
+            normalisers = numpy.sum(rows, axis=1)
+            normalisers[normalisers == 0.] = 1.
+            cumulative_rows = numpy.cumsum(rows / normalisers[:,numpy.newaxis], axis=1)
+            offset_cumulative_table = (cumulative_rows + numpy.arange(rows.shape[0])[:,numpy.newaxis]).ravel()
+
+            blanket_strides = numpy.ones(len(blanket_variables), dtype=int)
+            for j in xrange(len(blanket_variables)-2, -1, -1):
+                blanket_strides[j] = blanket_strides[j+1] * blanket_cardinalities[j+1]
+            blanket_tables[i] = (blanket_variables, blanket_strides, offset_cumulative_table)
+        return blanket_tables
+
+
+#the engine used by the worker processes is set once per process, such that it is not sent with every task
+_worker_engine = None
+
+def _initialise_worker(engine):
+    global _worker_engine
+    _worker_engine = engine
+
+def _run_chain_in_worker(arguments):
+    return _worker_engine._run_chain(*arguments)
@@ -0,0 +1,298 @@
+import numpy
+from factor import TableFactor
+from compiled_network import CompiledNetwork, compile_network
+from elimination_order import create_moral_graph, find_elimination_order, eliminate_variable
+
+class JunctionTreeEngine(object):
+    def __init__(self, network, elimination_heuristic='min_fill'):
+        """Defines an engine for performing exact inference in a discrete Bayesian network using a junction tree.
+        The network is moralised and triangulated and the junction tree is built only once,
+        such that repeated queries only need to calibrate the tree for new evidence.
+
+        Keyword arguments:
+        network -- A 'libpgm.discretebayesiannetwork.DiscreteBayesianNetwork' object representing a discrete Bayesian network
+                   or a 'CompiledNetwork' object created from such a network.
+        elimination_heuristic -- The heuristic used for finding the elimination order that triangulates the moral graph;
+                                 one of the names in 'elimination_order.heuristics' or a heuristic function (default 'min_fill').
+
+        """
+        self.network = network
+        if isinstance(network, CompiledNetwork):
+            self.model = network
+        else:
+            self.model = compile_network(network)
+
+        moral_graph = create_moral_graph(self.model)
+        self.cliques = self.__find_cliques(moral_graph, elimination_heuristic)
+        self.neighbours, self.separators = self.__create_tree()
+        self.clique_order, self.clique_parents = self.__find_message_order()
+
+        #the axes of each clique's table follow the sorted indices of the clique's variables;
+        #for each pair of adjacent cliques, we store the axes that are summed out when a message is created
+        #and the shape that aligns the message with the axes of the receiving clique
+        self.clique_variables = [sorted(x) for x in self.cliques]
+        self.summed_axes = dict()
+        self.message_shapes = dict()
+        for (source,target),separator in self.separators.iteritems():
+            self.summed_axes[(source,target)] = tuple([i for i,x in enumerate(self.clique_variables[source]) if x not in separator])
+            self.message_shapes[(source,target)] = [self.model.cardinalities[x] if x in separator else 1 for x in self.clique_variables[target]]
+
+        #each variable is assigned to the smallest clique that contains it;
+        #the marginals of the variable are calculated from the belief of that clique
+        self.variable_cliques = []
+        for i in xrange(self.model.number_of_variables):
+            containing_cliques = [x for x in xrange(len(self.cliques)) if i in self.cliques[x]]
+            self.variable_cliques.append(min(containing_cliques, key=lambda x: len(self.cliques[x])))
+
+        self.initial_potentials = self.__create_initial_potentials()
+
+        self.calibrated_evidence = None
+        self.clique_beliefs = None
+
+    def perform_inference(self, query_variable, evidence_variables):
+        """Calculates the probability distribution P(query_variable|evidence_variables).
+        The tree is only calibrated if the evidence differs from the evidence used in the previous calibration.
+
+        Keyword arguments:
+        query_variable -- The name of the query variable (as called in the network).
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+
+        Returns:
+        distribution -- A dictionary containing the values of the query variable as keys and the probabilities as values.
+
+        """
+        self.calibrate(evidence_variables)
+        return self.get_marginal(query_variable)
+
+    def get_marginals(self, evidence_variables, query_variables=None):
+        """Calculates the posterior distributions of multiple variables given the evidence.
+
+        Keyword arguments:
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+        query_variables -- A list of variable names (default None, resulting in all variables in the network).
+
+        Returns:
+        distributions -- A dictionary containing variable names as keys and distribution dictionaries as values.
+
+        """
+        if query_variables == None:
+            query_variables = self.model.variables
+
+        self.calibrate(evidence_variables)
+        distributions = dict()
+        for _,variable in enumerate(query_variables):
+            distributions[variable] = self.get_marginal(variable)
+        return distributions
+
+    def calibrate(self, evidence_variables):
+        """Calibrates the junction tree given the evidence by passing messages from the leaves
+        of the tree to its root and back. The calibration is skipped if the tree has already been calibrated with the same evidence.
+
+        Keyword arguments:
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+
+        """
+        evidence_key = frozenset(evidence_variables.items())
+        if evidence_key == self.calibrated_evidence:
+            return
+
+        #the evidence is entered by zeroing the entries of a clique's potential
+        #that are inconsistent with the observed value of the evidence variable
+        potentials = list(self.initial_potentials)
+        for variable,value in evidence_variables.iteritems():
+            variable_index = self.model.variable_indices[variable]
+            clique = self.variable_cliques[variable_index]
+            axis = self.clique_variables[clique].index(variable_index)
+
+            indicator_shape = [1] * potentials[clique].ndim
+            indicator_shape[axis] = self.model.cardinalities[variable_index]
+            indicator = numpy.zeros(indicator_shape)
+            indicator.flat[self.model.value_indices[variable_index][value]] = 1.
+            potentials[clique] = potentials[clique] * indicator
+
+        messages = dict()
+
+        #we pass messages from the leaves towards the root
+        for i in xrange(len(self.clique_order)-1, 0, -1):
+            clique = self.clique_order[i]
+            parent = self.clique_parents[clique]
+            messages[(clique,parent)] = self.__create_message(potentials, messages, clique, parent)
+
+        #we pass messages from the root towards the leaves
+        for i in xrange(1, len(self.clique_order)):
+            clique = self.clique_order[i]
+            parent = self.clique_parents[clique]
+            messages[(parent,clique)] = self.__create_message(potentials, messages, parent, clique)
+
+        self.clique_beliefs = []
+        for clique in xrange(len(self.cliques)):
+            belief = potentials[clique]
+            for _,neighbour in enumerate(self.neighbours[clique]):
+                belief = belief * messages[(neighbour,clique)]
+            self.clique_beliefs.append(belief)
+
+        self.calibrated_evidence = evidence_key
+
+    def get_marginal(self, variable):
+        """Returns the posterior distribution of a variable in the currently calibrated tree.
+
+        Keyword arguments:
+        variable -- The name of a variable in the network.
+
+        Returns:
+        distribution -- A dictionary containing the values of the variable as keys and the probabilities as values.
+
+        """
+        variable_index = self.model.variable_indices[variable]
+        clique = self.variable_cliques[variable_index]
+
+        #we sum out all other variables in the clique
+        other_axes = tuple([i for i,x in enumerate(self.clique_variables[clique]) if x != variable_index])
+        probabilities = numpy.sum(self.clique_beliefs[clique], axis=other_axes)
+        probabilities = probabilities / numpy.sum(probabilities)
+
+        distribution = dict()
+        for i,value in enumerate(self.model.values[variable_index]):
+            distribution[value] = probabilities[i]
+        return distribution
+
+    def __find_cliques(self, moral_graph, elimination_heuristic):
+        """Triangulates the moral graph by eliminating the variables in an order found by the given heuristic
+        and collects the maximal cliques created in the elimination process.
+
+        Keyword arguments:
+        moral_graph -- A list of sets returned by 'elimination_order.create_moral_graph'.
+        elimination_heuristic -- The heuristic used for finding the elimination order.
+
+        Returns:
+        cliques -- A list of sets of variable indices.
+
+        """
+        elimination_order = find_elimination_order(moral_graph, xrange(self.model.number_of_variables), self.model.cardinalities, elimination_heuristic)
+        graph = [set(x) for x in moral_graph]
+        cliques = []
+        for _,variable in enumerate(elimination_order):
+            clique = eliminate_variable(graph, variable)
+
+            is_maximal = True
+            for _,other_clique in enumerate(cliques):
+                if clique.issubset(other_clique):
+                    is_maximal = False
+                    break
+            if is_maximal:
+                cliques.append(clique)
+
+        return cliques
+
+    def __create_tree(self):
+        """Connects the cliques into a tree by finding a maximum spanning tree of the clique graph,
+        in which the weight of an edge is the number of variables shared by the cliques.
+
+        Returns:
+        neighbours -- A list of lists, such that 'neighbours[i]' contains the indices of the cliques adjacent to the i-th clique.
+        separators -- A dictionary containing pairs of clique indices as keys and lists of shared variable indices as values.
+
+        """
+        number_of_cliques = len(self.cliques)
+        candidate_edges = []
+        for i in xrange(number_of_cliques):
+            for j in xrange(i+1, number_of_cliques):
+                candidate_edges.append((len(self.cliques[i] & self.cliques[j]), i, j))
+        candidate_edges.sort(key=lambda x: -x[0])
+
+        #we use Kruskal's algorithm, keeping track of the connected components of the tree
+        components = range(number_of_cliques)
+        neighbours = [[] for _ in xrange(number_of_cliques)]
+        separators = dict()
+        for _,(_,i,j) in enumerate(candidate_edges):
+            component_i = components[i]
+            component_j = components[j]
+            if component_i == component_j:
+                continue
+
+            for k in xrange(number_of_cliques):
+                if components[k] == component_j:
+                    components[k] = component_i
+
+            neighbours[i].append(j)
+            neighbours[j].append(i)
+            separator = sorted(self.cliques[i] & self.cliques[j])
+            separators[(i,j)] = separator
+            separators[(j,i)] = separator
+
+        return neighbours, separators
+
+    def __find_message_order(self):
+        """Finds an order in which the cliques are visited in a breadth-first traversal from the root of the tree.
+
+        Returns:
+        clique_order -- A list of clique indices, starting with the root of the tree.
+        clique_parents -- A list containing the index of each clique's parent in the tree (-1 for the root).
+
+        """
+        clique_order = [0]
+        clique_parents = [-1] * len(self.cliques)
+        visited = set([0])
+        i = 0
+        while i < len(clique_order):
+            clique = clique_order[i]
+            for _,neighbour in enumerate(self.neighbours[clique]):
+                if neighbour not in visited:
+                    visited.add(neighbour)
+                    clique_parents[neighbour] = clique
+                    clique_order.append(neighbour)
+            i = i + 1
+        return clique_order, clique_parents
+
+    def __create_initial_potentials(self):
+        """Assigns each CPT to a clique that contains the CPT's variables and multiplies the CPTs assigned to each clique.
+
+        Returns:
+        potentials -- A list of 'numpy.array' objects, one per clique.
+
+        """
+        potentials = []
+        for _,clique_variables in enumerate(self.clique_variables):
+            potentials.append(TableFactor([self.model.variables[x] for x in clique_variables],
+                                          [self.model.values[x] for x in clique_variables],
+                                          numpy.ones(self.model.cardinalities[clique_variables]),
+                                          [self.model.value_indices[x] for x in clique_variables]))
+
+        for i in xrange(self.model.number_of_variables):
+            family = set(self.model.parents[i])
+            family.add(i)
+            for j,clique in enumerate(self.cliques):
+                if family.issubset(clique):
+                    potentials[j] = potentials[j].multiply(self.model.get_factor(i))
+                    break
+
+        for i,clique_variables in enumerate(self.clique_variables):
+            potentials[i] = potentials[i].aligned_table([self.model.variables[x] for x in clique_variables])
+        return potentials
+
+    def __create_message(self, potentials, messages, source, target):
+        """Creates the message sent from one clique to an adjacent clique.
+
+        Keyword arguments:
+        potentials -- A list of clique potentials.
+        messages -- A dictionary containing pairs of (source,target) clique indices as keys and messages as values.
+        source -- Index of the clique that sends the message.
+        target -- Index of the clique that receives the message.
+
+        Returns:
+        message -- A normalised 'numpy.array' over the separator of the two cliques,
+                   shaped such that it can be broadcast against the table of the receiving clique.
+
+        """
+        message = potentials[source]
+        for _,neighbour in enumerate(self.neighbours[source]):
+            if neighbour != target:
+                message = message * messages[(neighbour,source)]
+
+        message = numpy.sum(message, axis=self.summed_axes[(source,target)]).reshape(self.message_shapes[(source,target)])
+
+        #the messages are normalised to prevent underflow in large trees
+        normaliser = numpy.sum(message)
+        if normaliser > 0.:
+            message = message / normaliser
+        return message
@@ -0,0 +1,44 @@
+import numpy
+
+def log_probabilities(probabilities):
+    """Returns the natural logarithms of the given probabilities; zero probabilities are mapped to minus infinity without a warning."""
+    with numpy.errstate(divide='ignore'):
+        return numpy.log(probabilities)
+
+def logsumexp(log_values, axis=None):
+    """Calculates log(sum(exp(log_values))) without underflow by shifting the values by their maximum before exponentiating.
+
+    Keyword arguments:
+    log_values -- A 'numpy.array' of logarithms.
+    axis -- An axis or a tuple of axes along which the sum is calculated (default None, resulting in all axes).
+
+    Returns:
+    log_sum -- The logarithm of the sum (a float if 'axis' is None and a 'numpy.array' otherwise);
+               the logarithm of a sum of zeros is minus infinity.
+
+    """
+    log_values = numpy.asarray(log_values, dtype=float)
+    if log_values.size == 0:
+        return log_probabilities(numpy.sum(log_values, axis=axis))
+
+    #if all values along an axis are minus infinity, the shift is set to zero, such that the result is minus infinity rather than NaN
+    shifts = numpy.max(log_values, axis=axis, keepdims=True)
+    shifts = numpy.where(numpy.isfinite(shifts), shifts, 0.)
+    log_sums = log_probabilities(numpy.sum(numpy.exp(log_values - shifts), axis=axis, keepdims=True)) + shifts
+
+    if axis == None:
+        return float(log_sums.ravel()[0])
+    return numpy.squeeze(log_sums, axis=axis)
+
+def normalise_log_values(log_values):
+    """Converts unnormalised log-probabilities into probabilities that sum up to one.
+
+    Keyword arguments:
+    log_values -- A 'numpy.array' of unnormalised log-probabilities.
+
+    Returns:
+    probabilities -- A 'numpy.array' of normalised probabilities with the shape of 'log_values'.
+
+    """
+    log_values = numpy.asarray(log_values, dtype=float)
+    return numpy.exp(log_values - logsumexp(log_values))
@@ -0,0 +1,170 @@
+from collections import OrderedDict
+from compiled_network import CompiledNetwork
+
+class NetworkPruner(object):
+    def __init__(self, model, create_engine=None, max_cached_engines=64):
+        """Defines a preprocessing stage that reduces a network to the part that is relevant for a query.
+
+        Keyword arguments:
+        model -- A 'CompiledNetwork' object.
+        create_engine -- A function that creates an inference engine from a pruned 'CompiledNetwork' object (default None);
+                         needed only if the pruner is used through 'get_engine'.
+        max_cached_engines -- The maximum number of engines for pruned subnetworks that are cached (default 64).
+
+        """
+        self.model = model
+        self.create_engine = create_engine
+        self.max_cached_engines = max_cached_engines
+
+        #the relevant variables only depend on which variables are queried and observed,
+        #so they are cached for each pair of (query variables, evidence variables)
+        self.relevant_variable_cache = dict()
+
+        #the engines are cached for each pair of (query variables, evidence variables) and the values of the evidence variables
+        #whose values are absorbed into the CPTs of the subnetwork; the least recently used engines are evicted first
+        self.engine_cache = OrderedDict()
+
+    def get_engine(self, query_variables, evidence_variables):
+        """Returns an inference engine for the minimal subnetwork that is needed for calculating
+        the distribution of the query variables given the evidence. Repeated queries with the same query and evidence variables
+        reuse the subnetwork and the engine as long as the observed values of the evidence parents in the subnetwork do not change,
+        such that only the evidence of the subnetwork has to be selected for each query.
+
+        Keyword arguments:
+        query_variables -- A list of names of query variables.
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+
+        Returns:
+        engine -- An engine created by 'create_engine' for the subnetwork.
+        evidence_variables -- A dictionary containing the evidence variables that remain in the subnetwork and their observed values.
+
+        """
+        relevant_variables = self.get_relevant_variables(query_variables, evidence_variables.keys())
+        absorbed_variables = self.__get_absorbed_variables(relevant_variables, evidence_variables)
+        cache_key = (frozenset(query_variables), frozenset(evidence_variables.keys()),
+                     tuple([(x, evidence_variables[x]) for x in absorbed_variables]))
+
+        if cache_key in self.engine_cache:
+            #we move the engine to the end of the dictionary, which contains the most recently used engines
+            engine = self.engine_cache.pop(cache_key)
+        else:
+            model,_ = self.prune(query_variables, evidence_variables)
+            engine = self.create_engine(model)
+            if len(self.engine_cache) >= self.max_cached_engines:
+                self.engine_cache.popitem(last=False)
+        self.engine_cache[cache_key] = engine
+
+        remaining_evidence = dict()
+        for _,variable in enumerate(relevant_variables):
+            variable_name = self.model.variables[variable]
+            if variable_name in evidence_variables:
+                remaining_evidence[variable_name] = evidence_variables[variable_name]
+        return engine, remaining_evidence
+
+    def prune(self, query_variables, evidence_variables):
+        """Creates the minimal subnetwork that is needed for calculating
+        the distribution of the query variables given the evidence.
+
+        Keyword arguments:
+        query_variables -- A list of names of query variables.
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+
+        Returns:
+        model -- A 'CompiledNetwork' object in which the observed values of the evidence variables
+                 have been absorbed into the CPTs of their children.
+        evidence_variables -- A dictionary containing the evidence variables that remain in the subnetwork and their observed values.
+
+        """
+        relevant_variables = self.get_relevant_variables(query_variables, evidence_variables.keys())
+        evidence = self.model.encode_evidence(evidence_variables)
+
+        variables = []
+        values = []
+        parents = []
+        cpts = []
+        new_indices = dict((variable,i) for i,variable in enumerate(relevant_variables))
+        for _,variable in enumerate(relevant_variables):
+            #we slice the CPT at the observed values of the evidence parents
+            #and remove the edges from the evidence parents to the variable
+            cpt_index = []
+            variable_parents = []
+            for _,parent in enumerate(self.model.parents[variable]):
+                if parent in evidence:
+                    cpt_index.append(evidence[parent])
+                else:
+                    cpt_index.append(slice(None))
+                    variable_parents.append(new_indices[parent])
+            cpt_index.append(slice(None))
+
+            variables.append(self.model.variables[variable])
+            values.append(self.model.values[variable])
+            parents.append(variable_parents)
+            cpts.append(self.model.cpts[variable][tuple(cpt_index)])
+
+        remaining_evidence = dict()
+        for _,variable in enumerate(variables):
+            if variable in evidence_variables:
+                remaining_evidence[variable] = evidence_variables[variable]
+
+        return CompiledNetwork(variables, values, parents, cpts), remaining_evidence
+
+    def get_relevant_variables(self, query_variables, evidence_variables):
+        """Finds the variables that are relevant for calculating the distribution of the query variables given the evidence.
+        Barren variables (variables that are not ancestors of a query or evidence variable) are removed first.
+        The edges from the evidence variables to their children are then removed and only the variables that are
+        still connected to a query variable are kept; all other variables are d-separated from the query variables.
+        Evidence variables without unobserved parents are removed as well, since they only contribute a constant factor.
+
+        Keyword arguments:
+        query_variables -- A list of names of query variables.
+        evidence_variables -- A list of names of evidence variables.
+
+        Returns:
+        relevant_variables -- A sorted list of indices of the relevant variables.
+
+        """
+        cache_key = (frozenset(query_variables), frozenset(evidence_variables))
+        if cache_key in self.relevant_variable_cache:
+            return self.relevant_variable_cache[cache_key]
+
+        query = set([self.model.variable_indices[x] for x in query_variables])
+        evidence = set([self.model.variable_indices[x] for x in evidence_variables])
+
+        #we find the ancestors of the query and evidence variables
+        ancestors = set(query | evidence)
+        variables_to_visit = list(ancestors)
+        while len(variables_to_visit) > 0:
+            variable = variables_to_visit.pop()
+            for _,parent in enumerate(self.model.parents[variable]):
+                if parent not in ancestors:
+                    ancestors.add(parent)
+                    variables_to_visit.append(parent)
+
+        #we look for the variables connected to the query variables in the graph that contains only the
+        #ancestors and in which the evidence variables are only connected to their parents
+        relevant_variables = set(query)
+        variables_to_visit = list(query)
+        while len(variables_to_visit) > 0:
+            variable = variables_to_visit.pop()
+            neighbours = [x for x in self.model.parents[variable] if x not in evidence]
+            if variable not in evidence:
+                neighbours = neighbours + [x for x in self.model.children[variable] if x in ancestors]
+
+            for _,neighbour in enumerate(neighbours):
+                if neighbour not in relevant_variables:
+                    relevant_variables.add(neighbour)
+                    variables_to_visit.append(neighbour)
+
+        relevant_variables = sorted(relevant_variables)
+        self.relevant_variable_cache[cache_key] = relevant_variables
+        return relevant_variables
+
+    def __get_absorbed_variables(self, relevant_variables, evidence_variables):
+        """Returns a sorted list of names of the evidence variables whose observed values are absorbed into the CPTs of the subnetwork,
+        i.e. of the evidence variables that are parents of relevant variables."""
+        absorbed_variables = set()
+        for _,variable in enumerate(relevant_variables):
+            for _,parent in enumerate(self.model.parents[variable]):
+                if self.model.variables[parent] in evidence_variables:
+                    absorbed_variables.add(self.model.variables[parent])
+        return sorted(absorbed_variables)
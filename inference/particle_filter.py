@@ -0,0 +1,125 @@
+import numpy
+from compiled_network import CompiledDbn, compile_dbn
+from random_streams import create_random_states
+
+class ParticleFilter(object):
+    def __init__(self, network, number_of_particles=1000, resampling_threshold=0.5, seed=None):
+        """Defines an engine for approximate filtering in a discrete dynamic Bayesian network whose joint state space
+        is too large to be enumerated. The belief is represented by weighted particles, i.e. joint assignments of the variables,
+        which are propagated through the 2-TBN and weighted by the likelihood of the evidence at each time step,
+        such that the cost of an update depends on the number of particles rather than on the size of the state space.
+
+        Keyword arguments:
+        network -- A 'libpgm.dyndiscbayesiannetwork.DynDiscBayesianNetwork' object or a 'CompiledDbn' object.
+        number_of_particles -- The number of particles (default 1000).
+        resampling_threshold -- The particles are resampled once the effective sample size drops
+                                below this fraction of the number of particles (default 0.5).
+        seed -- An integer seed for the random number generator (default None).
+
+        """
+        self.model = network if isinstance(network, CompiledDbn) else compile_dbn(network)
+        self.number_of_particles = number_of_particles
+        self.resampling_threshold = resampling_threshold
+        self.random_state = create_random_states(seed, 1)[0]
+
+        #the particles of the previous and the current time step are stored in a single array of shape
+        #(2 * number_of_variables, number_of_particles), whose rows are ordered like the variables of the transition model
+        number_of_variables = self.model.number_of_variables
+        self.particle_buffer = numpy.zeros((2*number_of_variables, number_of_particles), dtype=int)
+        self.particles = self.particle_buffer[number_of_variables:]
+        self.weights = numpy.ones(number_of_particles) / number_of_particles
+        self.time_step = 0
+
+    def reset(self):
+        """Discards the particles, such that the next update starts from the initial distribution."""
+        self.weights[:] = 1. / self.number_of_particles
+        self.time_step = 0
+
+    def filter(self, evidence_variables):
+        """Performs a filtering update given the evidence observed at the next time step.
+        If the total weight of the particles is zero, i.e. none of them is consistent with the evidence,
+        the weights are reset to uniform weights.
+
+        Keyword arguments:
+        evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+
+        """
+        evidence = self.model.encode_evidence(evidence_variables)
+        number_of_variables = self.model.number_of_variables
+        if self.time_step == 0:
+            likelihoods = self.__propagate_particles(self.model.initial_model, self.particles, 0, evidence)
+        else:
+            self.particle_buffer[:number_of_variables] = self.particles
+            likelihoods = self.__propagate_particles(self.model.transition_model, self.particle_buffer, number_of_variables, evidence)
+        self.time_step = self.time_step + 1
+
+        weights = self.weights * likelihoods
+        normaliser = numpy.sum(weights)
+        if normaliser > 0.:
+            self.weights = weights / normaliser
+        else:
+            self.weights[:] = 1. / self.number_of_particles
+
+        if self.get_effective_sample_size() < self.resampling_threshold * self.number_of_particles:
+            self.__resample_particles()
+
+    def get_belief(self, variable):
+        """Returns the estimated distribution of a variable at the current time step.
+
+        Keyword arguments:
+        variable -- Name of a variable.
+
+        Returns:
+        belief -- A dictionary containing the values of the variable as keys and their probabilities as values.
+
+        """
+        variable_index = self.model.variable_indices[variable]
+        probabilities = numpy.bincount(self.particles[variable_index], weights=self.weights, minlength=self.model.cardinalities[variable_index])
+
+        belief = dict()
+        for i,value in enumerate(self.model.values[variable_index]):
+            belief[value] = probabilities[i]
+        return belief
+
+    def get_effective_sample_size(self):
+        """Returns the effective sample size of the weighted particles, which is equal to the number of particles
+        if the weights are uniform and to one if a single particle has all the weight."""
+        return 1. / numpy.sum(self.weights**2)
+
+    def __propagate_particles(self, model, assignments, first_variable, evidence):
+        """Samples the values of the current time step for all particles at once, going through the variables in topological order.
+        The values of the evidence variables are fixed and their likelihoods are returned instead.
+
+        Keyword arguments:
+        model -- The 'CompiledNetwork' object used for sampling.
+        assignments -- An integer 'numpy.array' whose rows correspond to the variables of the model.
+        first_variable -- Index of the first variable of the current time step in the model.
+        evidence -- A dictionary containing variable indices (within a time step) as keys and value indices as values.
+
+        Returns:
+        likelihoods -- A 'numpy.array' containing the likelihood of the evidence for each particle.
+
+        """
+        likelihoods = numpy.ones(self.number_of_particles)
+        for i in xrange(first_variable, model.number_of_variables):
+            row_indices = numpy.dot(model.parent_strides[i], assignments[model.parents[i]])
+            if i - first_variable in evidence:
+                value_index = evidence[i - first_variable]
+                assignments[i] = value_index
+                likelihoods = likelihoods * model.cpt_rows[i][row_indices, value_index]
+            else:
+                number_of_values = model.cardinalities[i]
+                random_numbers = self.random_state.rand(self.number_of_particles) + row_indices
+                value_indices = numpy.searchsorted(model.offset_cumulative_cpts[i], random_numbers, side='right') - row_indices * number_of_values
+                assignments[i] = numpy.minimum(value_indices, number_of_values-1)
+        return likelihoods
+
+    def __resample_particles(self):
+        """Replaces the particles by an equally weighted sample using systematic resampling,
+        which draws a single random number and selects the particles at evenly spaced points of the cumulative weights."""
+        positions = (self.random_state.rand() + numpy.arange(self.number_of_particles)) / self.number_of_particles
+        particle_indices = numpy.searchsorted(numpy.cumsum(self.weights), positions, side='right')
+        particle_indices = numpy.minimum(particle_indices, self.number_of_particles-1)
+
+        self.particles[:] = self.particles[:,particle_indices]
+        self.weights[:] = 1. / self.number_of_particles
@@ -0,0 +1,279 @@
+import inspect
+from collections import OrderedDict
+from exact_inference import ExactInferenceEngine
+from junction_tree import JunctionTreeEngine
+
+class PosteriorCache(object):
+    def __init__(self, engine_class, network, max_size=1024, track_network_changes=False, **engine_arguments):
+        """Defines a memoization layer around an inference engine. The results of the engine's 'perform_*' methods
+        are cached using the method's arguments as keys, after matching them against the method's signature, such that
+        the same query gives the same key whether the arguments are passed by position or by name or are left at their defaults.
+        The least recently used results are evicted once the cache is full.
+
+        Only deterministic results are cached: results of engines other than 'ExactInferenceEngine' and 'JunctionTreeEngine'
+        are only cached if the method takes a 'seed' argument and a seed is given, otherwise the engine is called every time.
+
+        The engine works on the network data as they were when it was created. If the network's 'Vdata' is replaced,
+        the cache is cleared and the engine is recreated with the new data at the next call. Modifications of the data
+        in place are not detected unless 'track_network_changes' is True, so 'invalidate' has to be called after them.
+        NOTE: with 'track_network_changes', the cache REPLACES the network's 'Vdata' and the dictionaries and lists in it
+        by subclasses that count their modifications, i.e. it changes the caller's network object.
+
+        The cached results are shared between callers and should not be modified.
+
+        Keyword arguments:
+        engine_class -- The class of the wrapped engine (e.g. 'ExactInferenceEngine').
+        network -- A network object that is passed to the constructor of the engine.
+        max_size -- The maximum number of cached results (default 1024).
+        track_network_changes -- If True, modifications of the network's 'Vdata' in place are detected automatically
+                               by replacing the data with tracked containers as described above (default False).
+        engine_arguments -- Additional keyword arguments passed to the constructor of the engine.
+
+        """
+        self.engine_class = engine_class
+        self.network = network
+        self.max_size = max_size
+        self.track_network_changes = track_network_changes
+        self.engine_arguments = engine_arguments
+
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.uncached_calls = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        #if modifications are tracked, the network data is replaced by containers that count their modifications,
+        #such that changes can be detected without comparing the whole data at each lookup
+        self.modification_counter = ModificationCounter()
+        self.tracked_vdata = None
+        self.tracked_version = None
+        self.__track_network_data()
+        self.engine = self.engine_class(self.network, **self.engine_arguments)
+
+    def __getattr__(self, name):
+        """Returns a cached version of the engine's 'perform_*' methods; other attributes are taken from the engine directly."""
+        if name == 'engine':
+            raise AttributeError(name)
+        if not name.startswith('perform_'):
+            return getattr(self.engine, name)
+
+        def cached_method(*args, **kwargs):
+            return self.perform_cached_inference(name, *args, **kwargs)
+        return cached_method
+
+    def perform_cached_inference(self, method_name, *args, **kwargs):
+        """Returns the result of one of the engine's inference methods, calling the engine only if the result is not cached.
+
+        Keyword arguments:
+        method_name -- Name of the engine's method (e.g. 'perform_ve_inference').
+        args -- The positional arguments of the method, e.g. the query variables and the evidence variables.
+        kwargs -- The keyword arguments of the method.
+
+        Returns:
+        result -- The result returned by the engine's method.
+
+        """
+        self.__check_network_data()
+
+        method = getattr(self.engine, method_name)
+        arguments = inspect.getcallargs(method, *args, **kwargs)
+        del arguments['self']
+        if not self.__is_deterministic(arguments):
+            self.uncached_calls = self.uncached_calls + 1
+            return method(*args, **kwargs)
+
+        key = (method_name, self.__make_hashable(arguments))
+        if key in self.results:
+            self.hits = self.hits + 1
+
+            #we move the result to the end of the dictionary, which contains the most recently used results
+            result = self.results.pop(key)
+            self.results[key] = result
+            return result
+
+        self.misses = self.misses + 1
+        result = method(*args, **kwargs)
+        self.results[key] = result
+        if len(self.results) > self.max_size:
+            self.results.popitem(last=False)
+            self.evictions = self.evictions + 1
+        return result
+
+    def clear(self):
+        """Removes all cached results."""
+        self.results.clear()
+
+    def invalidate(self):
+        """Clears the cache and recreates the engine with the current network data; needed after modifying the data in place
+        unless modifications are tracked."""
+        self.__track_network_data()
+        self.engine = self.engine_class(self.network, **self.engine_arguments)
+        self.clear()
+        self.invalidations = self.invalidations + 1
+
+    def get_statistics(self):
+        """Returns a dictionary containing the number of cache hits, misses, uncached calls of non-deterministic methods,
+        evictions and invalidations and the current cache size."""
+        return {'hits': self.hits, 'misses': self.misses, 'uncached_calls': self.uncached_calls, 'evictions': self.evictions,
+                'invalidations': self.invalidations, 'size': len(self.results)}
+
+    def __is_deterministic(self, arguments):
+        """Checks whether a method called with the given arguments (a dictionary of argument names and values) always returns the same result."""
+        if 'seed' in arguments:
+            return arguments['seed'] != None
+        return isinstance(self.engine, (ExactInferenceEngine, JunctionTreeEngine))
+
+    def __check_network_data(self):
+        """Clears the cache and recreates the engine if the network data have been replaced
+        or, if modifications are tracked, modified since the last check."""
+        if self.tracked_vdata == None:
+            return
+
+        if self.network.Vdata is not self.tracked_vdata or self.modification_counter.version != self.tracked_version:
+            self.invalidate()
+
+    def __track_network_data(self):
+        if not hasattr(self.network, 'Vdata'):
+            return
+
+        if self.track_network_changes and self.network.Vdata is not self.tracked_vdata:
+            self.network.Vdata = track_modifications(self.network.Vdata, self.modification_counter)
+        self.tracked_vdata = self.network.Vdata
+        self.tracked_version = self.modification_counter.version
+
+    def __make_hashable(self, value):
+        if isinstance(value, (list, tuple)):
+            return tuple([self.__make_hashable(x) for x in value])
+        if isinstance(value, dict):
+            return tuple(sorted([(k, self.__make_hashable(v)) for k,v in value.items()]))
+        return value
+
+
+class ModificationCounter(object):
+    def __init__(self):
+        self.version = 0
+
+    def increment(self):
+        self.version = self.version + 1
+
+
+class TrackedDict(dict):
+    """A dictionary that increments a 'ModificationCounter' whenever it is modified."""
+
+    def __init__(self, data, counter):
+        dict.__init__(self)
+        self.counter = counter
+        for key,value in data.iteritems():
+            dict.__setitem__(self, key, track_modifications(value, counter))
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, track_modifications(value, self.counter))
+        self.counter.increment()
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.counter.increment()
+
+    def update(self, *args, **kwargs):
+        for key,value in dict(*args, **kwargs).iteritems():
+            dict.__setitem__(self, key, track_modifications(value, self.counter))
+        self.counter.increment()
+
+    def setdefault(self, key, value=None):
+        if key not in self:
+            self[key] = value
+        return dict.__getitem__(self, key)
+
+    def pop(self, *args):
+        self.counter.increment()
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self.counter.increment()
+        return dict.popitem(self)
+
+    def clear(self):
+        self.counter.increment()
+        dict.clear(self)
+
+
+class TrackedList(list):
+    """A list that increments a 'ModificationCounter' whenever it is modified."""
+
+    def __init__(self, data, counter):
+        list.__init__(self, [track_modifications(x, counter) for x in data])
+        self.counter = counter
+
+    def __setitem__(self, index, value):
+        list.__setitem__(self, index, track_modifications(value, self.counter))
+        self.counter.increment()
+
+    def __setslice__(self, i, j, values):
+        list.__setslice__(self, i, j, [track_modifications(x, self.counter) for x in values])
+        self.counter.increment()
+
+    def __delitem__(self, index):
+        list.__delitem__(self, index)
+        self.counter.increment()
+
+    def __delslice__(self, i, j):
+        list.__delslice__(self, i, j)
+        self.counter.increment()
+
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+
+    def __imul__(self, n):
+        list.__imul__(self, n)
+        self.counter.increment()
+        return self
+
+    def append(self, value):
+        list.append(self, track_modifications(value, self.counter))
+        self.counter.increment()
+
+    def extend(self, values):
+        list.extend(self, [track_modifications(x, self.counter) for x in values])
+        self.counter.increment()
+
+    def insert(self, index, value):
+        list.insert(self, index, track_modifications(value, self.counter))
+        self.counter.increment()
+
+    def pop(self, *args):
+        self.counter.increment()
+        return list.pop(self, *args)
+
+    def remove(self, value):
+        list.remove(self, value)
+        self.counter.increment()
+
+    def reverse(self):
+        list.reverse(self)
+        self.counter.increment()
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self.counter.increment()
+
+
+def track_modifications(value, counter):
+    """Recursively replaces the dictionaries and lists in 'value' by containers that report their modifications to 'counter'.
+
+    Keyword arguments:
+    value -- An object that should be tracked.
+    counter -- A 'ModificationCounter' object.
+
+    Returns:
+    tracked_value -- The tracked version of 'value'; objects other than dictionaries and lists are returned without changes.
+
+    """
+    if isinstance(value, (TrackedDict, TrackedList)) and value.counter is counter:
+        return value
+    if isinstance(value, dict):
+        return TrackedDict(value, counter)
+    if isinstance(value, list):
+        return TrackedList(value, counter)
+    return value
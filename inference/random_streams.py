@@ -0,0 +1,20 @@
+import numpy
+
+def create_random_states(seed, number_of_streams):
+    """Creates independent random number generators, e.g. one per Markov chain.
+    The seeds of the generators are drawn from a generator initialised with 'seed',
+    such that the streams are reproducible for a given seed.
+
+    Keyword arguments:
+    seed -- An integer seed or None, in which case the seeds are drawn from the global 'numpy.random' generator.
+    number_of_streams -- The number of generators that should be created.
+
+    Returns:
+    random_states -- A list of 'numpy.random.RandomState' objects.
+
+    """
+    if seed == None:
+        seeds = numpy.random.randint(0, 2**31-1, number_of_streams)
+    else:
+        seeds = numpy.random.RandomState(seed).randint(0, 2**31-1, number_of_streams)
+    return [numpy.random.RandomState(x) for x in seeds]
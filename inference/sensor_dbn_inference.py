@@ -1,49 +1,486 @@
 import numpy
+import collections
+from compiled_network import CompiledSensorDbn, compile_sensor_dbn
+from log_space import log_probabilities
 
 class SensorDbnInference(object):
-    def __init__(self, network):
+    def __init__(self, network, initial_belief=None):
         """Defines an engine for performing inference in a dynamic Bayesian network representing sensor states and measurements.
+        The network is compiled once and is not modified; the engine only stores a current belief, which is used by the methods
+        that are called without a belief. Since a compiled network can be shared, a separate engine (or an explicitly
+        passed belief) can be used for each of many concurrent sessions.
 
         Keyword arguments:
-        network -- A 'libpgm.dyndiscbayesiannetwork.DynDiscBayesianNetwork' object representing a dynamic Bayesian network.
+        network -- A 'libpgm.dyndiscbayesiannetwork.DynDiscBayesianNetwork' object representing a dynamic Bayesian network
+                   or a 'CompiledSensorDbn' object created from such a network.
+        initial_belief -- A 'numpy.array' containing the current belief (default None, resulting in the initial belief of the network).
 
         """
-        self.network = network
-        self.network.toporder()
+        #we compile the 2-TBN once into a transition matrix and a measurement matrix,
+        #such that each filtering update is a matrix-vector product followed by an elementwise product
+        if isinstance(network, CompiledSensorDbn):
+            self.model = network
+        else:
+            self.model = compile_sensor_dbn(network)
+
+        if initial_belief is None:
+            initial_belief = self.model.initial_belief
+        self.belief = numpy.array(initial_belief, dtype=float)
 
     def get_current_belief(self):
+        """Returns a dictionary containing the states as keys and their probabilities under the current belief as values."""
         belief = dict()
-        for i,state in enumerate(self.network.initial_Vdata['state']['vals']):
-            belief[state] = self.network.initial_Vdata['state']['cprob'][i]
+        for i,state in enumerate(self.model.state_values):
+            belief[state] = self.belief[i]
         return belief
 
-    def filter(self, measurement):
+    def get_belief(self):
+        """Returns a copy of the current belief, which can be stored and later restored using 'set_belief'."""
+        return self.belief.copy()
+
+    def set_belief(self, belief):
+        """Replaces the current belief by a copy of the given 'numpy.array'."""
+        self.belief = numpy.array(belief, dtype=float)
+
+    def reset(self):
+        """Resets the current belief to the initial belief of the network."""
+        self.belief = self.model.initial_belief.copy()
+
+    def filter(self, measurement, belief=None):
         """Performs a filtering update given a measurement.
 
         Keyword arguments:
         measurement -- Value describing an observed measurement.
+        belief -- A 'numpy.array' containing the belief before the measurement, which is not modified
+                  (default None, in which case the current belief is used and replaced by the updated belief).
+
+        Returns:
+        belief -- A new 'numpy.array' containing the updated belief.
+
+        """
+        measurement_index = self.model.measurement_indices[str(measurement)]
+        updated_belief = self.model.prediction_matrix.dot(self.__get_belief(belief)) * self.model.measurement_likelihoods[measurement_index]
+        updated_belief = updated_belief / numpy.sum(updated_belief)
+        if belief is None:
+            self.belief = updated_belief
+        return updated_belief
+
+    def filter_sequence(self, measurements, out=None, belief=None):
+        """Performs a filtering update for each measurement in a sequence.
+
+        Keyword arguments:
+        measurements -- A sequence of measurement values.
+        out -- A 'numpy.array' of shape (number_of_measurements, number_of_states) in which
+               the beliefs are stored (default None, in which case a new array is created).
+        belief -- A 'numpy.array' containing the belief before the first measurement, which is not modified
+                  (default None, in which case the current belief is used and replaced by the belief after the last measurement).
+
+        Returns:
+        beliefs -- A 'numpy.array' of shape (number_of_measurements, number_of_states),
+                   whose t-th row is the belief after the t-th measurement.
+
+        """
+        measurement_indices = self.model.encode_measurements(measurements)
+        if out is None:
+            out = numpy.zeros((len(measurement_indices), self.model.number_of_states))
+
+        filter_measurements(self.model, self.__get_belief(belief), measurement_indices, out)
+        if belief is None and len(out) > 0:
+            self.belief = out[-1].copy()
+        return out
+
+    def smooth(self, measurements, out=None, belief=None):
+        """Calculates the smoothed beliefs, i.e. the distributions of the states given all measurements of a sequence,
+        using the forward-backward algorithm, starting from the current belief. The forward messages are the normalised
+        filtered beliefs and the backward messages are scaled by the normalisers of the forward pass, such that
+        the product of the messages at each step is already normalised and long sequences do not underflow.
+        The filtered beliefs are stored in the output array and are replaced by the smoothed beliefs in the backward pass,
+        so apart from the output, only one normaliser per measurement is stored. The current belief is not changed.
+
+        Keyword arguments:
+        measurements -- A sequence of measurement values.
+        out -- A 'numpy.array' of shape (number_of_measurements, number_of_states) in which the smoothed beliefs are stored
+               (default None, in which case a new array is created); a 'numpy.memmap' can be used for very long sequences.
+        belief -- A 'numpy.array' containing the belief before the first measurement (default None, resulting in the current belief).
+
+        Returns:
+        beliefs -- A 'numpy.array' of shape (number_of_measurements, number_of_states), whose t-th row is
+                   the distribution of the state at the time of the t-th measurement given all measurements.
+
+        """
+        measurement_indices = self.model.encode_measurements(measurements)
+        if out is None:
+            out = numpy.zeros((len(measurement_indices), self.model.number_of_states))
+        normalisers = numpy.zeros(len(measurement_indices))
+
+        filter_measurements(self.model, self.__get_belief(belief), measurement_indices, out, normalisers)
+
+        backward_message = numpy.ones(self.model.number_of_states)
+        for t in xrange(len(measurement_indices)-1, -1, -1):
+            out[t] *= backward_message
+            backward_message = self.model.transition_probabilities.dot(self.model.measurement_likelihoods[measurement_indices[t]] * backward_message)
+            backward_message *= 1. / normalisers[t]
+        return out
+
+    def compute_log_likelihood(self, measurements, belief=None):
+        """Calculates the logarithm of the probability of a sequence of measurements. The probability is the product of
+        the normalisers of the filtering updates, so it is calculated as the sum of their logarithms, which does not
+        underflow for long sequences. The current belief is not changed.
+
+        Keyword arguments:
+        measurements -- A sequence of measurement values.
+        belief -- A 'numpy.array' containing the belief before the first measurement (default None, resulting in the current belief).
+
+        Returns:
+        log_likelihood -- The log-probability of the measurements (minus infinity if they are impossible).
+
+        """
+        measurement_indices = self.model.encode_measurements(measurements)
+        beliefs = numpy.zeros((len(measurement_indices), self.model.number_of_states))
+        normalisers = numpy.zeros(len(measurement_indices))
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            filter_measurements(self.model, self.__get_belief(belief), measurement_indices, beliefs, normalisers)
+
+        #after an impossible measurement, the beliefs and normalisers are not defined
+        if numpy.any(normalisers == 0.):
+            return -numpy.inf
+        return numpy.sum(log_probabilities(normalisers))
+
+    def decode(self, measurements, belief=None):
+        """Finds the most probable sequence of states given a sequence of measurements using the Viterbi algorithm,
+        starting from the current belief. The path probabilities are calculated in log space, so long sequences do not underflow.
+
+        Keyword arguments:
+        measurements -- A sequence of measurement values.
+        belief -- A 'numpy.array' containing the belief before the first measurement (default None, resulting in the current belief).
+
+        Returns:
+        states -- A 'numpy.array' containing the most probable state at the time of each measurement.
+        log_probability -- The logarithm of the joint probability of the most probable state sequence and the measurements.
+
+        """
+        measurement_indices = self.model.encode_measurements(measurements)
+        with numpy.errstate(divide='ignore'):
+            log_belief = numpy.log(self.__get_belief(belief))
+
+        #the back pointers are stored with the smallest integer type that can hold the state indices;
+        #'path_scores[j,i]' is the score of the best path that moves from the i-th state to the j-th state
+        back_pointers = numpy.zeros((len(measurement_indices), self.model.number_of_states), dtype=numpy.min_scalar_type(self.model.number_of_states))
+        state_indices = numpy.arange(self.model.number_of_states)
+        log_prediction_matrix = numpy.ascontiguousarray(self.model.log_transition_probabilities.T)
+        path_scores = numpy.zeros((self.model.number_of_states, self.model.number_of_states))
+        for t in xrange(len(measurement_indices)):
+            numpy.add(log_prediction_matrix, log_belief, out=path_scores)
+            best_previous_states = path_scores.argmax(axis=1)
+            back_pointers[t] = best_previous_states
+            log_belief = path_scores[state_indices, best_previous_states]
+            log_belief += self.model.log_measurement_likelihoods[measurement_indices[t]]
+
+        path = numpy.zeros(len(measurement_indices), dtype=int)
+        if len(path) == 0:
+            return numpy.array(self.model.state_values)[path], 0.
+
+        path[-1] = numpy.argmax(log_belief)
+        for t in xrange(len(path)-1, 0, -1):
+            path[t-1] = back_pointers[t,path[t]]
+        return numpy.array(self.model.state_values)[path], log_belief[path[-1]]
+
+    def __get_belief(self, belief):
+        """Returns the given belief as a 'numpy.array' or the current belief if 'belief' is None."""
+        if belief is None:
+            return self.belief
+        return numpy.asarray(belief, dtype=float)
+
+
+class MultiStreamSensorDbnInference(object):
+    def __init__(self, network, number_of_streams):
+        """Defines an engine for filtering many independent measurement streams (e.g. one per sensor) that share a sensor DBN.
+        The beliefs of all streams are stored in a single matrix and are updated together.
+
+        Keyword arguments:
+        network -- A 'libpgm.dyndiscbayesiannetwork.DynDiscBayesianNetwork' object representing a dynamic Bayesian network
+                   or a 'CompiledSensorDbn' object created from such a network; the network is not modified.
+        number_of_streams -- The number of measurement streams.
+
+        """
+        if isinstance(network, CompiledSensorDbn):
+            self.model = network
+        else:
+            self.model = compile_sensor_dbn(network)
+
+        self.number_of_streams = number_of_streams
+
+        #'beliefs[s]' is the belief of the s-th stream; the matrix is updated in place
+        self.beliefs = numpy.tile(self.model.initial_belief, (number_of_streams, 1))
+        self.predicted_beliefs = numpy.zeros(self.beliefs.shape)
+
+    def get_beliefs(self):
+        """Returns the matrix of beliefs of shape (number_of_streams, number_of_states). The matrix is not copied,
+        so it changes with the following updates and should not be modified."""
+        return self.beliefs
+
+    def get_belief(self, stream):
+        """Returns the belief of a stream as a view of a row of the belief matrix."""
+        return self.beliefs[stream]
+
+    def reset(self, streams=None):
+        """Resets the beliefs of the given streams (default None, resulting in all streams) to the initial belief."""
+        if streams is None:
+            self.beliefs[:] = self.model.initial_belief
+        else:
+            self.beliefs[streams] = self.model.initial_belief
+
+    def filter(self, measurements, streams=None):
+        """Performs a filtering update in multiple streams at once.
+
+        Keyword arguments:
+        measurements -- A sequence containing one measurement value per updated stream.
+        streams -- A list of indices of the streams that received the measurements
+                   (default None, in which case 'measurements' contains a measurement for each stream).
+
+        """
+        measurement_likelihoods = self.model.measurement_likelihoods[self.model.encode_measurements(measurements)]
+        if streams is None:
+            numpy.dot(self.beliefs, self.model.transition_probabilities, out=self.predicted_beliefs)
+            numpy.multiply(self.predicted_beliefs, measurement_likelihoods, out=self.beliefs)
+            self.beliefs /= numpy.sum(self.beliefs, axis=1)[:,numpy.newaxis]
+        else:
+            updated_beliefs = self.beliefs[streams].dot(self.model.transition_probabilities) * measurement_likelihoods
+            self.beliefs[streams] = updated_beliefs / numpy.sum(updated_beliefs, axis=1)[:,numpy.newaxis]
+
+
+class FixedLagSmoother(object):
+    def __init__(self, network, lag, initial_belief=None):
+        """Defines an online smoother for a sensor DBN, which estimates the state at each time
+        given the measurements up to 'lag' steps later. Only the last 'lag'+1 filtered beliefs
+        and measurements are stored, so the memory does not grow with the length of the sequence.
+
+        Keyword arguments:
+        network -- A 'libpgm.dyndiscbayesiannetwork.DynDiscBayesianNetwork' object representing a dynamic Bayesian network
+                   or a 'CompiledSensorDbn' object created from such a network; the network is not modified.
+        lag -- The number of measurements that are observed before the state at a given time is estimated.
+        initial_belief -- A 'numpy.array' containing the belief before the first measurement
+                          (default None, resulting in the initial belief of the network).
+
+        """
+        if isinstance(network, CompiledSensorDbn):
+            self.model = network
+        else:
+            self.model = compile_sensor_dbn(network)
+
+        if initial_belief is None:
+            initial_belief = self.model.initial_belief
+        self.lag = lag
+        self.belief = numpy.array(initial_belief, dtype=float)
+
+        #the filtered beliefs and measurements are stored in circular buffers;
+        #the values of the t-th measurement are stored at the index t % (lag+1)
+        self.filtered_beliefs = numpy.zeros((lag+1, self.model.number_of_states))
+        self.measurement_indices = numpy.zeros(lag+1, dtype=int)
+        self.number_of_measurements = 0
+
+    def update(self, measurement):
+        """Performs a filtering update given a measurement and smooths the belief from 'lag' measurements ago.
+
+        Keyword arguments:
+        measurement -- Value describing an observed measurement.
+
+        Returns:
+        smoothed_belief -- A 'numpy.array' containing the distribution of the state at the time of the measurement
+                           received 'lag' updates ago given all measurements so far; None if fewer than 'lag'+1 measurements were received.
+
+        """
+        measurement_index = self.model.measurement_indices[str(measurement)]
+        buffer_index = self.number_of_measurements % (self.lag + 1)
+        self.belief = self.model.prediction_matrix.dot(self.belief) * self.model.measurement_likelihoods[measurement_index]
+        self.belief = self.belief / numpy.sum(self.belief)
+        self.filtered_beliefs[buffer_index] = self.belief
+        self.measurement_indices[buffer_index] = measurement_index
+        self.number_of_measurements = self.number_of_measurements + 1
+
+        if self.number_of_measurements <= self.lag:
+            return None
+        return self.__smooth_buffered_beliefs(1)[0]
+
+    def flush(self):
+        """Returns the smoothed beliefs of the buffered measurements that have not been smoothed by 'update' yet,
+        i.e. of the last 'lag' measurements, given all measurements so far.
+
+        Returns:
+        smoothed_beliefs -- A 'numpy.array' of shape (number_of_buffered_measurements, number_of_states) in chronological order.
+
+        """
+        number_of_buffered_measurements = min(self.lag, self.number_of_measurements)
+        return self.__smooth_buffered_beliefs(number_of_buffered_measurements, 0)
+
+    def __smooth_buffered_beliefs(self, number_of_beliefs, first_lag=None):
+        """Passes a backward message from the latest measurement through the buffer and smooths the oldest buffered beliefs.
+
+        Keyword arguments:
+        number_of_beliefs -- The number of smoothed beliefs.
+        first_lag -- The lag of the newest smoothed belief (default None, resulting in 'self.lag').
+
+        Returns:
+        smoothed_beliefs -- A 'numpy.array' of shape (number_of_beliefs, number_of_states) in chronological order.
+
+        """
+        if first_lag == None:
+            first_lag = self.lag
+
+        smoothed_beliefs = numpy.zeros((number_of_beliefs, self.model.number_of_states))
+        newest_time = self.number_of_measurements - 1
+        oldest_time = newest_time - first_lag - number_of_beliefs + 1
+        backward_message = numpy.ones(self.model.number_of_states)
+        for t in xrange(newest_time, oldest_time-1, -1):
+            buffer_index = t % (self.lag + 1)
+            if t <= newest_time - first_lag:
+                smoothed_belief = self.filtered_beliefs[buffer_index] * backward_message
+                smoothed_beliefs[t - oldest_time] = smoothed_belief / numpy.sum(smoothed_belief)
+            backward_message = update_backward_message(self.model, backward_message, self.measurement_indices[buffer_index])
+        return smoothed_beliefs
+
+
+class StreamingViterbiDecoder(object):
+    def __init__(self, network, max_traceback=1000, initial_belief=None):
+        """Defines an online Viterbi decoder for a sensor DBN. The state at a given time is decided as soon as
+        the most probable paths ending in all possible current states agree on it, after which it can no longer change.
+        If no decision has been possible for 'max_traceback' measurements, the oldest undecided state is taken
+        from the currently most probable path, such that the memory used for the back pointers is bounded.
+
+        Keyword arguments:
+        network -- A 'libpgm.dyndiscbayesiannetwork.DynDiscBayesianNetwork' object representing a dynamic Bayesian network
+                   or a 'CompiledSensorDbn' object created from such a network; the network is not modified.
+        max_traceback -- The maximum number of undecided states (default 1000).
+        initial_belief -- A 'numpy.array' containing the belief before the first measurement
+                          (default None, resulting in the initial belief of the network).
 
         """
-        state_values = list(self.network.initial_Vdata['state']['vals'])
-        measurement_index = self.network.initial_Vdata['measurement']['vals'].index(str(measurement))
+        if isinstance(network, CompiledSensorDbn):
+            self.model = network
+        else:
+            self.model = compile_sensor_dbn(network)
+
+        if initial_belief is None:
+            initial_belief = self.model.initial_belief
+        with numpy.errstate(divide='ignore'):
+            self.log_belief = numpy.log(numpy.array(initial_belief, dtype=float))
+
+        self.max_traceback = max_traceback
+        self.state_indices = numpy.arange(self.model.number_of_states)
+
+        #'back_pointers' contains the back pointers of the undecided states except for the oldest one,
+        #since the back pointers of the oldest undecided state point to states that have already been decided
+        self.back_pointers = collections.deque()
+        self.number_of_undecided_states = 0
+
+    def update(self, measurement):
+        """Extends the paths with a measurement and returns the states that have been decided in the process.
+
+        Keyword arguments:
+        measurement -- Value describing an observed measurement.
+
+        Returns:
+        decided_states -- A list of the newly decided states in chronological order (possibly empty).
+
+        """
+        measurement_index = self.model.measurement_indices[str(measurement)]
+        path_scores = self.log_belief[:,numpy.newaxis] + self.model.log_transition_probabilities
+        best_previous_states = numpy.argmax(path_scores, axis=0)
+        self.log_belief = path_scores[best_previous_states, self.state_indices] + self.model.log_measurement_likelihoods[measurement_index]
+
+        if self.number_of_undecided_states > 0:
+            self.back_pointers.append(best_previous_states)
+        self.number_of_undecided_states = self.number_of_undecided_states + 1
+
+        #we follow the paths of all states that can still be reached back in time until they merge
+        current_states = numpy.flatnonzero(self.log_belief > -numpy.inf)
+        if len(current_states) == 0:
+            current_states = self.state_indices
+
+        states = current_states
+        number_of_decided_states = 0
+        if numpy.all(states == states[0]):
+            number_of_decided_states = self.number_of_undecided_states
+        else:
+            for i in xrange(len(self.back_pointers)-1, -1, -1):
+                states = self.back_pointers[i][states]
+                if numpy.all(states == states[0]):
+                    number_of_decided_states = i + 1
+                    break
+
+        if number_of_decided_states == 0 and self.number_of_undecided_states > self.max_traceback:
+            return self.__decide_states(numpy.argmax(self.log_belief), 1)
+        if number_of_decided_states == 0:
+            return []
+        return self.__decide_states(current_states[0], number_of_decided_states)
+
+    def flush(self):
+        """Decides all undecided states using the currently most probable path.
+
+        Returns:
+        decided_states -- A list of the newly decided states in chronological order.
+
+        """
+        return self.__decide_states(numpy.argmax(self.log_belief), self.number_of_undecided_states)
+
+    def __decide_states(self, current_state, number_of_decided_states):
+        """Follows the path that ends in the given current state back to the oldest undecided state and decides the oldest states on it.
+
+        Keyword arguments:
+        current_state -- Index of the state at the time of the latest measurement.
+        number_of_decided_states -- The number of the oldest undecided states that should be decided.
+
+        Returns:
+        decided_states -- A list of the decided states in chronological order.
+
+        """
+        path = [current_state]
+        for i in xrange(len(self.back_pointers)-1, -1, -1):
+            path.append(self.back_pointers[i][path[-1]])
+        path.reverse()
+
+        for i in xrange(number_of_decided_states):
+            if len(self.back_pointers) > 0:
+                self.back_pointers.popleft()
+        self.number_of_undecided_states = self.number_of_undecided_states - number_of_decided_states
+        return [self.model.state_values[x] for x in path[:number_of_decided_states]]
+
+
+def filter_measurements(model, belief, measurement_indices, out, normalisers=None):
+    """Performs a filtering update for each measurement in a sequence.
+
+    Keyword arguments:
+    model -- A 'CompiledSensorDbn' object.
+    belief -- A 'numpy.array' containing the belief before the first measurement.
+    measurement_indices -- An integer 'numpy.array' containing the measurement indices.
+    out -- A 'numpy.array' of shape (number_of_measurements, number_of_states) in which the beliefs are stored.
+    normalisers -- A 'numpy.array' in which the probability of each measurement given the previous ones is stored (default None).
 
-        #will store the updated belief after filtering
-        updated_belief = list(self.network.initial_Vdata['state']['cprob'])
+    """
+    #the beliefs are written directly into the rows of the output array; the normaliser is computed
+    #as a dot product, which is considerably cheaper than summing the updated belief for small state spaces
+    for t in xrange(len(measurement_indices)):
+        predicted_belief = model.prediction_matrix.dot(belief)
+        measurement_likelihoods = model.measurement_likelihoods[measurement_indices[t]]
+        normaliser = predicted_belief.dot(measurement_likelihoods)
+        belief = out[t]
+        numpy.multiply(predicted_belief, measurement_likelihoods, out=belief)
+        belief *= 1. / normaliser
+        if normalisers is not None:
+            normalisers[t] = normaliser
 
-        for i,state in enumerate(state_values):
-            #we take the measurement probability given the current state
-            probability = self.network.twotbn_Vdata['measurement']['cprob']["['" + str(state) + "']"][measurement_index]
+def update_backward_message(model, backward_message, measurement_index):
+    """Passes a backward message over a measurement, i.e. calculates the (normalised) likelihood of the measurements
+    from the given one onwards for each state at the time before the measurement.
 
-            prediction_probability = 0.
-            for j,previous_state in enumerate(state_values):
-                transition_probability = self.network.twotbn_Vdata['state']['cprob']["['" + str(previous_state) + "']"][i]
-                previous_belief = self.network.initial_Vdata['state']['cprob'][j]
-                prediction_probability = prediction_probability + (transition_probability * previous_belief)
+    Keyword arguments:
+    model -- A 'CompiledSensorDbn' object.
+    backward_message -- A 'numpy.array' containing the normalised likelihood of the later measurements for each state at the time of the measurement.
+    measurement_index -- Index of the measurement.
 
-            probability = probability * prediction_probability
-            updated_belief[i] = probability
+    Returns:
+    backward_message -- The normalised backward message for the time before the measurement.
 
-        normaliser = sum(updated_belief)
-        for i in xrange(len(updated_belief)):
-            updated_belief[i] = updated_belief[i] / normaliser
-        self.network.initial_Vdata['state']['cprob'] = updated_belief
\ No newline at end of file
+    """
+    backward_message = model.transition_probabilities.dot(model.measurement_likelihoods[measurement_index] * backward_message)
+    return backward_message / numpy.sum(backward_message)
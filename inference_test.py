@@ -1,9 +1,56 @@
+import itertools
+
 from libpgm.nodedata import NodeData
 from libpgm.graphskeleton import GraphSkeleton
 from libpgm.discretebayesiannetwork import DiscreteBayesianNetwork
 
 from inference.exact_inference import ExactInferenceEngine
 from inference.approximate_inference import ApproximateInferenceEngine
+from inference.junction_tree import JunctionTreeEngine
+from inference.posterior_cache import PosteriorCache
+from inference.gibbs_sampling import GibbsSamplingEngine
+
+def enumerate_posterior(network, query_variables, evidence_variables):
+    """Calculates P(query_variables|evidence_variables) by summing the entries of the full joint distribution,
+    such that the results of the engines can be checked.
+
+    Keyword arguments:
+    network -- A 'libpgm.discretebayesiannetwork.DiscreteBayesianNetwork' object.
+    query_variables -- A list of names of query variables.
+    evidence_variables -- A dictionary containing variable names as keys and observed values as values.
+
+    Returns:
+    distribution -- A dictionary containing tuples of values of the query variables as keys and the probabilities as values.
+
+    """
+    distribution = dict()
+    for assignment in itertools.product(*[network.Vdata[x]['vals'] for x in network.V]):
+        values = dict(zip(network.V, assignment))
+        if any([values[x] != evidence_variables[x] for x in evidence_variables]):
+            continue
+
+        probability = 1.
+        for _,variable in enumerate(network.V):
+            variable_data = network.Vdata[variable]
+            probabilities = variable_data['cprob']
+            if variable_data['parents'] != None:
+                probabilities = probabilities[str([str(values[x]) for x in variable_data['parents']])]
+            probability = probability * probabilities[variable_data['vals'].index(values[variable])]
+
+        key = tuple([values[x] for x in query_variables])
+        distribution[key] = distribution.get(key, 0.) + probability
+
+    normaliser = sum(distribution.values())
+    return dict((key, probability / normaliser) for key,probability in distribution.items())
+
+def assert_distributions_close(distribution, expected_distribution, tolerance):
+    """Checks that a distribution returned by an engine agrees with an expected distribution
+    whose keys are tuples of values, where missing keys have probability zero;
+    single-variable distributions may use the values themselves as keys."""
+    for key,probability in distribution.items():
+        if not isinstance(key, tuple):
+            key = (key,)
+        assert abs(probability - expected_distribution.get(key, 0.)) <= tolerance, (distribution, expected_distribution)
 
 node_data = NodeData()
 network_skeleton = GraphSkeleton()
@@ -13,6 +60,8 @@ network = DiscreteBayesianNetwork(network_skeleton, node_data)
 
 exact_inference_engine = ExactInferenceEngine(network)
 approximate_inference_engine = ApproximateInferenceEngine(network)
+junction_tree_engine = JunctionTreeEngine(network)
+gibbs_sampling_engine = GibbsSamplingEngine(network)
 
 query_variable = 'Burglary'
 evidence_variables = {'MaryCalls': 'true', 'JohnCalls': 'true'}
@@ -20,12 +69,47 @@ resulting_distribution = exact_inference_engine.perform_inference(query_variable
 print 'P(B|m,j) - enumeration: ', resulting_distribution
 resulting_distribution = exact_inference_engine.perform_ve_inference(query_variable, evidence_variables)
 print '(B|m,j) - variable elimination: ', resulting_distribution
+resulting_distribution = exact_inference_engine.perform_ve_inference(query_variable, evidence_variables, log_space=True)
+print '(B|m,j) - variable elimination in log space: ', resulting_distribution
+resulting_distribution = junction_tree_engine.perform_inference(query_variable, evidence_variables)
+print 'P(B|m,j) - junction tree: ', resulting_distribution
 resulting_distribution = approximate_inference_engine.perform_rs_inference(query_variable, evidence_variables, 100000)
 print 'P(B|m,j) - approximate - rejection sampling: ', resulting_distribution
 resulting_distribution = approximate_inference_engine.perform_lw_inference(query_variable, evidence_variables, 100000)
 print 'P(B|m,j) - approximate - likelihood weighting: ', resulting_distribution
+resulting_distribution = approximate_inference_engine.perform_lw_inference(query_variable, evidence_variables, 100000, log_space=True)
+print 'P(B|m,j) - approximate - likelihood weighting in log space: ', resulting_distribution
 resulting_distribution = approximate_inference_engine.perform_gibbs_inference(query_variable, evidence_variables, 100000)
 print 'P(B|m,j) - approximate - Gibbs: ', resulting_distribution
+resulting_distribution, diagnostics = gibbs_sampling_engine.perform_multichain_inference(query_variable, evidence_variables, 100000)
+print 'P(B|m,j) - approximate - multi-chain Gibbs: ', resulting_distribution
+print 'Multi-chain Gibbs diagnostics: ', diagnostics
+try:
+    gibbs_sampling_engine.perform_multichain_inference(query_variable, evidence_variables, 0)
+    assert False
+except ValueError:
+    pass
+for resulting_distribution, standard_errors, number_of_samples in approximate_inference_engine.stream_lw_inference(query_variable, evidence_variables, target_standard_error=0.005):
+    pass
+print 'P(B|m,j) - approximate - anytime likelihood weighting (%d samples): ' % number_of_samples, resulting_distribution, standard_errors
+
+#under the rare evidence, the first batches of rejection sampling accept only a few samples, which often have the same query value;
+#the standard errors of such estimates are not zero and the target standard error is only accepted after 100 accepted samples
+exact_distribution = exact_inference_engine.perform_ve_inference(query_variable, evidence_variables)
+for seed in xrange(1, 5):
+    estimates = list(approximate_inference_engine.stream_rs_inference(query_variable, evidence_variables, target_standard_error=0.03, seed=seed))
+    assert min(estimates[0][1].values()) > 0.
+    assert len(estimates) > 1
+    resulting_distribution, standard_errors, number_of_samples = estimates[-1]
+    assert abs(resulting_distribution['true'] - exact_distribution['true']) < 4 * 0.03
+    for resulting_distribution, standard_errors, number_of_samples in approximate_inference_engine.stream_lw_inference(query_variable, evidence_variables, target_standard_error=0.03, seed=seed):
+        pass
+    assert abs(resulting_distribution['true'] - exact_distribution['true']) < 4 * 0.03
+
+#the Gibbs estimates are final only once the chains consist of at least 100 batches, i.e. after 10000 samples of a single chain
+for resulting_distribution, standard_errors, number_of_samples in gibbs_sampling_engine.stream_inference(query_variable, evidence_variables, target_standard_error=1., seed=1):
+    assert min(standard_errors.values()) > 0.
+assert number_of_samples == 10000
 print
 
 query_variable = 'JohnCalls'
@@ -34,9 +118,168 @@ resulting_distribution = exact_inference_engine.perform_inference(query_variable
 print 'P(j|m) - enumeration: ', resulting_distribution
 resulting_distribution = exact_inference_engine.perform_ve_inference(query_variable, evidence_variables)
 print '(j|m) - variable elimination: ', resulting_distribution
+resulting_distribution = junction_tree_engine.perform_inference(query_variable, evidence_variables)
+print 'P(j|m) - junction tree: ', resulting_distribution
 resulting_distribution = approximate_inference_engine.perform_rs_inference(query_variable, evidence_variables, 100000)
 print 'P(j|m) - approximate - rejection sampling: ', resulting_distribution
 resulting_distribution = approximate_inference_engine.perform_lw_inference(query_variable, evidence_variables, 100000)
 print 'P(j|m) - approximate - likelihood weighting: ', resulting_distribution
 resulting_distribution = approximate_inference_engine.perform_gibbs_inference(query_variable, evidence_variables, 100000)
-print 'P(j|m) - approximate - Gibbs: ', resulting_distribution
\ No newline at end of file
+print 'P(j|m) - approximate - Gibbs: ', resulting_distribution
+print
+resulting_distributions = exact_inference_engine.perform_marginal_inference(None, evidence_variables)
+print 'P(X|m) - all marginals: ', resulting_distributions
+resulting_distribution = exact_inference_engine.perform_joint_inference(['Burglary', 'Earthquake'], evidence_variables)
+print 'P(B,E|m) - joint: ', resulting_distribution
+
+#repeated queries with the same query and evidence variables reuse the engine of the pruned subnetwork
+number_of_pruned_engines = len(exact_inference_engine.pruner.engine_cache)
+exact_inference_engine.perform_ve_inference('JohnCalls', {'MaryCalls': 'false'})
+exact_inference_engine.perform_ve_inference('JohnCalls', {'MaryCalls': 'true'})
+assert len(exact_inference_engine.pruner.engine_cache) == number_of_pruned_engines
+
+#the elimination orders are found in the pruned subnetwork, and orders found in the full network
+#can be passed to a pruning engine, which drops the variables that are not relevant for the query
+unpruned_inference_engine = ExactInferenceEngine(network, False)
+elimination_order = exact_inference_engine.find_elimination_order('Burglary', {'MaryCalls': 'true'})
+assert 'JohnCalls' not in elimination_order
+full_elimination_order = unpruned_inference_engine.find_elimination_order('Burglary', {'MaryCalls': 'true'})
+assert 'JohnCalls' in full_elimination_order
+for _,order in enumerate([elimination_order, full_elimination_order]):
+    assert exact_inference_engine.predict_largest_factor_size('Burglary', {'MaryCalls': 'true'}, order) == unpruned_inference_engine.predict_largest_factor_size('Burglary', {'MaryCalls': 'true'}, elimination_order)
+    assert_distributions_close(exact_inference_engine.perform_ve_inference('Burglary', {'MaryCalls': 'true'}, order),
+                               unpruned_inference_engine.perform_joint_inference(['Burglary'], {'MaryCalls': 'true'}, full_elimination_order), 1e-10)
+print
+cached_engine = PosteriorCache(ExactInferenceEngine, network, max_size=100)
+for i in xrange(1000):
+    resulting_distribution = cached_engine.perform_ve_inference(query_variable, evidence_variables)
+print 'P(j|m) - cached variable elimination: ', resulting_distribution
+print 'Cache statistics: ', cached_engine.get_statistics()
+
+
+#the arguments are matched against the signature of the engine's method, so passing them by position, by name
+#or leaving them at their defaults gives the same cache key; other keyword arguments are part of the key
+cached_distribution = cached_engine.perform_ve_inference(query_variable, evidence_variables=evidence_variables)
+cached_distribution = cached_engine.perform_ve_inference(query_variable=query_variable, evidence_variables=evidence_variables, elimination_order='min_fill')
+assert cached_engine.get_statistics()['misses'] == 1
+cached_distribution = cached_engine.perform_ve_inference(query_variable, evidence_variables, elimination_order='min_degree')
+assert abs(cached_distribution['true'] - resulting_distribution['true']) < 1e-10
+cached_distribution = cached_engine.perform_ve_inference(query_variable, evidence_variables, log_space=True)
+assert abs(cached_distribution['true'] - resulting_distribution['true']) < 1e-10
+cached_distribution = cached_engine.perform_ve_inference(query_variable, evidence_variables, 'min_fill', True)
+assert cached_engine.get_statistics()['misses'] == 3
+
+#the cache does not change the network data, so modifying them in place requires an explicit invalidation,
+#while replacing them is detected automatically
+assert type(network.Vdata) is dict and type(network.Vdata['JohnCalls']['cprob']) is dict
+network.Vdata['JohnCalls']['cprob']["['true']"] = [.5, .5]
+assert cached_engine.perform_ve_inference(query_variable, evidence_variables) is resulting_distribution
+cached_engine.invalidate()
+cached_distribution = cached_engine.perform_ve_inference(query_variable, evidence_variables)
+assert abs(cached_distribution['true'] - ExactInferenceEngine(network).perform_ve_inference(query_variable, evidence_variables)['true']) < 1e-10
+assert abs(cached_distribution['true'] - resulting_distribution['true']) > 0.01
+network.Vdata['JohnCalls']['cprob']["['true']"] = [.9, .1]
+network.Vdata = dict(network.Vdata)
+cached_distribution = cached_engine.perform_ve_inference(query_variable, evidence_variables)
+assert cached_engine.get_statistics()['invalidations'] == 2
+assert abs(cached_distribution['true'] - resulting_distribution['true']) < 1e-10
+
+#if modifications are tracked, modifying the network data in place invalidates the cached results
+tracking_cached_engine = PosteriorCache(ExactInferenceEngine, network, track_network_changes=True)
+tracking_cached_engine.perform_ve_inference(query_variable, evidence_variables)
+tracking_cached_engine.network.Vdata['JohnCalls']['cprob']["['true']"] = [.5, .5]
+cached_distribution = tracking_cached_engine.perform_ve_inference(query_variable, evidence_variables)
+assert tracking_cached_engine.get_statistics()['invalidations'] == 1
+assert abs(cached_distribution['true'] - ExactInferenceEngine(network).perform_ve_inference(query_variable, evidence_variables)['true']) < 1e-10
+assert abs(cached_distribution['true'] - resulting_distribution['true']) > 0.01
+tracking_cached_engine.network.Vdata['JohnCalls']['cprob']["['true']"] = [.9, .1]
+
+#the results of sampling engines are only cached if a seed is given
+cached_sampling_engine = PosteriorCache(ApproximateInferenceEngine, network)
+cached_sampling_engine.perform_rs_inference(query_variable, evidence_variables, 1000)
+cached_sampling_engine.perform_rs_inference(query_variable, evidence_variables, 1000)
+cached_sampling_engine.perform_gibbs_inference(query_variable, evidence_variables, 1000)
+cached_distribution = cached_sampling_engine.perform_rs_inference(query_variable, evidence_variables, 1000, seed=3)
+assert cached_sampling_engine.perform_rs_inference(query_variable, evidence_variables, 1000, seed=3) is cached_distribution
+statistics = cached_sampling_engine.get_statistics()
+assert statistics['uncached_calls'] == 3 and statistics['misses'] == 1 and statistics['hits'] == 1
+
+#########################################################
+#checks against enumeration of the joint distribution
+#########################################################
+#we query each variable given every assignment of up to two of the other variables
+test_queries = []
+for _,query_variable in enumerate(network.V):
+    other_variables = [x for x in network.V if x != query_variable]
+    for number_of_evidence_variables in xrange(3):
+        for evidence_names in itertools.combinations(other_variables, number_of_evidence_variables):
+            for evidence_values in itertools.product(*[network.Vdata[x]['vals'] for x in evidence_names]):
+                test_queries.append((query_variable, dict(zip(evidence_names, evidence_values))))
+
+exact_inference_engine = ExactInferenceEngine(network)
+for _,(query_variable, evidence_variables) in enumerate(test_queries):
+    expected_distribution = enumerate_posterior(network, [query_variable], evidence_variables)
+    assert_distributions_close(exact_inference_engine.perform_ve_inference(query_variable, evidence_variables), expected_distribution, 1e-10)
+    assert_distributions_close(exact_inference_engine.perform_ve_inference(query_variable, evidence_variables, 'min_degree'), expected_distribution, 1e-10)
+    assert_distributions_close(exact_inference_engine.perform_inference(query_variable, evidence_variables), expected_distribution, 1e-10)
+
+expected_distribution = enumerate_posterior(network, ['Burglary', 'Earthquake'], {'MaryCalls': 'true'})
+assert_distributions_close(exact_inference_engine.perform_joint_inference(['Burglary', 'Earthquake'], {'MaryCalls': 'true'}), expected_distribution, 1e-10)
+
+#a query variable that is also an evidence variable takes its observed value with certainty
+for _,log_space in enumerate([False, True]):
+    for _,evidence_variables in enumerate([{'Burglary': 'true'}, {'Burglary': 'false', 'MaryCalls': 'true'}]):
+        expected_distribution = enumerate_posterior(network, ['Burglary'], evidence_variables)
+        assert_distributions_close(exact_inference_engine.perform_ve_inference('Burglary', evidence_variables, log_space=log_space), expected_distribution, 1e-10)
+        assert_distributions_close(exact_inference_engine.perform_inference('Burglary', evidence_variables, log_space), expected_distribution, 1e-10)
+        for _,query_variables in enumerate([['Alarm', 'Burglary'], ['MaryCalls', 'Burglary']]):
+            expected_distribution = enumerate_posterior(network, query_variables, evidence_variables)
+            resulting_distribution = exact_inference_engine.perform_joint_inference(query_variables, evidence_variables, log_space=log_space)
+            assert len(resulting_distribution) == 4
+            assert_distributions_close(resulting_distribution, expected_distribution, 1e-10)
+print 'Exact inference agrees with enumeration of the joint distribution for %d queries' % len(test_queries)
+
+junction_tree_engine = JunctionTreeEngine(network)
+for _,(query_variable, evidence_variables) in enumerate(test_queries):
+    expected_distribution = enumerate_posterior(network, [query_variable], evidence_variables)
+    assert_distributions_close(junction_tree_engine.perform_inference(query_variable, evidence_variables), expected_distribution, 1e-10)
+
+#all marginals of a calibrated tree agree with the enumerated marginals
+evidence_variables = {'MaryCalls': 'true', 'Earthquake': 'false'}
+resulting_distributions = exact_inference_engine.perform_marginal_inference(None, evidence_variables)
+for variable,resulting_distribution in resulting_distributions.items():
+    assert_distributions_close(resulting_distribution, enumerate_posterior(network, [variable], evidence_variables), 1e-10)
+print 'The junction tree agrees with enumeration of the joint distribution'
+
+for _,(query_variable, evidence_variables) in enumerate(test_queries):
+    expected_distribution = enumerate_posterior(network, [query_variable], evidence_variables)
+    assert_distributions_close(exact_inference_engine.perform_ve_inference(query_variable, evidence_variables, log_space=True), expected_distribution, 1e-10)
+    assert_distributions_close(exact_inference_engine.perform_inference(query_variable, evidence_variables, log_space=True), expected_distribution, 1e-10)
+
+expected_distribution = enumerate_posterior(network, ['Burglary', 'Earthquake'], {'MaryCalls': 'true'})
+resulting_distribution = exact_inference_engine.perform_joint_inference(['Burglary', 'Earthquake'], {'MaryCalls': 'true'}, log_space=True)
+assert_distributions_close(resulting_distribution, expected_distribution, 1e-10)
+
+#likelihood weighting gives the same estimate in log space for the same seed
+resulting_distribution = approximate_inference_engine.perform_lw_inference('Burglary', {'MaryCalls': 'true', 'JohnCalls': 'true'}, 20000, seed=7)
+log_space_distribution = approximate_inference_engine.perform_lw_inference('Burglary', {'MaryCalls': 'true', 'JohnCalls': 'true'}, 20000, seed=7, log_space=True)
+assert_distributions_close(log_space_distribution, dict(((x,),y) for x,y in resulting_distribution.items()), 1e-10)
+print 'Log-space inference agrees with enumeration of the joint distribution'
+
+#seeded sampling is reproducible, does not depend on the number of processes and agrees with the exact posteriors
+#within about five standard errors (about 2400 of the 200000 rejection samples support the evidence)
+query_variable = 'JohnCalls'
+evidence_variables = {'MaryCalls': 'true'}
+expected_distribution = enumerate_posterior(network, [query_variable], evidence_variables)
+resulting_distribution = approximate_inference_engine.perform_rs_inference(query_variable, evidence_variables, 200000, seed=11)
+assert resulting_distribution == approximate_inference_engine.perform_rs_inference(query_variable, evidence_variables, 200000, seed=11)
+assert resulting_distribution == approximate_inference_engine.perform_rs_inference(query_variable, evidence_variables, 200000, number_of_processes=2, seed=11)
+assert_distributions_close(resulting_distribution, expected_distribution, 0.04)
+
+query_variable = 'Burglary'
+evidence_variables = {'MaryCalls': 'true', 'JohnCalls': 'true'}
+expected_distribution = enumerate_posterior(network, [query_variable], evidence_variables)
+resulting_distribution = approximate_inference_engine.perform_lw_inference(query_variable, evidence_variables, 200000, seed=11)
+assert resulting_distribution == approximate_inference_engine.perform_lw_inference(query_variable, evidence_variables, 200000, number_of_processes=2, seed=11)
+assert_distributions_close(resulting_distribution, expected_distribution, 0.04)
+print 'Seeded sampling agrees with enumeration of the joint distribution'
\ No newline at end of file
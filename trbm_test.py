@@ -1,6 +1,7 @@
 import numpy
 from boltzmann_machines.trbm import TRBM
 from boltzmann_machines.trbm_continuous import TRBMContinuous
+from boltzmann_machines.activations import sigmoid
 
 ##############
 #binary input
@@ -70,4 +71,44 @@ print sample
 
 for i in xrange(2,11):
     sample = network.sample_network(data[i,:])
-    print sample
\ No newline at end of file
+    print sample
+
+#############################################
+#mini-batch training of higher-order networks
+#############################################
+data = numpy.random.randint(0,2,(1000,10))
+
+network = TRBM(10,15,order=3)
+network.train_minibatch(data, epochs=10, learning_rate=0.1, batch_size=100, k=1)
+network.train_minibatch(data, epochs=10, learning_rate=0.05, batch_size=100, k=1, algorithm='pcd')
+sample = network.sample_network(data[3,:], data[:3,:].T)
+print sample
+
+network = TRBMContinuous(10,15,order=3)
+network.train_minibatch(data, epochs=10, learning_rate=0.1, batch_size=100, k=1)
+network.train_minibatch(data, epochs=10, learning_rate=0.05, batch_size=100, k=1, algorithm='fpcd')
+sample = network.sample_network(data[3,:], data[:3,:].T)
+print sample
+
+#the history buffers reproduce the recurrence in which the visible and hidden vectors of the last 'order' time steps
+#are kept in lists, the n-th previous vectors propagating a bias through the n-th temporal weight matrices
+order = 3
+visible_history = [data[t,:] for t in xrange(order)]
+hidden_history = [sigmoid(network.connection_weights.T.dot(x) + network.hidden_bias.ravel()) for _,x in enumerate(visible_history)]
+for t in xrange(order, 20):
+    if t == order:
+        sample = network.sample_network(data[t,:], data[:order,:].T)
+    else:
+        sample = network.sample_network(data[t,:])
+
+    hidden_bias = network.hidden_bias.ravel() + network.connection_weights.T.dot(data[t,:])
+    visible_bias = network.visible_bias.ravel()
+    for n in xrange(order):
+        hidden_bias = hidden_bias + network.visible_to_hidden_bias[n].T.dot(visible_history[-n-1]) + network.hidden_to_hidden_bias[n].T.dot(hidden_history[-n-1])
+        visible_bias = visible_bias + network.visible_to_visible_bias[n].T.dot(visible_history[-n-1])
+    hidden_vector = sigmoid(hidden_bias)
+    expected_sample = sigmoid(network.connection_weights.dot(hidden_vector) + visible_bias)
+    assert numpy.allclose(sample.ravel(), expected_sample)
+
+    visible_history = visible_history[1:] + [data[t,:]]
+    hidden_history = hidden_history[1:] + [hidden_vector]